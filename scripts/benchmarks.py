@@ -0,0 +1,729 @@
+"""Benchmarks for the machine graph code.
+
+Usage: python benchmarks.py <command> [args]
+
+Commands:
+- memory [headwords]: builds the static graph of a synthetic lexicon and
+  reports the memory used by its machines (default: 100000 headwords)
+- append [children]: appends children to a hub machine (like IS_A or HAS)
+  twice, the second time all of them are duplicates (default: 20000)
+- frozen [headwords]: compares traversals on the static graph and on its
+  frozen snapshot (default: 2000 headwords)
+- rebuild [headwords]: builds the static graph from definitions that have to
+  be kept intact, with a deepcopy and with add_static(copy_on_write=True)
+  (default: 20000 headwords)
+- longrun [sentences]: activates and expands a few random words per
+  "sentence" and clears the active graph after each, with and without
+  releasing it, with the cyclic GC disabled (default: 200 sentences)
+- hashcons [headwords] [common]: merges the identical modified machines of
+  a synthetic lexicon whose modified words come from the @c common most
+  frequent words (default: 20000 headwords, 100 common words)
+- bulk [headwords]: builds the static graph with and without
+  Lexicon.bulk_load() (default: 50000 headwords)
+- patch [headwords] [changed]: changes the definitions of a few headwords
+  and updates the lexicon with a DefinitionPatch instead of rebuilding it
+  (default: 20000 headwords, 20 changed)
+- activate [headwords]: calls Lexicon.activate() a few times per
+  "sentence", as the spreading activation does (default: 20000 headwords)
+- active [rounds] [sentences]: in each round, activates 10 new words and
+  expands the unexpanded machines, as the activation loop does; clears the
+  active machines after each sentence (default: 500 rounds, 20 sentences)
+- expand [headwords] [sentences]: expands 5 words per "sentence", picked
+  from the 50 most frequent ones, and releases the active machines after
+  each sentence (default: 400 headwords, 20 sentences)
+- batch [headwords] [sentences]: expands the unexpanded machines in rounds,
+  as the activation loop does, with expand() on each and with
+  Lexicon.expand_many(); the words of the sentences come from the same 20
+  words, so their definitions overlap (default: 400 headwords, 20 sentences)
+- matrix [headwords]: extracts the definition graph as machines and as a
+  sparse matrix (default: 20000 headwords)
+- lazy [headwords] [words]: loads the static graph from a pickled
+  definition dict, and lazily from a StaticStore, and looks up a few words
+  (default: 20000 headwords, 1000 words)
+- serialize [headwords]: saves and loads the definitions and the lexicon
+  with cPickle and in the flat format (default: 20000 headwords)
+- mapped [headwords] [sentences]: loads the lexicon in the flat and in the
+  mapped format, and expands 5 words per "sentence" in active contexts
+  (default: 20000 headwords, 20 sentences)
+- layers [headwords] [domains]: builds a lexicon for each of a few domains
+  (2% more headwords each, defined with the common words), as full copies and
+  as overlays of one common lexicon, and counts the machines kept (default:
+  20000 headwords, 5 domains)
+- lookup [headwords] [calls]: calls get_machine() with known and unknown
+  words (kept in a side table), on a lexicon and on an overlay of it, with
+  and without the lookup cache (default: 20000 headwords, 200000 calls)
+- parse [repeats]: parses the definitions of the dat/*_definitions files a
+  few times, and definitions nested deeper and deeper, with pyparsing and
+  with the hand-written parser (default: 20 repeats)
+- isa [headwords] [lookups]: looks up the IS_A members of random categories,
+  as EnumMatcher does, by scanning the static graph and with the IS_A index
+  of the lexicon (default: 20000 headwords, 100 lookups)
+- deep [length]: runs the graph walkers on a chain of machines, like a deep
+  definition chain (default: 100000 machines)
+
+The synthetic lexicon mimics the output of DefinitionParser: every headword
+is defined by a few unary words, an IS_A and a HAS binary that loop back to
+the definiendum, and a modified (non-canonical) word, e.g. animal[wild].
+"""
+
+import copy
+import cPickle
+import gc
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from pymachine import flat
+from pymachine import mapped as mapped_format
+from pymachine.control import ConceptControl
+from pymachine.definition_parser import DefinitionParser
+from pymachine.graph_diff import DefinitionPatch
+from pymachine.lexicon import Lexicon
+from pymachine.machine import Machine
+from pymachine.static_store import StaticStore
+from pymachine.utils import MachineTraverser, MachineGraph
+
+def concept_machine(name, part_num=1):
+    # the parser decodes every printname separately, so do we
+    return Machine(name.encode('utf-8').decode('utf-8'),
+                   ConceptControl.shared(), part_num)
+
+def synthetic_definitions(headwords, seed=42, common=None):
+    """Returns a definition dict ({printname: set([machine])}) in the format
+    of definition_parser.read(three_parts=True). If @p common is given, the
+    modified words are built from the first @p common words only."""
+    rand = random.Random(seed)
+    words = [u'word{0}'.format(i) for i in xrange(headwords)]
+    common_words = words[:common] if common else words
+    definitions = {}
+    for word in words:
+        root = concept_machine(word)
+        for _ in xrange(3):
+            root.append(concept_machine(rand.choice(words)), 0)
+        is_a = concept_machine('IS_A', 3)
+        is_a.append(root, 1)
+        is_a.append(concept_machine(rand.choice(words)), 2)
+        root.append(is_a, 0)
+        has = concept_machine('HAS', 3)
+        has.append(root, 1)
+        has.append(concept_machine(rand.choice(words)), 2)
+        root.append(has, 0)
+        modified = concept_machine(rand.choice(common_words))
+        modified.append(concept_machine(rand.choice(common_words)), 0)
+        root.append(modified, 0)
+        definitions[word] = set([root])
+    return definitions
+
+def build_lexicon(definitions, copy_on_write=False):
+    lexicon = Lexicon()
+    lexicon.add_static(definitions.itervalues(), copy_on_write)
+    lexicon.finalize_static()
+    return lexicon
+
+def static_machines(lexicon):
+    machines = set()
+    stack = [m for ms in lexicon.static.itervalues() for m in ms]
+    while stack:
+        machine = stack.pop()
+        if machine not in machines:
+            machines.add(machine)
+            stack.extend(machine.children())
+    return machines
+
+def machine_bytes(machine):
+    """The number of bytes allocated for @p machine and the containers it
+    owns (but not for its printname, which may be shared)."""
+    size = sys.getsizeof(machine)
+    if hasattr(machine, '__dict__'):
+        size += sys.getsizeof(machine.__dict__)
+    size += sys.getsizeof(machine.partitions)
+    size += sum(sys.getsizeof(part) for part in machine.partitions)
+    size += sys.getsizeof(machine.parents)
+    size += sum(sys.getsizeof(link) for link in machine.parents)
+    return size
+
+def control_bytes(control):
+    size = sys.getsizeof(control)
+    if hasattr(control, '__dict__'):
+        size += sys.getsizeof(control.__dict__)
+    return size
+
+def memory(headwords=100000):
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    build_time = time.time() - start
+    gc.collect()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss
+
+    machines = static_machines(lexicon)
+    controls = dict((id(m.control), m.control) for m in machines
+                    if m.control is not None)
+    printnames = dict((id(m.printname_), m.printname_) for m in machines)
+    machine_total = sum(machine_bytes(m) for m in machines)
+    control_total = sum(control_bytes(c) for c in controls.itervalues())
+    printname_total = sum(sys.getsizeof(pn) for pn in printnames.itervalues())
+
+    print "headwords:          {0}".format(headwords)
+    print "static machines:    {0}".format(len(machines))
+    print "machines:           {0:.1f} MB ({1:.0f} bytes/machine)".format(
+        machine_total / 2.0 ** 20, float(machine_total) / len(machines))
+    print "controls:           {0:.1f} MB ({1} objects)".format(
+        control_total / 2.0 ** 20, len(controls))
+    print "printnames:         {0:.1f} MB ({1} objects)".format(
+        printname_total / 2.0 ** 20, len(printnames))
+    print "peak RSS increase:  {0:.1f} MB".format(rss / 2.0 ** 10)
+    print "build time:         {0:.2f} s".format(build_time)
+
+def append(children=20000):
+    hub = concept_machine('HAS', 3)
+    machines = [concept_machine(u'word{0}'.format(i))
+                for i in xrange(children)]
+    start = time.time()
+    for machine in machines:
+        hub.append(machine, 1)
+    for machine in machines:
+        hub.append(machine, 1)
+    print "appending {0} children: {1:.3f} s".format(
+        children, time.time() - start)
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def frozen(headwords=2000):
+    # building the lexicon is still recursive
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * headwords))
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    graph, freeze_time = timed(lexicon.freeze)
+    print "freezing {0} nodes: {1:.3f} s".format(len(graph), freeze_time)
+
+    _, machine_time = timed(lexicon.extract_definition_graph, True)
+    _, frozen_time = timed(graph.extract_definition_graph, True)
+    print "extract_definition_graph: {0:.3f} s vs {1:.3f} s frozen".format(
+        machine_time, frozen_time)
+
+    words = sorted(lexicon.static)[-10:]
+    _, machine_time = timed(lambda: [
+        list(MachineTraverser.get_nodes(lexicon.static[word][0]))
+        for word in words])
+    _, frozen_time = timed(lambda: [
+        list(MachineTraverser.get_nodes(graph.get_static_machine(word)[0]))
+        for word in words])
+    print "MachineTraverser.get_nodes: {0:.3f} s vs {1:.3f} s frozen".format(
+        machine_time, frozen_time)
+
+def rebuild(headwords=20000):
+    definitions = synthetic_definitions(headwords)
+    gc.collect()
+
+    def peak_rss():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2.0 ** 10
+
+    def copy_on_write():
+        lexicon = Lexicon()
+        lexicon.add_static(definitions.itervalues(), copy_on_write=True)
+        lexicon.finalize_static()
+        return lexicon
+
+    def deep_copy():
+        lexicon = Lexicon()
+        lexicon.add_static(copy.deepcopy(definitions).itervalues())
+        lexicon.finalize_static()
+        return lexicon
+
+    # copy-on-write first, as the peak RSS can only grow
+    for name, build in (('copy-on-write', copy_on_write),
+                        ('deepcopy', deep_copy)):
+        start_rss = peak_rss()
+        lexicon, elapsed = timed(build)
+        print "{0}: {1:.2f} s, peak RSS +{2:.1f} MB, {3} machines".format(
+            name, elapsed, peak_rss() - start_rss,
+            len(static_machines(lexicon)))
+        del lexicon
+        gc.collect()
+
+def sentences(lexicon, count, words=5, seed=42):
+    rand = random.Random(seed)
+    headwords = sorted(lexicon.static)
+    for _ in xrange(count):
+        sentence = [concept_machine(rand.choice(headwords))
+                    for _ in xrange(words)]
+        lexicon.add_active(sentence)
+        for machine in sentence:
+            lexicon.expand(machine)
+        yield sentence
+
+def longrun(sentence_num=200):
+    # unify_recursively is recursive
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    lexicon = build_lexicon(synthetic_definitions(200))
+    gc.collect()
+    gc.disable()
+    try:
+        for release in (True, False):
+            objects = len(gc.get_objects())
+            start = time.time()
+            for _ in sentences(lexicon, sentence_num):
+                lexicon.clear_active(release=release)
+            elapsed = time.time() - start
+            garbage = len(gc.get_objects()) - objects
+            _, gc_time = timed(gc.collect)
+            print ("release={0}: {1:.2f} s, {2} objects left for the GC, "
+                   "collected in {3:.3f} s").format(
+                       release, elapsed, garbage, gc_time)
+    finally:
+        gc.enable()
+
+def hashcons(headwords=20000, common=100):
+    definitions = synthetic_definitions(headwords, common=common)
+    lexicon = Lexicon()
+    lexicon.add_static(definitions.itervalues())
+    lexicon.finalize_static(share_identical=False)
+    before = len(static_machines(lexicon))
+    merged, elapsed = timed(lexicon.share_identical)
+    after = len(static_machines(lexicon))
+    print "static machines: {0} -> {1} ({2} merged, {3:.1f}% saved)".format(
+        before, after, merged, 100.0 * (before - after) / before)
+    print "share_identical: {0:.2f} s".format(elapsed)
+
+def bulk(headwords=50000):
+    definitions = synthetic_definitions(headwords)
+
+    def build(bulk_load):
+        lexicon = Lexicon()
+        if bulk_load:
+            with lexicon.bulk_load():
+                lexicon.add_static(definitions.itervalues(),
+                                   copy_on_write=True)
+        else:
+            lexicon.add_static(definitions.itervalues(), copy_on_write=True)
+        return lexicon
+
+    for bulk_load in (False, True):
+        _, elapsed = timed(build, bulk_load)
+        gc.collect()
+        print "add_static, bulk_load={0}: {1:.2f} s".format(
+            bulk_load, elapsed)
+
+def patch(headwords=20000, changed=20):
+    old_definitions = synthetic_definitions(headwords)
+    new_definitions = dict(old_definitions)
+    other_definitions = synthetic_definitions(headwords, seed=7)
+    for word in random.Random(42).sample(sorted(old_definitions), changed):
+        new_definitions[word] = other_definitions[word]
+    # the definitions are diffed after the lexicon is built
+    lexicon = build_lexicon(old_definitions, copy_on_write=True)
+
+    definition_patch, diff_time = timed(
+        DefinitionPatch.between, old_definitions, new_definitions)
+    _, patch_time = timed(definition_patch.apply, lexicon)
+    _, build_time = timed(build_lexicon, new_definitions, True)
+    print "{0} headwords changed".format(len(definition_patch))
+    print "diff: {0:.3f} s, patch: {1:.3f} s, rebuild: {2:.3f} s".format(
+        diff_time, patch_time, build_time)
+
+def activate(headwords=20000, sentence_num=50):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    rand = random.Random(42)
+    words = sorted(lexicon.static)
+    activated, start = 0, time.time()
+    for _ in xrange(sentence_num):
+        for _ in xrange(3):
+            lexicon.add_active([concept_machine(word)
+                                for word in rand.sample(words, 10)])
+            activated += len(lexicon.activate())
+        lexicon.clear_active()
+    print "{0} activate() calls: {1:.3f} s, {2} machines activated".format(
+        3 * sentence_num, time.time() - start, activated)
+
+def active(round_num=500, sentence_num=20):
+    # words without definitions, so that expanding them is cheap
+    lexicon = Lexicon()
+    lexicon.add_static(concept_machine("w{0}".format(i))
+                       for i in xrange(10 * round_num))
+    lexicon.finalize_static()
+    start = time.time()
+    for _ in xrange(sentence_num):
+        for round_i in xrange(round_num):
+            lexicon.add_active([concept_machine("w{0}".format(i)) for i
+                                in xrange(10 * round_i, 10 * round_i + 10)])
+            for machine in lexicon.get_unexpanded():
+                lexicon.expand(machine)
+        lexicon.clear_active()
+    print "{0} sentences of {1} rounds: {2:.3f} s".format(
+        sentence_num, round_num, time.time() - start)
+
+def expand(headwords=400, sentence_num=20):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    rand = random.Random(42)
+    common = sorted(lexicon.static)[:50]
+    activated, start = 0, time.time()
+    for _ in xrange(sentence_num):
+        sentence = [concept_machine(word) for word in rand.sample(common, 5)]
+        lexicon.add_active(sentence)
+        for machine in sentence:
+            lexicon.expand(machine)
+        activated += len(lexicon.active)
+        lexicon.clear_active(release=True)
+    print "{0} sentences: {1:.3f} s, {2} active machines".format(
+        sentence_num, time.time() - start, activated)
+
+def batch(headwords=400, sentence_num=20):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    common = sorted(lexicon.static)[:20]
+
+    def run(expand_all):
+        rand = random.Random(42)
+        graphs, start = [], time.time()
+        for _ in xrange(sentence_num):
+            lexicon.add_active([concept_machine(word)
+                                for word in rand.sample(common, 10)])
+            for _ in xrange(3):
+                expand_all(list(lexicon.get_unexpanded()))
+            graphs.append(sorted(
+                (machine.printname(), lexicon.is_expanded(machine),
+                 [[child.printname() for child in part]
+                  for part in machine.partitions])
+                for machine in lexicon.active_machines()))
+            lexicon.clear_active(release=True)
+        return time.time() - start, graphs
+
+    def expand_each(machines):
+        for machine in machines:
+            lexicon.expand(machine)
+
+    # compiles the expansion plans
+    run(expand_each)
+    each_time, each_graphs = run(expand_each)
+    many_time, many_graphs = run(lexicon.expand_many)
+    assert each_graphs == many_graphs
+    print "expand: {0:.3f} s, expand_many: {1:.3f} s".format(
+        each_time, many_time)
+
+def matrix(headwords=20000):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    def_graph, machine_time = timed(lexicon.extract_definition_graph)
+    def_matrix, matrix_time = timed(
+        lexicon.extract_definition_graph, False, True)
+    machine_total = sum(machine_bytes(machines[0])
+                        for machines in def_graph.itervalues())
+    matrix_total = (def_matrix.matrix.data.nbytes +
+                    def_matrix.matrix.indices.nbytes +
+                    def_matrix.matrix.indptr.nbytes)
+    print "definition graph: {0} words, {1} edges".format(
+        len(def_matrix), def_matrix.matrix.nnz)
+    print "machines: {0:.3f} s, {1:.1f} MB".format(
+        machine_time, machine_total / 2.0 ** 20)
+    print "sparse:   {0:.3f} s, {1:.1f} MB".format(
+        matrix_time, matrix_total / 2.0 ** 20)
+
+def lazy(headwords=20000, word_num=1000):
+    definitions = synthetic_definitions(headwords)
+    words = random.Random(42).sample(sorted(definitions), word_num)
+    pickle_file = tempfile.NamedTemporaryFile()
+    store_file = tempfile.NamedTemporaryFile()
+    cPickle.dump(definitions, pickle_file, cPickle.HIGHEST_PROTOCOL)
+    pickle_file.flush()
+    StaticStore.write(definitions, store_file.name)
+    del definitions
+
+    def eager():
+        pickle_file.seek(0)
+        with Lexicon().bulk_load() as lexicon:
+            lexicon.add_static(cPickle.load(pickle_file).itervalues())
+        lexicon.finalize_static()
+        for word in words:
+            lexicon.get_static_machine(word)
+        return lexicon
+
+    def lazy():
+        lexicon = Lexicon()
+        lexicon.use_store(StaticStore(store_file.name))
+        for word in words:
+            lexicon.get_static_machine(word)
+        return lexicon
+
+    lexicon, eager_time = timed(eager)
+    eager_size = len(static_machines(lexicon))
+    lexicon, lazy_time = timed(lazy)
+    lazy_size = len(static_machines(lexicon))
+    print "looking up {0} of {1} headwords".format(word_num, headwords)
+    print "eager: {0:.3f} s, {1} static machines".format(
+        eager_time, eager_size)
+    print "lazy:  {0:.3f} s, {1} static machines".format(
+        lazy_time, lazy_size)
+
+def serialize(headwords=20000):
+    # cPickle follows the links of the machines recursively, which needs a
+    # large C stack, too
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100 * headwords))
+    threading.stack_size(2 ** 29)
+    thread = threading.Thread(target=_serialize, args=(headwords,))
+    thread.start()
+    thread.join()
+
+def _serialize(headwords):
+    definitions = synthetic_definitions(headwords)
+    lexicon = build_lexicon(copy.deepcopy(definitions), True)
+    for what, obj, dump, load in (
+            ('definitions', definitions, flat.dump_definitions,
+             flat.load_definitions),
+            ('lexicon', lexicon, flat.dump_lexicon, flat.load_lexicon)):
+        for method, dump_f, load_f in (
+                ('cPickle', cPickle.dump, cPickle.load),
+                ('flat', dump, load)):
+            with tempfile.TemporaryFile() as file_obj:
+                _, dump_time = timed(dump_f, obj, file_obj)
+                size = file_obj.tell()
+                file_obj.seek(0)
+                _, load_time = timed(load_f, file_obj)
+            print "{0} {1}: {2:.1f} MB, dump {3:.2f} s, load {4:.2f} s".format(
+                what, method, size / 2.0 ** 20, dump_time, load_time)
+
+def mapped(headwords=20000, sentence_num=20):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    flat_file = tempfile.NamedTemporaryFile()
+    mapped_file = tempfile.NamedTemporaryFile()
+    flat.dump_lexicon(lexicon, flat_file)
+    flat_file.flush()
+    mapped_format.dump_lexicon(lexicon, mapped_file.name)
+    words = sorted(lexicon.static)[:50]
+    del lexicon
+
+    def load_flat():
+        flat_file.seek(0)
+        return flat.load_lexicon(flat_file)
+
+    for name, load in (('flat', load_flat),
+                       ('mapped', lambda: mapped_format.load_lexicon(
+                           mapped_file.name))):
+        lexicon, load_time = timed(load)
+        rand = random.Random(42)
+        start = time.time()
+        for _ in xrange(sentence_num):
+            context = lexicon.context()
+            for word in rand.sample(words, 5):
+                context.expand(context.get_machine(word))
+            context.clear_active(release=True)
+        print "{0}: load {1:.3f} s, {2} sentences {3:.3f} s".format(
+            name, load_time, sentence_num, time.time() - start)
+
+def layers(headwords=20000, domain_num=5):
+    common = synthetic_definitions(headwords)
+    domains = []
+    for domain_i in xrange(domain_num):
+        # the domain words are named after common words, so they refer to
+        # the common definitions
+        definitions = synthetic_definitions(headwords // 50, seed=domain_i)
+        domains.append(dict(
+            (u'{0}_{1}'.format(word, domain_i), machines)
+            for word, machines in definitions.iteritems()))
+        for word, machines in domains[-1].iteritems():
+            for machine in machines:
+                machine.printname_ = word
+
+    start = time.time()
+    full = []
+    for definitions in domains:
+        merged = dict(common)
+        merged.update(definitions)
+        full.append(build_lexicon(merged, copy_on_write=True))
+    full_time = time.time() - start
+    full_machines = sum(len(static_machines(lexicon)) for lexicon in full)
+    del full
+
+    start = time.time()
+    base = build_lexicon(common, copy_on_write=True)
+    overlays = []
+    for definitions in domains:
+        overlay = base.overlay()
+        overlay.add_static(definitions.itervalues(), copy_on_write=True)
+        overlay.finalize_static()
+        overlays.append(overlay)
+    layered_time = time.time() - start
+    machines = static_machines(base)
+    for overlay in overlays:
+        machines.update(static_machines(overlay))
+    print "full copies: {0:.3f} s, {1} machines".format(
+        full_time, full_machines)
+    print "overlays: {0:.3f} s, {1} machines".format(
+        layered_time, len(machines))
+
+def lookup(headwords=20000, call_num=200000):
+    lexicon = Lexicon(add_unknown=False)
+    lexicon.add_static(synthetic_definitions(headwords).itervalues())
+    lexicon.finalize_static()
+    overlay = lexicon.overlay()
+    overlay.unknown = {}
+    rand = random.Random(42)
+    words = sorted(lexicon.static)
+    names = ([rand.choice(words) for _ in xrange(500)] +
+             [u'unknown{0}'.format(i) for i in xrange(100)])
+    calls = [rand.choice(names) for _ in xrange(call_num)]
+    for name, target in (('lexicon', lexicon), ('overlay', overlay)):
+        for cache_size in (0, Lexicon.LOOKUP_CACHE_SIZE):
+            target.LOOKUP_CACHE_SIZE = cache_size
+            # the active copies of the lower machines are not looked up
+            target.clear_active()
+            before, start = target.lookup_cache_info(), time.time()
+            for word in calls:
+                target.get_machine(word)
+            elapsed, after = time.time() - start, target.lookup_cache_info()
+            hits = after['hits'] - before['hits']
+            misses = after['misses'] - before['misses']
+            message = "{0}, cache size {1}: {2:.3f} s, {3} hits, {4} misses"
+            print message.format(name, cache_size, elapsed, hits, misses)
+
+def dat_definitions():
+    """The definitions in the (old format) dat/*_definitions files."""
+    dat_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                           'dat')
+    definitions = []
+    for file_name in sorted(os.listdir(dat_dir)):
+        if not file_name.endswith('_definitions'):
+            continue
+        for line in open(os.path.join(dat_dir, file_name)):
+            if line.startswith('%') or ':' not in line:
+                continue
+            definition = line.split(':', 1)[1].split('%')[0].strip()
+            if definition:
+                definitions.append(definition)
+    return definitions
+
+def parse(repeats=20):
+    parser = DefinitionParser({})
+    definitions = dat_definitions()
+    for name, parse_method in (('pyparsing', parser.parse_pyparsing),
+                               ('descent', parser.parse)):
+        failed, start = 0, time.time()
+        for _ in xrange(repeats):
+            for definition in definitions:
+                # some of the old definitions do not match the grammar
+                try:
+                    parse_method(definition)
+                except Exception:
+                    failed += 1
+        elapsed = time.time() - start
+        print ("{0}: {1} definitions ({2} failed), {3:.3f} s, "
+               "{4:.0f} definitions/s").format(
+                   name, repeats * len(definitions), failed, elapsed,
+                   repeats * len(definitions) / elapsed)
+    # e.g. a HAS [b HAS [c]]
+    definition = u'a'
+    for depth in xrange(1, 6):
+        definition = u'{0} HAS [{1}]'.format(chr(ord('a') + depth), definition)
+        times = []
+        for parse_method in (parser.parse_pyparsing, parser.parse):
+            start = time.time()
+            parse_method(definition)
+            times.append(time.time() - start)
+        print "depth {0}: pyparsing {1:.4f} s, descent {2:.4f} s".format(
+            depth, *times)
+
+def isa(headwords=20000, lookups=100):
+    lexicon = build_lexicon(synthetic_definitions(headwords))
+    rand = random.Random(42)
+    categories = [rand.choice(sorted(lexicon.static)) for _ in xrange(lookups)]
+
+    def scan(category):
+        members = set()
+        for machines in lexicon.static.itervalues():
+            for machine in machines:
+                for child in machine.partitions[0]:
+                    if (child.printname() == 'IS_A' and
+                            child.partitions[1][0] is machine and
+                            child.partitions[2][0].printname() == category):
+                        members.add(machine.printname())
+        return members
+
+    start = time.time()
+    scanned = [scan(category) for category in categories]
+    print "scan: {0:.3f} s".format(time.time() - start)
+    start = time.time()
+    indexed = [lexicon.hyponyms(category) for category in categories]
+    print "index: {0:.3f} s (including building it)".format(
+        time.time() - start)
+    assert scanned == indexed
+    start = time.time()
+    closures = sum(len(lexicon.hyponyms(category, transitive=True))
+                   for category in categories)
+    print "transitive: {0:.3f} s, {1} hyponyms".format(
+        time.time() - start, closures)
+
+def deep(length=100000):
+    machines = [concept_machine(u'word{0}'.format(i)) for i in xrange(length)]
+    for machine, child in zip(machines, machines[1:]):
+        machine.append(child, 0)
+    root = machines[0]
+
+    result, elapsed = timed(root.unique_machines_in_tree)
+    print "unique_machines_in_tree: {0} machines, {1:.3f} s".format(
+        len(result), elapsed)
+    result, elapsed = timed(lambda: list(MachineTraverser.get_nodes(root)))
+    print "MachineTraverser.get_nodes: {0} nodes, {1:.3f} s".format(
+        len(result), elapsed)
+    result, elapsed = timed(MachineGraph.create_from_machines, [root])
+    print "MachineGraph.create_from_machines: {0} edges, {1:.3f} s".format(
+        result.G.number_of_edges(), elapsed)
+    # the output is quadratic in the depth (indentation), so stop earlier
+    result, elapsed = timed(root.to_debug_str, 0, min(length, 2000))
+    print "to_debug_str: {0} lines, {1:.3f} s".format(
+        result.count('\n') + 1, elapsed)
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    command = sys.argv[1]
+    if command == "memory":
+        memory(*map(int, sys.argv[2:3]))
+    elif command == "append":
+        append(*map(int, sys.argv[2:3]))
+    elif command == "frozen":
+        frozen(*map(int, sys.argv[2:3]))
+    elif command == "rebuild":
+        rebuild(*map(int, sys.argv[2:3]))
+    elif command == "longrun":
+        longrun(*map(int, sys.argv[2:3]))
+    elif command == "hashcons":
+        hashcons(*map(int, sys.argv[2:4]))
+    elif command == "bulk":
+        bulk(*map(int, sys.argv[2:3]))
+    elif command == "patch":
+        patch(*map(int, sys.argv[2:4]))
+    elif command == "activate":
+        activate(*map(int, sys.argv[2:3]))
+    elif command == "active":
+        active(*map(int, sys.argv[2:4]))
+    elif command == "expand":
+        expand(*map(int, sys.argv[2:4]))
+    elif command == "batch":
+        batch(*map(int, sys.argv[2:4]))
+    elif command == "matrix":
+        matrix(*map(int, sys.argv[2:3]))
+    elif command == "lazy":
+        lazy(*map(int, sys.argv[2:4]))
+    elif command == "serialize":
+        serialize(*map(int, sys.argv[2:3]))
+    elif command == "mapped":
+        mapped(*map(int, sys.argv[2:4]))
+    elif command == "layers":
+        layers(*map(int, sys.argv[2:4]))
+    elif command == "lookup":
+        lookup(*map(int, sys.argv[2:4]))
+    elif command == "parse":
+        parse(*map(int, sys.argv[2:3]))
+    elif command == "isa":
+        isa(*map(int, sys.argv[2:4]))
+    elif command == "deep":
+        deep(*map(int, sys.argv[2:3]))
+    else:
+        raise Exception("Unknown command: {0}".format(command))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""The store of the active machines of a Lexicon."""
+
+class ActiveStore(object):
+    """
+    Stores the active machines by their printnames, and whether they have
+    been expanded. The first machine added with a printname is its primary
+    machine (see primary()).
+
+    It can also be read as the <tt>{printname: {machine: expanded}}</tt> dict
+    that Lexicon.active used to be (@c in, @c len, iteration, iteritems() and
+    indexing, which returns a new dict).
+
+    clear() is O(1): the entries are tagged with the number of the current
+    "epoch", and clear() just starts a new one. The stale entries are dropped
+    in bulk once there are enough of them.
+    """
+    # the number of stale machines that triggers dropping the stale entries
+    PURGE_THRESHOLD = 4096
+
+    def __init__(self):
+        self.__epoch = 0
+        # printname -> [epoch, machines]
+        self.__entries = {}
+        # machine -> epoch, for the active and the expanded machines
+        self.__members = {}
+        self.__expanded = {}
+        # the machines that may be unexpanded, in the order they were added
+        self.__unexpanded = []
+        self.__len = 0
+        self.__added = 0
+        self.__stale = 0
+
+    def add(self, machine, expanded=False):
+        """
+        Adds @p machine (if not yet active), and marks it expanded if
+        @p expanded is @c True.
+        @return @c True if the printname of @p machine was not active yet.
+        """
+        epoch = self.__epoch
+        printname = machine.printname()
+        entry = self.__entries.get(printname)
+        new_printname = entry is None or entry[0] != epoch
+        if new_printname:
+            entry = [epoch, []]
+            self.__entries[printname] = entry
+            self.__len += 1
+        if self.__members.get(machine) != epoch:
+            entry[1].append(machine)
+            self.__members[machine] = epoch
+            self.__added += 1
+            if not expanded:
+                self.__unexpanded.append(machine)
+        if expanded:
+            self.__expanded[machine] = epoch
+        return new_printname
+
+    def set_expanded(self, machine):
+        """Marks the (active) @p machine as expanded."""
+        self.__expanded[machine] = self.__epoch
+
+    def is_expanded(self, machine):
+        """Raises KeyError if @p machine is not active."""
+        if not self.contains_machine(machine):
+            raise KeyError(machine)
+        return self.__expanded.get(machine) == self.__epoch
+
+    def contains_machine(self, machine):
+        return self.__members.get(machine) == self.__epoch
+
+    def primary(self, printname):
+        """The first machine added with @p printname. Raises KeyError if
+        @p printname is not active."""
+        return self.machines(printname)[0]
+
+    def machines(self, printname):
+        """The machines with @p printname, in the order they were added."""
+        entry = self.__entries.get(printname)
+        if entry is None or entry[0] != self.__epoch:
+            raise KeyError(printname)
+        return entry[1]
+
+    def expanded(self):
+        """The list of the expanded machines."""
+        return [machine for machine in self.all_machines()
+                if self.__expanded.get(machine) == self.__epoch]
+
+    def unexpanded(self):
+        """The list of the machines not expanded yet, in the order they were
+        added. The queue is pruned of the expanded machines in the process,
+        so the cost is proportional to the machines still unexpanded at the
+        last call plus the ones added since."""
+        epoch = self.__epoch
+        self.__unexpanded = [machine for machine in self.__unexpanded
+                             if self.__expanded.get(machine) != epoch]
+        return list(self.__unexpanded)
+
+    def all_machines(self):
+        for printname in self:
+            for machine in self.__entries[printname][1]:
+                yield machine
+
+    def clear(self):
+        """Makes all machines inactive."""
+        self.__epoch += 1
+        self.__len = 0
+        self.__unexpanded = []
+        self.__stale += self.__added
+        self.__added = 0
+        if self.__stale >= ActiveStore.PURGE_THRESHOLD:
+            self.purge()
+
+    def purge(self):
+        """Drops the entries of the machines that are not active anymore."""
+        epoch = self.__epoch
+        self.__entries = dict(
+            (printname, entry) for printname, entry
+            in self.__entries.iteritems() if entry[0] == epoch)
+        self.__members = dict(
+            (machine, machine_epoch) for machine, machine_epoch
+            in self.__members.iteritems() if machine_epoch == epoch)
+        self.__expanded = dict(
+            (machine, machine_epoch) for machine, machine_epoch
+            in self.__expanded.iteritems() if machine_epoch == epoch)
+        self.__stale = 0
+
+    # The dict interface
+
+    def __contains__(self, printname):
+        entry = self.__entries.get(printname)
+        return entry is not None and entry[0] == self.__epoch
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        epoch = self.__epoch
+        return (printname for printname, entry in self.__entries.iteritems()
+                if entry[0] == epoch)
+
+    def keys(self):
+        return list(self)
+
+    def __getitem__(self, printname):
+        epoch = self.__epoch
+        return dict((machine, self.__expanded.get(machine) == epoch)
+                    for machine in self.machines(printname))
+
+    def get(self, printname, default=None):
+        if printname in self:
+            return self[printname]
+        return default
+
+    def iteritems(self):
+        for printname in self:
+            yield printname, self[printname]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return [machines for _, machines in self.iteritems()]
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
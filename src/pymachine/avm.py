@@ -86,6 +86,15 @@ class AVM(object):
                 ret[k] = unicode(v)
         return ret
 
+    def __copy__(self):
+        """Returns a copy with its own values (the matchers are shared)."""
+        avm = AVM(self.name)
+        for key, value in self.__data.iteritems():
+            avm.__data[key] = list(value)
+        if self.bool_str is not None:
+            avm.set_satisfaction(self.bool_str)
+        return avm
+
     def clear(self):
         keys = self.__data.keys()
         for key in keys:
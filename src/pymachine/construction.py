@@ -2,7 +2,7 @@ import logging
 import re
 from collections import defaultdict
 from itertools import permutations
-from copy import deepcopy as copy
+from copy import copy as shallow_copy, deepcopy as copy
 
 from fst import FSA, FST
 from matcher import KRPosMatcher
@@ -28,6 +28,17 @@ class Construction(object):
 
         self.type_ = type_
 
+    def __copy__(self):
+        """
+        Returns a copy with its own control, which can be run at the same time
+        as this construction (e.g. in another active context, see
+        Lexicon.context()).
+        """
+        construction = self.__class__.__new__(self.__class__)
+        construction.__dict__.update(self.__dict__)
+        construction.control = shallow_copy(self.control)
+        return construction
+
     def check(self, seq):
         #don't create debug messages unless necessary, will slow down SA
         #logging.debug((u"Checking {0} construction for matching with " +
@@ -156,6 +167,14 @@ class VerbConstruction(Construction):
         f = open('control.dot', 'w')
         f.write(self.control.to_dot())
 
+    def __copy__(self):
+        """Returns a copy with its own working area (and a control whose
+        operators fill it)."""
+        construction = Construction.__copy__(self)
+        construction.working_area = [Machine(None, KRPosControl('stem/VERB'))]
+        construction.control = construction.generate_control()
+        return construction
+
     def generate_control(self):
         arguments = self.matchers.keys()
 
@@ -244,6 +263,12 @@ class AVMConstruction(Construction):
         Construction.__init__(
             self, avm.name + 'Construction', control, type_=Construction.AVM)
 
+    def __copy__(self):
+        """Returns a copy that fills a copy of the AVM."""
+        construction = Construction.__copy__(self)
+        construction.avm = self.avm.__copy__()
+        return construction
+
     def generate_phi(self):
         phi = {}
         for key in self.avm:
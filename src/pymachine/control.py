@@ -6,9 +6,23 @@ import logging
 from hunmisc.utils.readkr import kr_to_dictionary as kr2dict
 
 class Control(object):
+    __slots__ = ('machine',)
+
     def __init__(self, machine=None):
         self.set_machine(machine)
 
+    def __getstate__(self):
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in self.__class__.__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        return state
+
+    def __setstate__(self, state):
+        for attr, value in state.iteritems():
+            setattr(self, attr, value)
+
     def set_machine(self, machine):
         """Sets the machine the control controls."""
         from pymachine.machine import Machine
@@ -23,18 +37,24 @@ class Control(object):
         if lines is None:
             lines = list()
         name = self.__class__.__name__
+        # the id of the machine (see Machine.id) is the same in every run,
+        # unlike id(self)
         lines.append('{0:>{1}}:{2}'.format(
             name, 2 * depth + len(str(name)),
-            id(self)))
+            self.machine.id if self.machine is not None else None))
         return '\n'.join(lines)
             
 
 class PosControl(Control):
+    __slots__ = ('pos',)
+
     def __init__(self, pos, machine=None):
         Control.__init__(self, machine)
         self.pos = pos
 
 class KRPosControl(Control):
+    __slots__ = ('kr',)
+
     def __init__(self, pos, machine=None):
         Control.__init__(self, machine)
         self.kr = kr2dict(pos, True)
@@ -55,9 +75,39 @@ class KRPosControl(Control):
 class ConceptControl(Control):
     """object controlling machines that were not in the sentence, but
     in the main lexicon"""
+    __slots__ = ()
+
+    @staticmethod
+    def shared():
+        """Returns the flyweight ConceptControl instance. Use it for static
+        machines instead of creating a new ConceptControl for each."""
+        return _shared_concept_control
+
+class SharedConceptControl(ConceptControl):
+    """The flyweight ConceptControl shared by the static machines. As it
+    belongs to many machines at once, its machine attribute is always
+    @c None, and it is never copied."""
+    __slots__ = ()
+
+    def set_machine(self, machine):
+        self.machine = None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # pickled by reference to the module level instance
+        return '_shared_concept_control'
+
+_shared_concept_control = SharedConceptControl()
 
 class PluginControl(Control):
     """Control for plugin machines."""
+    __slots__ = ('plugin_url',)
+
     def __init__(self, plugin_url, machine=None):
         Control.__init__(self, machine)
         self.plugin_url = plugin_url
@@ -71,6 +121,8 @@ class PluginControl(Control):
 
 class ElviraPluginControl(PluginControl):
     """Plugin control for the Elvira plugin."""
+    __slots__ = ()
+
     def __init__(self, machine=None):
         PluginControl.__init__(self, 'plugin.Elvira', machine)
 
@@ -0,0 +1,69 @@
+"""The definition graph of a Lexicon as a sparse adjacency matrix."""
+
+class DefinitionMatrix(object):
+    """
+    The definition graph (see Lexicon.extract_definition_graph()) as
+    @c scipy.sparse CSR matrices:
+    - @c matrix[i, j] is 1 if the canonical word <tt>words[j]</tt> appears in
+      the definition of <tt>words[i]</tt>;
+    - @c deep_matrix[i, k] is 1 if the deep case <tt>deep_cases[k]</tt>
+      appears in the definition of <tt>words[i]</tt>. It is @c None if the
+      deep cases were not extracted.
+
+    @c index and @c deep_index map the words and the deep cases to their
+    indices.
+    """
+    def __init__(self, words, matrix, deep_cases=None, deep_matrix=None):
+        self.words = words
+        self.index = dict((word, i) for i, word in enumerate(words))
+        self.matrix = matrix
+        self.deep_cases = deep_cases
+        self.deep_index = None
+        if deep_cases is not None:
+            self.deep_index = dict(
+                (deep_case, i) for i, deep_case in enumerate(deep_cases))
+        self.deep_matrix = deep_matrix
+
+    @staticmethod
+    def from_rows(words, rows, deep_rows=None):
+        """
+        Creates the matrices from the rows of the definition graph.
+        @param words the headwords, in the order of the rows.
+        @param rows the sets of the (canonical) words in the definitions.
+        @param deep_rows the sets of the deep cases in the definitions, or
+                         @c None.
+        """
+        index = dict((word, i) for i, word in enumerate(words))
+        matrix = DefinitionMatrix.__csr_matrix(rows, index, len(words))
+        if deep_rows is None:
+            return DefinitionMatrix(words, matrix)
+        deep_cases = sorted(set().union(*deep_rows))
+        deep_index = dict((deep_case, i)
+                          for i, deep_case in enumerate(deep_cases))
+        deep_matrix = DefinitionMatrix.__csr_matrix(
+            deep_rows, deep_index, len(deep_cases))
+        return DefinitionMatrix(words, matrix, deep_cases, deep_matrix)
+
+    @staticmethod
+    def __csr_matrix(rows, index, columns):
+        import numpy
+        from scipy.sparse import csr_matrix
+
+        indptr = numpy.zeros(len(rows) + 1, dtype=numpy.int32)
+        for row_i, row in enumerate(rows):
+            indptr[row_i + 1] = indptr[row_i] + len(row)
+        indices = numpy.fromiter(
+            (col for row in rows for col in sorted(index[n] for n in row)),
+            dtype=numpy.int32, count=indptr[-1])
+        data = numpy.ones(len(indices), dtype=numpy.int8)
+        return csr_matrix((data, indices, indptr), shape=(len(rows), columns))
+
+    def definition(self, word):
+        """The words in the definition of @p word."""
+        row = self.matrix.indices[self.matrix.indptr[self.index[word]]:
+                                  self.matrix.indptr[self.index[word] + 1]]
+        return [self.words[col] for col in row]
+
+    def __len__(self):
+        """The number of headwords."""
+        return len(self.words)
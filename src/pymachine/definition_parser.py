@@ -14,7 +14,8 @@ except ImportError:
 from hunmisc.xstring.encoding import decode_from_proszeky
 
 from constants import deep_cases, avm_pre, deep_pre, enc_pre, id_sep
-from pymachine.machine import Machine
+from pymachine.descent_parser import DescentParser, ParseError
+from pymachine.machine import Machine, Partition
 from pymachine.control import ConceptControl
 
 class ParserException(Exception):
@@ -40,6 +41,7 @@ class DefinitionParser(object):
 
     def __init__(self, plur_dict):
         self.plur_dict = plur_dict
+        self.descent_parser = DescentParser()
         self.init_parser()
 
     @classmethod
@@ -175,6 +177,14 @@ class DefinitionParser(object):
         #self.sen = self.definition + LineEnd()
 
     def parse(self, s):
+        """Parses the definition @p s with the hand-written parser (see
+        pymachine.descent_parser), which returns the same lists as
+        parse_pyparsing(), only much faster."""
+        return self.descent_parser.parse(s)
+
+    def parse_pyparsing(self, s):
+        """Parses @p s with the pyparsing grammar, the reference for
+        parse()."""
         return self.definition.parseString(s, parseAll=True).asList()
 
     def create_machine(self, name, partitions):
@@ -190,7 +200,7 @@ class DefinitionParser(object):
             name = self.plur_dict[name]
 
         m = Machine(decode_from_proszeky(name),
-                    ConceptControl(), partitions)
+                    ConceptControl.shared(), partitions)
         if is_plur:
             m.append(self.create_machine('more', 1), 0)
 
@@ -262,7 +272,7 @@ class DefinitionParser(object):
 
                 # unification if there is a machine more than once on the same
                 # partition
-                where.partitions[p_i] = list(set(p))
+                where.partitions[p_i] = Partition(set(p))
 
         machines = defaultdict(list)
         __collect_machines(machine, machines, is_root=True)
@@ -542,7 +552,7 @@ def read(f, plur_filn, printname_index=0, add_indices=False,
                 #    pn, d[pn], "{0}:{1}".format(m, m.partitions)))
             d[m.printname()].add(m)
             logging.debug('\n'+m.to_debug_str())
-        except pyparsing.ParseException, pe:
+        except ParseError, pe:
             print l
             logging.error("Error: "+str(pe))
     return d
@@ -0,0 +1,226 @@
+"""
+A hand-written parser for the grammar of the definitions (see
+definition_parser.DefinitionParser.init_parser()), without pyparsing.
+
+The rules have the semantics of the pyparsing grammar: the alternatives of a
+rule are all tried, and the longest match wins (the first one on a tie), but
+the result of each rule at each position is computed only once, so parsing
+takes linear time instead of time exponential in the nesting depth.
+
+The tokens are matched at character positions, as the grammar does: the
+word classes overlap (e.g. digits are both unary and binary characters), so
+what a word is depends on the rule that reads it. Whitespace is skipped
+before each token, but not inside words (e.g. <tt>dog/12</tt>).
+"""
+
+import re
+import string
+
+from pymachine.constants import avm_pre, deep_pre, enc_pre, id_sep
+
+WHITESPACE = ' \n\t\r'
+
+def _word(chars):
+    return '[{0}]+'.format(re.escape(chars))
+
+_disambig_id = '(?:{0}[0-9]+)?'.format(re.escape(id_sep))
+# the words of the grammar: the unary and binary names, and the words after
+# the prefixes of deep cases, language specific deep cases, AVMs and
+# external pointers
+_unary_word = re.compile('-?' + _word(string.lowercase + '_' + string.digits) +
+                         _disambig_id)
+_binary_word = re.compile(_word(string.uppercase + '_' + string.digits) +
+                          _disambig_id)
+_prefixed_words = [
+    (deep_pre, re.compile(_word(string.uppercase))),
+    ('$', re.compile(_word(string.uppercase + '_'))),
+    (avm_pre, re.compile(_word(string.ascii_letters + '_'))),
+    (enc_pre, re.compile(_word(string.ascii_letters + string.digits + '_-')))]
+
+class ParseError(Exception):
+    """A definition that does not match the grammar."""
+    def __init__(self, text, loc):
+        Exception.__init__(self, "cannot parse {0!r} at {1}".format(text, loc))
+        self.text = text
+        self.loc = loc
+
+class DescentParser(object):
+    """
+    Parses definitions into the nested lists of DefinitionParser.parse().
+
+    Each rule method takes a position in the text and returns the
+    <tt>(end, tokens)</tt> tuple of its match there, or @c None. The
+    grammar rules are memoized per position for the text being parsed.
+    """
+    def parse(self, text):
+        """Returns the parse of the definition @p text, as a list with the
+        list of its expressions."""
+        self.text = text
+        self.length = len(text)
+        self.memo = dict((rule, {}) for rule in (
+            'expression', 'binexpr', 'unexpr', 'argexpr', 'unary'))
+        try:
+            match = self.definition(0)
+            if match is None or self.skip(match[0]) != self.length:
+                raise ParseError(text, match[0] if match else 0)
+            return [match[1]]
+        finally:
+            del self.text, self.memo
+
+    def skip(self, loc):
+        """The position of the next token at or after @p loc."""
+        text, length = self.text, self.length
+        while loc < length and text[loc] in WHITESPACE:
+            loc += 1
+        return loc
+
+    # Tokens
+
+    def literal(self, loc, literal):
+        loc = self.skip(loc)
+        if self.text.startswith(literal, loc):
+            return loc + len(literal), literal
+        return None
+
+    def pattern(self, loc, pattern, skip=True):
+        if skip:
+            loc = self.skip(loc)
+        match = pattern.match(self.text, loc)
+        if match is None:
+            return None
+        return match.end(), match.group()
+
+    def binary(self, loc):
+        # B -> binary word | = REL
+        match = self.pattern(loc, _binary_word)
+        if match is not None:
+            return match
+        return self.sequence(loc, (self.literal, deep_pre),
+                             (self.literal, 'REL'))
+
+    # Rules
+
+    def sequence(self, loc, *parts):
+        """Matches @p parts, <tt>(rule, arguments...)</tt> tuples, one after
+        the other, and returns the list of their tokens."""
+        tokens = []
+        for part in parts:
+            match = part[0](loc, *part[1:])
+            if match is None:
+                return None
+            loc, token = match
+            tokens.append(token)
+        return loc, tokens
+
+    @staticmethod
+    def longest(*matches):
+        """The longest of @p matches (the first one on a tie)."""
+        best = None
+        for match in matches:
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return best
+
+    def memoized(self, rule, loc, parse):
+        memo = self.memo[rule]
+        if loc not in memo:
+            memo[loc] = parse(loc)
+        return memo[loc]
+
+    def unary(self, loc):
+        return self.memoized('unary', loc, self.__unary)
+
+    def __unary(self, loc):
+        start = self.skip(loc)
+        if start == self.length:
+            return None
+        first = self.text[start]
+        # U -> unary word
+        if first == '-' or first not in '=$#@<':
+            return self.pattern(start, _unary_word, False)
+        # U -> = AGT | $ HUN_FROM | # AVM | @ External_url
+        for prefix, word in _prefixed_words:
+            if first == prefix:
+                return self.sequence(start, (self.literal, prefix),
+                                     (self.pattern, word))
+        # U -> < U >
+        return self.sequence(start, (self.literal, '<'), (self.unary,),
+                             (self.literal, '>'))
+
+    def definition(self, loc):
+        # D -> E | E, D
+        match = self.expression(loc)
+        if match is None:
+            return None
+        loc, expression = match
+        expressions = [expression]
+        while True:
+            match = self.sequence(loc, (self.literal, ','),
+                                  (self.expression,))
+            if match is None:
+                return loc, expressions
+            loc, (_, expression) = match
+            expressions.append(expression)
+
+    def expression(self, loc):
+        return self.memoized('expression', loc, self.__expression)
+
+    def __expression(self, loc):
+        return self.longest(
+            # E -> UE
+            self.sequence(loc, (self.unexpr,)),
+            # E -> BE
+            self.sequence(loc, (self.binexpr,)),
+            # E -> U ( E )
+            self.sequence(loc, (self.unary,), (self.literal, '('),
+                          (self.expression,), (self.literal, ')')),
+            # E -> < E >
+            self.sequence(loc, (self.literal, '<'), (self.expression,),
+                          (self.literal, '>')))
+
+    def binexpr(self, loc):
+        return self.memoized('binexpr', loc, self.__binexpr)
+
+    def __binexpr(self, loc):
+        return self.longest(
+            # BE -> A B
+            self.sequence(loc, (self.argexpr,), (self.binary,)),
+            # BE -> B A
+            self.sequence(loc, (self.binary,), (self.argexpr,)),
+            # BE -> A B A
+            self.sequence(loc, (self.argexpr,), (self.binary,),
+                          (self.argexpr,)),
+            # BE -> B [ E; E ]
+            self.sequence(loc, (self.binary,), (self.literal, '['),
+                          (self.expression,), (self.literal, ';'),
+                          (self.expression,), (self.literal, ']')))
+
+    def unexpr(self, loc):
+        return self.memoized('unexpr', loc, self.__unexpr)
+
+    def __unexpr(self, loc):
+        return self.longest(
+            # UE -> U
+            self.sequence(loc, (self.unary,)),
+            # UE -> U [ D ]
+            self.sequence(loc, (self.unary,), (self.literal, '['),
+                          (self.definition,), (self.literal, ']')),
+            # UE -> U ( U )
+            self.sequence(loc, (self.unary,), (self.literal, '('),
+                          (self.unary,), (self.literal, ')')))
+
+    def argexpr(self, loc):
+        return self.memoized('argexpr', loc, self.__argexpr)
+
+    def __argexpr(self, loc):
+        return self.longest(
+            # A -> UE
+            self.sequence(loc, (self.unexpr,)),
+            # A -> [ D ]
+            self.sequence(loc, (self.literal, '['), (self.definition,),
+                          (self.literal, ']')),
+            # A -> < A >
+            self.sequence(loc, (self.literal, '<'), (self.argexpr,),
+                          (self.literal, '>')),
+            # A -> '
+            self.sequence(loc, (self.literal, "'")))
@@ -0,0 +1,110 @@
+"""
+Expansion plans: what Lexicon.expand() does with the static machines of a
+headword, compiled into flat lists that are replayed on the active machines
+(see compile_plan()).
+"""
+
+from pymachine.traversal import Traversal
+
+def compile_plan(static_machines):
+    """
+    Compiles what Lexicon.unify_recursively() does with each of
+    @p static_machines into a flat <tt>(nodes, edges, avm_names, root)</tt>
+    plan:
+    - @c nodes are the <tt>(printname, control)</tt> pairs of the active
+      machines to look up or create, in the order of the walks;
+    - @c edges are the <tt>(parent, partition, child)</tt> appends to do,
+      with indices into @c nodes, in the order of the walks;
+    - @c avm_names are the AVMs (printnames starting with #) to wake;
+    - @c root is the index of the resulting machine (or @c None).
+    The machines with the same printname are unified with the same active
+    machine, so the walks share the nodes, and appends done by an earlier
+    walk (no-ops when replayed) are left out.
+
+    FrozenMachines (see Lexicon.from_frozen()) are walked by their node ids,
+    so no view objects are created.
+    """
+    from pymachine.frozen import FrozenMachine
+    if static_machines and isinstance(static_machines[0], FrozenMachine):
+        graph = static_machines[0].graph
+        static_machines = [m.node for m in static_machines]
+        printname, control, links = graph.printname, graph.control, graph.links
+    else:
+        printname = lambda machine: machine.printname()
+        control = lambda machine: machine.control
+        links = None
+
+    nodes, edges, avm_names = [], [], []
+    # printname -> index in nodes
+    index = {}
+    seen_edges, seen_avms = set(), set()
+
+    def node(name, control):
+        if name not in index:
+            index[name] = len(nodes)
+            nodes.append((name, control))
+        return index[name]
+
+    def edge(parent_i, part_i, child_i):
+        if (parent_i, part_i, child_i) not in seen_edges:
+            seen_edges.add((parent_i, part_i, child_i))
+            edges.append((parent_i, part_i, child_i))
+
+    def avm(name):
+        if name not in seen_avms:
+            seen_avms.add(name)
+            avm_names.append(name)
+
+    root = None
+    for static_machine in static_machines:
+        name = printname(static_machine)
+        if name.startswith('#'):
+            avm(name)
+            continue
+        root = node(name, control(static_machine))
+        # the machines are unified by their printnames, as in the stop set
+        # of Lexicon.unify_recursively()
+        walk = Traversal([static_machine], key=printname, revisits=True,
+                         links=links, exits=True)
+        for child, _, source, part_i, expand in walk:
+            if source is None:
+                continue
+            name = printname(child)
+            if not expand:
+                # a child is appended when it is seen again, or after its
+                # subgraph is unified
+                edge(index[printname(source)], part_i, index[name])
+            elif name.startswith('#'):
+                walk.skip()
+                avm(name)
+            else:
+                node(name, control(child))
+    return nodes, edges, avm_names, root
+
+def merge_plans(plans):
+    """Merges expansion plans (see compile_plan()) into one, with the list
+    of their roots instead of a single root. The nodes with the same
+    printname are merged, and the repeated edges and AVMs are left out."""
+    nodes, edges, avm_names, roots = [], [], [], []
+    # printname -> index in nodes
+    index = {}
+    seen_edges, seen_avms = set(), set()
+    for plan_nodes, plan_edges, plan_avms, root in plans:
+        # index in the plan -> index in nodes
+        remap = []
+        for name, control in plan_nodes:
+            if name not in index:
+                index[name] = len(nodes)
+                nodes.append((name, control))
+            remap.append(index[name])
+        for avm_name in plan_avms:
+            if avm_name not in seen_avms:
+                seen_avms.add(avm_name)
+                avm_names.append(avm_name)
+        for parent_i, part_i, child_i in plan_edges:
+            merged = (remap[parent_i], part_i, remap[child_i])
+            if merged not in seen_edges:
+                seen_edges.add(merged)
+                edges.append(merged)
+        roots.append(remap[root] if root is not None else None)
+    return nodes, edges, avm_names, roots
@@ -0,0 +1,218 @@
+"""
+A flat, recursion-free serialization of machine graphs, definition dicts and
+lexicons.
+
+Pickling machines directly follows their links recursively, which is slow
+on the (deep, cyclic) static graph and can exceed the recursion limit. Here
+the machines are numbered and stored in tables instead, as in
+frozen.FrozenGraph:
+- @c names is the list of the printnames, and @c name_of[i] is the index of
+  the printname of node @c i;
+- @c controls is the list of the controls, without their machines, and
+  @c control_of[i] is the index of the control of node @c i (or -1);
+  @c control_owner[c] is the node that control @c c belongs to (or -1);
+- the partitions of node @c i are the slots
+  <tt>part_start[i] .. part_start[i + 1] - 1</tt>, and the children in slot
+  @c s are <tt>children[child_start[s]:child_start[s + 1]]</tt>;
+- @c ids[i] is the Machine.id of node @c i.
+The parent links are rebuilt from the partitions, so links from machines
+that are not stored are dropped.
+
+The tables are written as a single pickle (with the highest protocol), in
+which the arrays are byte strings, after a magic string. The loaders fall
+back to plain pickles for files without it.
+"""
+
+from array import array
+import copy
+import cPickle
+import gc
+
+from pymachine.machine import (Machine, Partition, intern_printname,
+                               reserve_machine_id)
+from pymachine.traversal import number_machines
+
+MAGIC = 'PMFLAT01'
+
+# the tables that are arrays, and their typecodes
+_ARRAYS = (('name_of', 'i'), ('control_of', 'i'), ('control_owner', 'i'),
+           ('part_start', 'i'), ('child_start', 'i'), ('children', 'i'),
+           ('ids', 'l'))
+
+def flatten(machines, nodes):
+    """Returns the tables (see the module docstring) of @p machines, which
+    are numbered by @p nodes (see traversal.number_machines())."""
+    tables = dict((name, array(typecode)) for name, typecode in _ARRAYS)
+    names, name_ids, controls, control_ids = [], {}, [], {}
+    tables['part_start'].append(0)
+    tables['child_start'].append(0)
+    for machine in machines:
+        name = machine.printname_
+        if name not in name_ids:
+            name_ids[name] = len(names)
+            names.append(name)
+        tables['name_of'].append(name_ids[name])
+
+        control = machine.control
+        if control is None:
+            tables['control_of'].append(-1)
+        else:
+            if id(control) not in control_ids:
+                control_ids[id(control)] = len(controls)
+                owner = nodes.get(control.machine, -1)
+                control = copy.copy(control)
+                if control.machine is not None:
+                    control.machine = None
+                controls.append(control)
+                tables['control_owner'].append(owner)
+            tables['control_of'].append(control_ids[id(machine.control)])
+
+        for part in machine.partitions:
+            tables['children'].extend(nodes[child] for child in part)
+            tables['child_start'].append(len(tables['children']))
+        tables['part_start'].append(len(tables['child_start']) - 1)
+        tables['ids'].append(machine.id)
+
+    flat = dict((name, table.tostring()) for name, table in tables.iteritems())
+    flat['names'] = names
+    flat['controls'] = controls
+    return flat
+
+def unflatten(flat):
+    """Creates the machines of the tables @p flat (see flatten()), and
+    returns them as a list, in the order of their nodes."""
+    # the cyclic garbage collector would run many times while the machines
+    # are created, for nothing
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _unflatten(flat)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _unflatten(flat):
+    tables = {}
+    for name, typecode in _ARRAYS:
+        tables[name] = array(typecode)
+        tables[name].fromstring(flat[name])
+    names = [intern_printname(name) for name in flat['names']]
+    controls = flat['controls']
+    name_of, control_of = tables['name_of'], tables['control_of']
+    part_start, child_start = tables['part_start'], tables['child_start']
+    children, ids = tables['children'], tables['ids']
+
+    machines = []
+    new_machine = Machine.__new__
+    for node in xrange(len(name_of)):
+        machine = new_machine(Machine)
+        machine.id = ids[node]
+        # the names are interned already
+        machine._printname = names[name_of[node]]
+        control_i = control_of[node]
+        machine.control = controls[control_i] if control_i >= 0 else None
+        machine.parents = set()
+        machines.append(machine)
+    for control, owner in zip(controls, tables['control_owner']):
+        if owner >= 0:
+            control.machine = machines[owner]
+    if ids:
+        reserve_machine_id(max(ids))
+
+    for node, machine in enumerate(machines):
+        partitions = []
+        part_i = 0
+        for slot in xrange(part_start[node], part_start[node + 1]):
+            part = Partition([machines[child] for child in children[
+                child_start[slot]:child_start[slot + 1]]])
+            link = (machine, part_i)
+            for child in part:
+                child.parents.add(link)
+            partitions.append(part)
+            part_i += 1
+        machine.partitions = partitions
+    return machines
+
+def _write(data, file_obj):
+    file_obj.write(MAGIC)
+    cPickle.dump(data, file_obj, cPickle.HIGHEST_PROTOCOL)
+
+def _read(file_obj):
+    """Returns the data written by _write(), or @c None (and rewinds
+    @p file_obj) if the file is not in the flat format."""
+    if file_obj.read(len(MAGIC)) != MAGIC:
+        file_obj.seek(0)
+        return None
+    return cPickle.load(file_obj)
+
+def dump_definitions(definitions, file_obj):
+    """
+    Writes @p definitions, a <tt>{printname: machine or set of
+    machines}</tt> dict (see definition_parser.read() and
+    Wrapper.get_ext_definitions()), to @p file_obj (opened in binary mode).
+    """
+    keys = list(definitions)
+    roots = []
+    for key in keys:
+        value = definitions[key]
+        roots.extend([value] if isinstance(value, Machine) else value)
+    machines, nodes = number_machines(roots)
+    data = flatten(machines, nodes)
+    data['keys'] = keys
+    # a node for a machine, a tuple of nodes for a set
+    data['values'] = [
+        nodes[value] if isinstance(value, Machine) else
+        tuple(nodes[machine] for machine in value)
+        for value in (definitions[key] for key in keys)]
+    _write(data, file_obj)
+
+def load_definitions(file_obj):
+    """Reads the definitions written by dump_definitions() (or pickled)
+    from @p file_obj."""
+    data = _read(file_obj)
+    if data is None:
+        return cPickle.load(file_obj)
+    machines = unflatten(data)
+    return dict((key, machines[value] if isinstance(value, int) else
+                 set(machines[node] for node in value))
+                for key, value in zip(data['keys'], data['values']))
+
+def dump_lexicon(lexicon, file_obj):
+    """
+    Writes @p lexicon to @p file_obj (opened in binary mode). The static
+    graph is stored in the tables, the rest of the lexicon (e.g. the
+    constructions) is pickled as usual. The active machines are not saved.
+    Overlays and active contexts (see Lexicon.is_layered()) cannot be saved,
+    as their static graphs refer to the lexicons they are layered over: save
+    the base lexicon instead.
+    """
+    if lexicon.is_layered():
+        raise TypeError("an overlay or an active context cannot be saved")
+    state = lexicon.__getstate__()
+    static = state.pop('static')
+    state.pop('active', None)
+    print_names = list(static)
+    machines, nodes = number_machines(
+        machine for print_name in print_names
+        for machine in static[print_name])
+    data = flatten(machines, nodes)
+    data['static'] = [(print_name,
+                       tuple(nodes[machine] for machine in static[print_name]))
+                      for print_name in print_names]
+    data['state'] = state
+    _write(data, file_obj)
+
+def load_lexicon(file_obj):
+    """Reads a lexicon written by dump_lexicon() (or pickled) from
+    @p file_obj."""
+    from pymachine.lexicon import Lexicon
+    data = _read(file_obj)
+    if data is None:
+        return cPickle.load(file_obj)
+    machines = unflatten(data)
+    lexicon = Lexicon()
+    lexicon.__setstate__(data['state'])
+    lexicon.static = dict(
+        (print_name, [machines[node] for node in static_nodes])
+        for print_name, static_nodes in data['static'])
+    return lexicon
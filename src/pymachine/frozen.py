@@ -0,0 +1,305 @@
+"""Read-only, array-backed snapshot of the static graph of a Lexicon."""
+
+from array import array
+from collections import Mapping
+from itertools import chain, izip, repeat
+
+from pymachine.constants import deep_pre, avm_pre, enc_pre
+from pymachine.machine import Machine
+from pymachine.lexicon import definition_words, lookup_static
+from pymachine.traversal import CHILDREN, PARENTS, number_machines
+
+class FrozenGraph(object):
+    """
+    A compact, read-only copy of a static graph. Machines are replaced by
+    integer node ids, and the graph is stored in flat arrays:
+    - @c name_of[i] is the index of the printname of node @c i in @c names;
+    - @c control_of[i] is the index of its control in @c controls (or -1);
+    - the partitions of node @c i are the slots
+      <tt>part_start[i] .. part_start[i + 1] - 1</tt>, and the children in
+      slot @c s are <tt>children[child_start[s]:child_start[s + 1]]</tt>;
+    - the parent links of node @c i are
+      <tt>parents[parent_start[i]:parent_start[i + 1]]</tt>, with the
+      corresponding partition indices in @c parent_parts.
+
+    Create one with Lexicon.freeze(). The nodes can be traversed via the
+    id-based methods below, or wrapped in FrozenMachine objects, which behave
+    like (immutable) machines.
+    """
+    def __init__(self):
+        self.names = []
+        self.short_names = []
+        self.controls = []
+        self.name_of = array('i')
+        self.control_of = array('i')
+        self.part_start = array('i', [0])
+        self.child_start = array('i', [0])
+        self.children = array('i')
+        self.parent_start = array('i', [0])
+        self.parents = array('i')
+        self.parent_parts = array('B')
+        # printname -> tuple of node ids, as in Lexicon.static
+        self.static = {}
+        self.static_disambig = {}
+
+    @staticmethod
+    def from_static(static, static_disambig):
+        """Creates the snapshot of a static graph (see Lexicon.static)."""
+        graph = FrozenGraph()
+        # in a deterministic order
+        machines, ids = number_machines(chain.from_iterable(
+            static[print_name] for print_name in sorted(static)))
+
+        name_ids, control_ids = {}, {}
+        for machine in machines:
+            name = machine.printname_
+            if name not in name_ids:
+                name_ids[name] = len(graph.names)
+                graph.names.append(name)
+                graph.short_names.append(machine.printname())
+            graph.name_of.append(name_ids[name])
+
+            control = machine.control
+            if control is None:
+                graph.control_of.append(-1)
+            else:
+                if id(control) not in control_ids:
+                    control_ids[id(control)] = len(graph.controls)
+                    graph.controls.append(control)
+                graph.control_of.append(control_ids[id(control)])
+
+            for part in machine.partitions:
+                graph.children.extend(ids[m] for m in part)
+                graph.child_start.append(len(graph.children))
+            graph.part_start.append(len(graph.child_start) - 1)
+
+            # parent links from outside the static graph are dropped
+            parent_links = sorted((ids[parent], part_i)
+                                  for parent, part_i in machine.parents
+                                  if parent in ids)
+            for parent, part_i in parent_links:
+                graph.parents.append(parent)
+                graph.parent_parts.append(part_i)
+            graph.parent_start.append(len(graph.parents))
+
+        for print_name, static_machines in static.iteritems():
+            graph.static[print_name] = tuple(ids[m] for m in static_machines)
+        graph.static_disambig = dict(
+            (name, set(names)) for name, names in static_disambig.iteritems())
+        return graph
+
+    def __len__(self):
+        """The number of nodes."""
+        return len(self.name_of)
+
+    def static_machines(self):
+        """Returns the static graph as a read-only <tt>{printname: list of
+        FrozenMachines}</tt> mapping, like Lexicon.static."""
+        return StaticMachines(self)
+
+    def machine(self, node):
+        """Returns the FrozenMachine view of @p node."""
+        return FrozenMachine(self, node)
+
+    def get_static_machine(self, print_name):
+        """Lexicon.get_static_machine() with FrozenMachines."""
+        return [self.machine(node) for node in self.get_static_nodes(
+            print_name)]
+
+    def get_static_nodes(self, print_name):
+        """Lexicon.get_static_machine() with node ids."""
+        return lookup_static(self.static, self.static_disambig, print_name)
+
+    # Node accessors
+
+    def printname_(self, node):
+        """The full printname of @p node (see Machine.printname_)."""
+        return self.names[self.name_of[node]]
+
+    def printname(self, node):
+        """The printname of @p node (see Machine.printname())."""
+        return self.short_names[self.name_of[node]]
+
+    def control(self, node):
+        control_i = self.control_of[node]
+        return self.controls[control_i] if control_i >= 0 else None
+
+    def part_num(self, node):
+        return self.part_start[node + 1] - self.part_start[node]
+
+    def partition(self, node, part_i):
+        """The ids of the children of @p node in partition @p part_i."""
+        slot = self.part_start[node] + part_i
+        return self.children[self.child_start[slot]:
+                             self.child_start[slot + 1]]
+
+    def partitions(self, node):
+        return [self.partition(node, part_i)
+                for part_i in xrange(self.part_num(node))]
+
+    def all_children(self, node):
+        """The ids of the children in all partitions of @p node, in order.
+        These are stored contiguously, so no copying of lists is needed."""
+        return self.children[self.child_start[self.part_start[node]]:
+                             self.child_start[self.part_start[node + 1]]]
+
+    def children_of(self, node):
+        """The ids of all children of @p node (see Machine.children()),
+        without duplicates, in partition order."""
+        children = self.all_children(node)
+        if len(children) < 2:
+            return children
+        unique, seen = [], set()
+        for child in children:
+            if child not in seen:
+                seen.add(child)
+                unique.append(child)
+        return unique
+
+    def parents_of(self, node):
+        """The <tt>(parent id, partition)</tt> tuples of @p node."""
+        start, end = self.parent_start[node], self.parent_start[node + 1]
+        return zip(self.parents[start:end], self.parent_parts[start:end])
+
+    def links(self, node, direction=CHILDREN):
+        """The <tt>(neighbour id, partition)</tt> tuples of @p node in
+        @p direction (see traversal.Traversal), in the order Traversal visits
+        the links of a machine, e.g.
+        @code
+        Traversal([node], links=graph.links)
+        @endcode"""
+        links = []
+        if direction != PARENTS:
+            children, child_start = self.children, self.child_start
+            first = self.part_start[node]
+            for part_i in xrange(self.part_start[node + 1] - first):
+                slot = first + part_i
+                links.extend(izip(children[child_start[slot]:
+                                           child_start[slot + 1]],
+                                  repeat(part_i)))
+        if direction != CHILDREN:
+            links.extend(self.parents_of(node))
+        return links
+
+    def parent_nodes(self, node):
+        """The ids of the parents of @p node."""
+        return self.parents[self.parent_start[node]:
+                            self.parent_start[node + 1]]
+
+    def fancy(self, node):
+        """See Machine.fancy()."""
+        return self.printname_(node)[0] in (deep_pre, avm_pre, enc_pre)
+
+    def deep_case(self, node):
+        return self.printname_(node)[0] == deep_pre
+
+    # Algorithms
+
+    def extract_definition_graph(self, deep_cases=False):
+        """Lexicon.extract_definition_graph() on the snapshot."""
+        def_graph = {}
+        canonicals = set(self.machine(nodes[0])
+                         for nodes in self.static.itervalues())
+        for name in self.static.iterkeys():
+            def_graph[name] = [Machine(name)]
+        for name, static_nodes in self.static.iteritems():
+            if self.fancy(static_nodes[0]):
+                continue
+            def_machine = def_graph[name][0]
+            for word, deep_case in definition_words(
+                    self.machine(static_nodes[0]), canonicals, deep_cases,
+                    self.get_static_machine):
+                if deep_case:
+                    def_machine.append(Machine(word))
+                elif def_graph[word][0] != def_machine:
+                    def_machine.append(def_graph[word][0])
+        return def_graph
+
+class StaticMachines(Mapping):
+    """The static graph of a FrozenGraph, with FrozenMachines (see
+    FrozenGraph.static_machines())."""
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, print_name):
+        return [self.graph.machine(node)
+                for node in self.graph.static[print_name]]
+
+    def __contains__(self, print_name):
+        return print_name in self.graph.static
+
+    def __len__(self):
+        return len(self.graph.static)
+
+    def __iter__(self):
+        return iter(self.graph.static)
+
+def _frozen_machine(graph, node):
+    """Unpickles a FrozenMachine."""
+    return FrozenMachine(graph, node)
+
+class FrozenMachine(Machine):
+    """
+    A node of a FrozenGraph that can be used (read-only) wherever a Machine
+    is expected. Views of the same node compare equal. Mutating methods raise
+    a TypeError.
+    """
+    __slots__ = ('graph', 'node')
+
+    def __init__(self, graph, node):
+        self.graph = graph
+        self.node = node
+
+    def __reduce__(self):
+        return (_frozen_machine, (self.graph, self.node))
+
+    def __eq__(self, other):
+        return (isinstance(other, FrozenMachine) and
+                self.node == other.node and self.graph is other.graph)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.graph), self.node))
+
+    @property
+    def id(self):
+        return self.node
+
+    @property
+    def _printname(self):
+        return self.graph.printname_(self.node)
+
+    @property
+    def control(self):
+        return self.graph.control(self.node)
+
+    @property
+    def partitions(self):
+        machine = self.graph.machine
+        return [[machine(child) for child in part]
+                for part in self.graph.partitions(self.node)]
+
+    @property
+    def parents(self):
+        machine = self.graph.machine
+        return set((machine(parent), part_i)
+                   for parent, part_i in self.graph.parents_of(self.node))
+
+    def printname(self):
+        return self.graph.printname(self.node)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __frozen(self, *args, **kwargs):
+        raise TypeError("{0} is part of a frozen graph".format(self))
+
+    set_control = __frozen
+    unify = __frozen
+    append = __frozen
+    remove = __frozen
+    add_parent_link = __frozen
+    del_parent_link = __frozen
+    detach = __frozen
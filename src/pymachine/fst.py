@@ -15,6 +15,19 @@ class FSA(object):
         self.transitions = defaultdict(dict)
         self.active_states = None
 
+    def __copy__(self):
+        """
+        Returns an automaton that reads independently of this one: it has its
+        own active states, but shares the states and transitions, which are
+        not changed once the automaton is built. (A deep copy would also copy
+        the matchers and operators, and with them e.g. the lexicon of an
+        ExpandOperator.)
+        """
+        fsa = self.__class__.__new__(self.__class__)
+        fsa.__dict__.update(self.__dict__)
+        fsa.active_states = None
+        return fsa
+
     def __str__(self):
         return "{0}\nstates: {1}\ntransitions: {2}\ninitial states: {3}\
             final states: {4}".format(
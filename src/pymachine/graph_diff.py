@@ -0,0 +1,114 @@
+"""Diffs of machine graphs and of definition dicts, and patches that apply
+them to a finalized Lexicon."""
+
+from collections import Counter
+
+from pymachine.traversal import Traversal
+
+def node_keys(roots):
+    """
+    Returns the keys of the machines under @p roots, by printname and
+    structure: the key of a machine is the Machine.fingerprint() of the graph
+    under it, which starts with its printname.
+    """
+    return dict((machine, machine.fingerprint())
+                for machine in Traversal(roots).machines())
+
+class GraphDiff(object):
+    """
+    The difference between two machine graphs. Machines are keyed by
+    node_keys(), so identical machines of the two graphs match. Nodes are
+    counted in @c Counter objects, as a graph can contain identical machines;
+    edges are <tt>(parent key, partition, child key)</tt> tuples.
+    """
+    def __init__(self, added_nodes, removed_nodes, added_edges,
+                 removed_edges):
+        self.added_nodes = added_nodes
+        self.removed_nodes = removed_nodes
+        self.added_edges = added_edges
+        self.removed_edges = removed_edges
+
+    @staticmethod
+    def between(old_roots, new_roots):
+        """Computes the diff between the graphs under @p old_roots and
+        @p new_roots (machines or iterables of machines)."""
+        old_nodes, old_edges = GraphDiff.__nodes_and_edges(old_roots)
+        new_nodes, new_edges = GraphDiff.__nodes_and_edges(new_roots)
+        return GraphDiff(new_nodes - old_nodes, old_nodes - new_nodes,
+                         new_edges - old_edges, old_edges - new_edges)
+
+    @staticmethod
+    def __nodes_and_edges(roots):
+        keys = node_keys(roots)
+        nodes = Counter(keys.itervalues())
+        edges = Counter()
+        for machine, key in keys.iteritems():
+            for part_i, part in enumerate(machine.partitions):
+                for child in part:
+                    edges[(key, part_i, keys[child])] += 1
+        return nodes, edges
+
+    def __nonzero__(self):
+        return bool(self.added_nodes or self.removed_nodes or
+                    self.added_edges or self.removed_edges)
+
+    def __unicode__(self):
+        return u"+{0}/-{1} nodes, +{2}/-{3} edges".format(
+            sum(self.added_nodes.itervalues()),
+            sum(self.removed_nodes.itervalues()),
+            sum(self.added_edges.itervalues()),
+            sum(self.removed_edges.itervalues()))
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+class DefinitionPatch(object):
+    """
+    The changes between two definition dicts (<tt>{printname: set of
+    machines}</tt>, see definition_parser.read()), per headword. It can be
+    applied to a Lexicon built from the old definitions, instead of building
+    a new one from scratch.
+    """
+    def __init__(self, removed=(), updated=None, diffs=None):
+        """
+        @param removed the headwords whose definitions are removed.
+        @param updated the new definitions of the headwords that are added or
+                       changed.
+        @param diffs the GraphDiff of the definitions of the changed
+                     headwords.
+        """
+        self.removed = set(removed)
+        self.updated = updated if updated is not None else {}
+        self.diffs = diffs if diffs is not None else {}
+
+    @staticmethod
+    def between(old_definitions, new_definitions):
+        """Computes the patch from @p old_definitions to
+        @p new_definitions."""
+        patch = DefinitionPatch(
+            set(old_definitions) - set(new_definitions))
+        for print_name, machines in new_definitions.iteritems():
+            old_machines = old_definitions.get(print_name)
+            if old_machines is None:
+                patch.updated[print_name] = machines
+                continue
+            old_fingerprints = Counter(m.fingerprint() for m in old_machines)
+            new_fingerprints = Counter(m.fingerprint() for m in machines)
+            if old_fingerprints != new_fingerprints:
+                patch.updated[print_name] = machines
+                patch.diffs[print_name] = GraphDiff.between(
+                    old_machines, machines)
+        return patch
+
+    def __len__(self):
+        """The number of headwords changed."""
+        return len(self.removed) + len(self.updated)
+
+    def apply(self, lexicon):
+        """Applies the patch to the finalized @p lexicon. The definitions in
+        the patch are not modified."""
+        for print_name in sorted(self.removed):
+            if print_name in lexicon.static:
+                lexicon.remove_definition(print_name)
+        for print_name in sorted(self.updated):
+            lexicon.replace_definition(print_name, self.updated[print_name])
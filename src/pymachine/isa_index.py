@@ -0,0 +1,60 @@
+"""The IS_A index of a static graph (see Lexicon.hyponyms())."""
+
+from pymachine.constants import id_sep
+
+# directions
+HYPONYMS, HYPERNYMS = xrange(2)
+
+class IsaIndex(object):
+    """
+    The IS_A relations of a static graph: category -> the printnames of its
+    direct hyponyms, printname -> its direct hypernyms, and the transitive
+    closures computed so far. It is built from the IS_A machines only, which
+    are all kept in <tt>static['IS_A']</tt>, so the rest of the graph is not
+    scanned.
+    """
+    def __init__(self, is_a_machines):
+        """
+        @param is_a_machines the static IS_A machines (of all the layers, see
+                             Lexicon.overlay()).
+        """
+        hyponyms, hypernyms = {}, {}
+        for is_a in is_a_machines:
+            partitions = is_a.partitions
+            # binaries have an extra first partition with three_parts
+            left = 1 if len(partitions) >= 3 else 0
+            if len(partitions) < left + 2:
+                continue
+            for hyponym in partitions[left]:
+                for hypernym in partitions[left + 1]:
+                    hyponyms.setdefault(hypernym.printname(), set()).add(
+                        hyponym.printname())
+                    hypernyms.setdefault(hyponym.printname(), set()).add(
+                        hypernym.printname())
+        self.__related = tuple(
+            dict((name, frozenset(names)) for name, names in index.iteritems())
+            for index in (hyponyms, hypernyms))
+        self.__closures = {}
+
+    def lookup(self, direction, print_name, transitive=False):
+        """
+        Returns the printnames related to @p print_name in @p direction
+        (HYPONYMS or HYPERNYMS), as a frozenset.
+        @param transitive if @c True, the related words of the related words
+                          etc. are returned, too.
+        """
+        index = self.__related[direction]
+        print_name = print_name.split(id_sep)[0]
+        if not transitive:
+            return index.get(print_name, frozenset())
+        closure = self.__closures.get((direction, print_name))
+        if closure is None:
+            closure, stack = set(), [print_name]
+            while stack:
+                for related in index.get(stack.pop(), ()):
+                    if related not in closure:
+                        closure.add(related)
+                        stack.append(related)
+            closure = frozenset(closure)
+            self.__closures[(direction, print_name)] = closure
+        return closure
@@ -1,40 +1,315 @@
 import logging
 from itertools import chain
 from collections import Iterable, defaultdict
+from contextlib import contextmanager
 import copy
+import gc
+from multiprocessing import Pool
 
-from pymachine.machine import Machine
+from pymachine.machine import Machine, Partition
+from pymachine.active import ActiveStore
+from pymachine.expansion import compile_plan, merge_plans
+from pymachine.isa_index import IsaIndex, HYPONYMS, HYPERNYMS
+from pymachine.lookup_cache import LookupCache
+from pymachine.overlay import Overlay, static_entry, static_names
+from pymachine.traversal import Traversal
 from pymachine.control import ConceptControl
 from pymachine.construction import Construction, AVMConstruction
 from pymachine.constants import id_sep
 
+def lookup_static(static, static_disambig, print_name):
+    # TODO: clean this up
+    """
+    Looks up @p print_name, a unique or ambiguous name, in @p static (a
+    printname -> machines mapping), and returns the corresponding value.
+    @p static_disambig maps ambiguous names to unique ones.
+    """
+    if print_name in static:
+        # in static: everything's OK, just return
+        return static[print_name]
+    else:
+        ambig_name = print_name.split(id_sep)[0]
+        names = static_disambig.get(ambig_name, set())
+        if len(names) == 0:
+            # Not in static_disambig: we haven't heard of this word at all
+            return []
+        else:
+            # If we only know the ambiguous name, there must be at most
+            # exactly one fully qualified name that matches.
+            if ambig_name == print_name and len(names) == 1:
+                for name in names:      # why no peek()?
+                    return static[name]
+            else:
+                return []
+
+def definition_words(static_m, canonicals, deep_cases, get_static_machine):
+    """
+    Walks through the machines reachable from @p static_m, and yields the
+    printnames of the corresponding canonical machines (and of the deep
+    cases, if @p deep_cases is @c True) as <tt>(printname, deep case)</tt>
+    tuples (see Lexicon.extract_definition_graph()).
+    @param canonicals the canonical machines of the static graph.
+    @param get_static_machine returns the static machines of a printname,
+                              like Lexicon.get_static_machine().
+    """
+    # deep cases are visited once per printname, because as of yet, hash
+    # is id-based for machines
+    walk = Traversal(
+        static_m, revisits=True,
+        key=lambda machine: machine.printname() if machine.fancy()
+        else machine,
+        links=lambda machine: [(child, 0) for child in machine.children()])
+    for static_child, depth, _, _, expand in walk:
+        if depth == 0:
+            continue
+        if not static_child.fancy():
+            yield (get_static_machine(
+                static_child.printname())[0].printname(), False)
+            if static_child in canonicals:
+                walk.skip()
+        elif deep_cases and static_child.deep_case() and expand:
+            yield static_child.printname(), True
+
+def static_copy(machine):
+    """
+    A copy of @p machine without its links, for the static graph. The
+    control is copied too, as it points back to its machine.
+    """
+    return Machine(machine.printname_, copy.copy(machine.control),
+                   len(machine.partitions))
+
+def flatten_definition(definition):
+    """
+    Flattens the graph of @p definition, in the order add_static() walks it,
+    into plain data that can be sent to another process.
+    @return the <tt>(nodes, edges)</tt> tuple:
+            - @c nodes are the machines in the order they are visited, as
+              <tt>(printname_, printname, control, partition number,
+              deep case, childless)</tt> tuples; the controls are copies that
+              do not point to their machines;
+            - @c edges are the <tt>(parent, partition, child)</tt> tuples,
+              with indices into @c nodes, in the order they are added.
+    """
+    nodes, index, edges = [], {}, []
+
+    def visit(machine):
+        control = copy.copy(machine.control)
+        if control is not None:
+            control.machine = None
+        index[machine] = len(nodes)
+        nodes.append((machine.printname_, machine.printname(), control,
+                      len(machine.partitions), machine.deep_case(),
+                      not any(machine.partitions)))
+        return index[machine]
+
+    def children(machine):
+        return iter([(part_i, child)
+                     for part_i, part in enumerate(machine.partitions)
+                     for child in part])
+
+    stack = [(visit(definition), children(definition), None)]
+    while stack:
+        node_i, node_children, link = stack[-1]
+        for part_i, child in node_children:
+            if child in index:
+                edges.append((node_i, part_i, index[child]))
+            else:
+                stack.append((visit(child), children(child), (node_i, part_i)))
+                break
+        else:
+            stack.pop()
+            # the child is added after its own children
+            if link is not None:
+                edges.append((link[0], link[1], node_i))
+    return nodes, edges
+
+# the definitions sharded by Lexicon.add_static(processes=...)
+_shard_machines = None
+
+def _flatten_shard(bounds):
+    """Flattens the definitions of a shard in a worker process."""
+    start, end = bounds
+    return [flatten_definition(machine)
+            for machine in _shard_machines[start:end]]
+
+class StaticNodes(list):
+    """
+    The static machines of a printname (a value of Lexicon.static): the
+    canonical machine first, then the modified ones. It is a list, but a
+    modified machine can be removed in O(1) with discard(), which keeps an
+    index of their positions once it has been called. Other changes than
+    append() drop the index.
+    """
+    __slots__ = ('_positions',)
+
+    def __init__(self, iterable=()):
+        list.__init__(self, iterable)
+        self._positions = None
+
+    def __reduce__(self):
+        return (StaticNodes, (list(self),))
+
+    def discard(self, machine):
+        """Removes the modified @p machine, if it is here, by moving the
+        last machine to its place."""
+        if self._positions is None:
+            self._positions = dict((node, i) for i, node in enumerate(self)
+                                   if i > 0)
+        i = self._positions.pop(machine, None)
+        if i is None:
+            return
+        last = list.pop(self)
+        if last is not machine:
+            list.__setitem__(self, i, last)
+            self._positions[last] = i
+
+    def append(self, machine):
+        list.append(self, machine)
+        if self._positions is not None and len(self) > 1:
+            self._positions[machine] = len(self) - 1
+
+    def extend(self, iterable):
+        for machine in iterable:
+            self.append(machine)
+
+    def insert(self, i, machine):
+        self._positions = None
+        list.insert(self, i, machine)
+
+    def remove(self, machine):
+        self._positions = None
+        list.remove(self, machine)
+
+    def pop(self, i=-1):
+        self._positions = None
+        return list.pop(self, i)
+
+    def sort(self, *args, **kwargs):
+        self._positions = None
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self._positions = None
+        list.reverse(self)
+
+    def __setitem__(self, i, what):
+        self._positions = None
+        list.__setitem__(self, i, what)
+
+    def __delitem__(self, i):
+        self._positions = None
+        list.__delitem__(self, i)
+
+    def __setslice__(self, i, j, iterable):
+        self._positions = None
+        list.__setslice__(self, i, j, iterable)
+
+    def __delslice__(self, i, j):
+        self._positions = None
+        list.__delslice__(self, i, j)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
 class Lexicon:
     """THE machine repository."""
-    def __init__(self):
+    # the edges of the static graph buffered by bulk_load()
+    __bulk = None
+    # the reverse dependency index of activate(), built on demand: the
+    # static (printname, machine, number of dependencies) entries, the ids
+    # of the entries that depend on each printname, and the ids of those
+    # that depend on nothing
+    __entries = __dependants = __independent = None
+    # the lexicon whose static graph an active context shares (see context())
+    __base = None
+    # the maximum number of headwords whose expansion plans are kept (0
+    # disables the cache)
+    PLAN_CACHE_SIZE = 1000
+    # the IsaIndex of hyponyms(), built on demand
+    __isa = None
+    # the store the static graph is loaded from lazily (see use_store()),
+    # the (ambiguous) names already loaded, and the names whose expansion
+    # closure is loaded
+    __store = __loaded = __closed = None
+    # the overlay.Overlay of the lexicon below this one (see overlay())
+    __layer = None
+    # the maximum number of printnames in the lookup cache (0 disables it)
+    LOOKUP_CACHE_SIZE = 10000
+
+    def __init__(self, add_unknown=True):
+        """
+        @param add_unknown whether get_machine() adds the words that are not
+                           in the static graph to it; if @c False, their
+                           machines are kept in @c unknown, a side table,
+                           and the static graph is left alone.
+        """
         # static will store only one machine per printname (key),
         # while active can store more
         self.static = {}
         # e.g. {'in': {'in_2758', 'in_13'}}, where in_XXXs are keys in static
         self.static_disambig = defaultdict(set)
-        # TODO: map: {active_machine : is it expanded?}
-        self.active = {}
+        # the active machines, and whether they have been expanded
+        self.active = ActiveStore()
         # Constructions
         self.constructions = []
         # AVM name -> construction. Not used by default, have to be added to
         # self.constructions first via activation
         self.avm_constructions = {}
+        # printname -> machine of the unknown words (see get_machine())
+        self.unknown = None if add_unknown else {}
+        # the LookupCache of get_machine()
+        self.__lookups = LookupCache()
+        # the LookupCache of the expansion plans of the headwords expanded
+        # recently (see expand())
+        self.__plans = LookupCache()
 #        self.create_elvira_machine()
         self.clear_active()
 
+    def __getstate__(self):
+        # the index of activate(), the plans of expand() and the lookup
+        # cache of get_machine() are rebuilt on demand
+        state = dict(self.__dict__)
+        for attr in ('__entries', '__dependants', '__independent',
+                     '__newly_active', '__satisfied', '__candidates',
+                     '__plans', '__isa', '__lookups'):
+            state.pop('_Lexicon' + attr, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lookups = LookupCache()
+        self.__plans = LookupCache()
+        if 'unknown' not in state:
+            # pickled before the side table
+            self.unknown = None
+        if isinstance(self.active, dict):
+            # pickled before ActiveStore
+            active, self.active = self.active, ActiveStore()
+            for machines in active.itervalues():
+                for machine, expanded in machines.iteritems():
+                    self.active.add(machine, expanded)
+
     def __add_active_machine(self, m, expanded=False):
         """Helper method for add_active()"""
-        printname = m.printname()
-        #logging.info('activating machine: {}'.format(printname))
-        if printname in self.active:
-            already_expanded = self.active[printname].get(m, False)
-            self.active[printname][m] = expanded | already_expanded
-        else:
-            self.active[printname] = {m: expanded}
+        #logging.info('activating machine: {}'.format(m.printname()))
+        if self.active.add(m, expanded) and self.__dependants is not None:
+            self.__newly_active.append(m.printname())
+
+    def __static_changed(self):
+        """Must be called when the static graph changes."""
+        if self.__base is not None:
+            raise TypeError("the static graph is read-only in an active "
+                            "context")
+        if not isinstance(self.static, dict):
+            # FrozenMachines build their partitions on each access, so the
+            # changes would be lost silently
+            raise TypeError("the static graph of a frozen lexicon is "
+                            "read-only (see from_frozen())")
+        self.__entries = self.__dependants = self.__independent = None
+        self.__plans.clear()
+        self.__isa = None
+        self.__lookups.clear()
 
     def add_active(self, what):
         """adds machines to active collection
@@ -48,108 +323,274 @@ class Lexicon:
             logging.error("Calling Lexicon.add_active() with an incompatible" +
                           " type")
 
-    def add_static(self, what):
+    def add_static(self, what, copy_on_write=False, processes=None):
         """
         Add lexical definition to the static collection
         while keeping prior links (parent links).
+        @param copy_on_write if @c False, the machines of the definition are
+                             taken over by the static graph (and their links
+                             are rewired); if @c True, the definition is left
+                             intact, and only the machines that the static
+                             graph keeps are copied (shallowly), which is much
+                             cheaper than a deepcopy of the definition.
+        @param processes if given, the definitions are flattened in this many
+                         worker processes, and merged into the static graph
+                         here in the order of their headwords (see
+                         __add_static_parallel()). The result is the same as
+                         that of the serial add_static() of the definitions
+                         sorted by headword (by @c printname_, e.g. in/7
+                         before in/8). Only with @p copy_on_write.
         @note We assume that a machine is added to the static graph only once.
+        @note After finalize_static(), use add_definition() instead.
         """
-        if isinstance(what, Machine):
-            self.__add_static_recursive(what)
+        self.__static_changed()
+        if processes is not None:
+            if not copy_on_write:
+                raise ValueError("add_static() with processes needs "
+                                 "copy_on_write")
+            self.__add_static_parallel(list(Lexicon.__machines(what)),
+                                       processes)
+        elif isinstance(what, Machine):
+            self.__add_static_recursive(what, copy_on_write=copy_on_write)
         # Call for each item in an iterable
         elif isinstance(what, Iterable):
             for m in what:
-                self.add_static(m)
+                self.add_static(m, copy_on_write)
+
+    @staticmethod
+    def __machines(what):
+        """The machines in @p what, in the order add_static() adds them."""
+        if isinstance(what, Machine):
+            yield what
+        elif isinstance(what, Iterable):
+            for m in what:
+                for machine in Lexicon.__machines(m):
+                    yield machine
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        A context for adding many definitions to the static graph at once,
+        e.g.
+        @code
+        with lexicon.bulk_load():
+            lexicon.add_static(definitions)
+        lexicon.finalize_static()
+        @endcode
+        Within the context, add_static() only collects the edges of the static
+        graph in a buffer (and the cyclic garbage collector is suspended). The
+        partitions and the parent links are built in one pass when the context
+        is left. The resulting graph is the same as without the context, but
+        it must not be traversed before the context is left.
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        self.__bulk = ([], [])
+        try:
+            yield self
+        finally:
+            edges, sources = self.__bulk
+            del self.__bulk
+            self.__flush_edges(edges, sources)
+            self.__static_changed()
+            if gc_enabled:
+                gc.enable()
+
+    def __flush_edges(self, edges, sources):
+        """
+        Adds the edges buffered by bulk_load() to the static graph.
+        @param edges the <tt>(parent, partition, child)</tt> tuples, in the
+                     order add_static() would have appended them.
+        @param sources the definition machines taken over by the static graph,
+                       whose original links add_static() would have removed.
+        """
+        for machine in sources:
+            for part_i, part in enumerate(machine.partitions):
+                for child in part:
+                    child.parents.discard((machine, part_i))
+                del part[:]
+
+        new_children = {}
+        for parent, part_i, child in edges:
+            new_children.setdefault((parent, part_i), []).append(child)
+        for (parent, part_i), children in new_children.iteritems():
+            if part_i >= len(parent.partitions):
+                parent.partitions += [Partition() for i in range(
+                    part_i + 1 - len(parent.partitions))]
+            part = parent.partitions[part_i]
+            members = set(part)
+            unique = []
+            for child in children:
+                if child not in members:
+                    members.add(child)
+                    unique.append(child)
+                    if self.__layer is None:
+                        child.parents.add((parent, part_i))
+                    else:
+                        self.__layer.add_parent_link(child, parent, part_i)
+            part.extend(unique)
 
     # TODO: dog canonical == dog[faithful]!
-    def __add_static_recursive(self, curr_from, replacement=None):
+    def __add_static_recursive(self, curr_from, replacement=None,
+                               copy_on_write=False):
         if replacement is None:
             replacement = {}
+        if copy_on_write:
+            take = static_copy
+            def define(canonical, control):
+                canonical.set_control(copy.copy(control))
+        else:
+            take = lambda machine: machine
+            def define(canonical, control):
+                canonical.control = control
         #print "Processing word", curr_from
         #sys.stdout.flush()
 
         if curr_from not in replacement:
             # Deep cases are not canonized
             if curr_from.deep_case():
-                replacement[curr_from] = curr_from
+                replacement[curr_from] = take(curr_from)
             else:
-                """
-                try:
-                    if curr_from.printname().isupper():
-                        curr_from.printname_ = curr_from.printname().lower()
-                except AttributeError, e:
-                    logging.info('curr_from: {0}, type: {1}'.format(
-                        curr_from, type(curr_from)))
-                    raise Exception(e)
-                """
-                #print "Not in replacement"
-                # Does this machine appear in the static tree?
-                from_already_seen = self.__get_disambig_incomplete(
-                    curr_from.printname())
-                #print ("from already seen", curr_from.printname(),
-                #       from_already_seen
-                # If not: simply adding the new machine/definition...
-                if len(from_already_seen) == 0:
-                    #print "from already seen = 0"
-                    # This is the definition word, or no children: accept as
-                    # canonical / placeholder
-                    if len(curr_from.children()) == 0 or len(replacement) == 0:
-                        #print "adding as canoncical"
-                        from_already_seen = [curr_from]
-                    # Otherwise add a placeholder + itself to static
-                    else:
-                        #print "adding as placeholder"
-                        from_already_seen = [
-                            Machine(curr_from.printname()), curr_from]
-
-                    self.static[curr_from.printname()] = from_already_seen
-                    #print ("Adding to static", curr_from.printname(),
-                    #       from_already_seen)
-                    self.__add_to_disambig(curr_from.printname())
-                    replacement[curr_from] = curr_from
-
-#                    print self.static, self.static_disambig
-
-                else:
-                    #print "in static", from_already_seen
-                    # Definitions: the word is the canonical one, regardless of
-                    # the number of children
-                    if len(replacement) == 0:
-                        #print "definition"
-                        canonical = from_already_seen[0]
-                        canonical.printname_ = curr_from.printname()
-                        canonical.control = curr_from.control
-                        replacement[curr_from] = canonical
-                    # Handling non-definition words
-                    else:
-                        #print "not definition"
-                        canonical = from_already_seen[0]
-                        # No children: replace with the canonical
-                        if len(curr_from.children()) == 0:
-                            #print "no children"
-                            replacement[curr_from] = canonical
-                        # Otherwise: add the new machine to static, and keep it
-                        else:
-                            #print "children"
-                            replacement[curr_from] = curr_from
-                            from_already_seen.append(curr_from)
+                replacement[curr_from] = self.__static_target(
+                    curr_from.printname(), len(replacement) == 0,
+                    not any(curr_from.partitions),
+                    lambda: take(curr_from),
+                    lambda canonical: define(canonical, curr_from.control))
 
             # Copying the children...
             curr_to = replacement[curr_from]
+            if self.__bulk is not None:
+                edges, sources = self.__bulk
+                if not copy_on_write:
+                    sources.append(curr_from)
+                for part_i, part in enumerate(curr_from.partitions):
+                    for child in part:
+                        edges.append((curr_to, part_i,
+                                      self.__add_static_recursive(
+                                          child, replacement, copy_on_write)))
+                return curr_to
+
             from_partitions = [[m for m in p] for p in curr_from.partitions]
             for part_i, part in enumerate(from_partitions):
                 for child in part:
                     #print "found child", child
                     #Remove to delete any parent links
                     #print "part before", part, curr_from.partitions[part_i]
-                    curr_from.remove(child, part_i)
+                    if not copy_on_write:
+                        curr_from.remove(child, part_i)
                     #print "part after", part, curr_from.partitions[part_i]
-                    curr_to.append(
-                        self.__add_static_recursive(child, replacement),
+                    self.__append(
+                        curr_to, self.__add_static_recursive(
+                            child, replacement, copy_on_write),
                         part_i)
 
         return replacement[curr_from]
 
+    def __static_target(self, printname, definition, childless, take,
+                        define):
+        """
+        Returns the static machine that a (not deep case) machine of a
+        definition is replaced with, and registers it in the static graph.
+        @param printname the printname of the machine.
+        @param definition whether the machine is the definiendum.
+        @param childless whether the machine has no children.
+        @param take returns the machine that represents the machine in the
+                    static graph (itself, or a copy).
+        @param define sets the control of the canonical machine (passed as
+                      its argument) when the machine is the definiendum.
+        """
+        # Does this machine appear in the static tree?
+        from_already_seen = self.__get_disambig_incomplete(printname)
+        if (len(from_already_seen) == 0 and not definition and
+                self.__layer is not None):
+            from_already_seen = self.__borrow(printname)
+        # If not: simply adding the new machine/definition...
+        if len(from_already_seen) == 0:
+            # This is the definition word, or no children: accept as
+            # canonical / placeholder
+            curr_to = take()
+            if childless or definition:
+                from_already_seen = [curr_to]
+            # Otherwise add a placeholder + itself to static
+            else:
+                from_already_seen = [Machine(printname), curr_to]
+            self.static[printname] = from_already_seen
+            self.__add_to_disambig(printname)
+            return curr_to
+
+        canonical = from_already_seen[0]
+        # Definitions: the word is the canonical one, regardless of
+        # the number of children
+        if definition:
+            if self.__is_borrowed(canonical):
+                # the word is overridden in this layer
+                canonical = self.__layer.unborrow(from_already_seen, take())
+            canonical.printname_ = printname
+            define(canonical)
+            return canonical
+        # Handling non-definition words
+        # No children: replace with the canonical
+        if childless:
+            return canonical
+        # Otherwise: add the new machine to static, and keep it
+        curr_to = take()
+        from_already_seen.append(curr_to)
+        return curr_to
+
+    def __add_static_parallel(self, machines, processes):
+        """
+        add_static() with copy_on_write, in @p processes worker processes.
+        The definitions are sorted by headword (stably) and cut into
+        contiguous shards, which the workers flatten (see
+        flatten_definition()). The shards are then merged into the static
+        graph here, one after the other, so the placeholders, the canonical
+        machines and static_disambig are resolved exactly as by a serial
+        add_static() of the sorted definitions.
+        """
+        global _shard_machines
+        machines.sort(key=lambda machine: machine.printname_)
+        shard_num = 4 * processes
+        shard_size = max(1, -(-len(machines) // shard_num))
+        bounds = [(start, start + shard_size)
+                  for start in xrange(0, len(machines), shard_size)]
+        # the workers are forked, so they see the definitions without
+        # pickling them
+        _shard_machines = machines
+        pool = Pool(processes)
+        try:
+            # imap() returns the shards in order
+            for shard in pool.imap(_flatten_shard, bounds):
+                for nodes, edges in shard:
+                    self.__add_flat_definition(nodes, edges)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            _shard_machines = None
+
+    def __add_flat_definition(self, nodes, edges):
+        """Adds a definition flattened by flatten_definition() to the static
+        graph, like __add_static_recursive() with copy_on_write."""
+        replacement = []
+        for node_i, node in enumerate(nodes):
+            printname_, printname, control, part_num, deep_case, childless = (
+                node)
+            take = lambda: Machine(printname_, control, part_num)
+            if deep_case:
+                replacement.append(take())
+            else:
+                replacement.append(self.__static_target(
+                    printname, node_i == 0, childless, take,
+                    lambda canonical: canonical.set_control(control)))
+        if self.__bulk is not None:
+            self.__bulk[0].extend(
+                (replacement[parent_i], part_i, replacement[child_i])
+                for parent_i, part_i, child_i in edges)
+        else:
+            for parent_i, part_i, child_i in edges:
+                self.__append(replacement[parent_i], replacement[child_i],
+                              part_i)
+
     def __add_to_disambig(self, print_name):
         """Adds @p print_name to the static_disambig."""
         try:
@@ -206,7 +647,8 @@ class Lexicon:
                         self.static[print_name] = already_seen
                         # TODO: test if this messed up anything
                         for m in already_seen:
-                            m.printname_ = print_name
+                            if not self.__is_borrowed(m):
+                                m.printname_ = print_name
                         return already_seen
                     else:
                         return self.static[ambig_name]
@@ -223,56 +665,369 @@ class Lexicon:
                         return []
 
     def get_static_machine(self, print_name):
-        # TODO: clean this up
         """
         Returns the machines (canonical & not) by their unique or ambiguous
-        names.
+        names. In an overlay (see overlay()), the words that are not defined
+        in it are looked up in the lower layers.
         """
-        if print_name in self.static:
-#            print "XXX: printname", print_name, "in static"
-            # in static: everything's OK, just return
-            return self.static[print_name]
-        else:
-            ambig_name = print_name.split(id_sep)[0]
-            names = self.static_disambig.get(ambig_name, set())
-#            print "XXX: len(names:", ambig_name, ") ==", len(names), names
-            if len(names) == 0:
-#                print "len names == 0"
-                # Not in static_disambig: we haven't heard of this word at all
-                return []
-            else:
-                # If we only know the ambiguous name, there must be at most
-                # exactly one fully qualified name that matches.
-#                print "else"
-#                print ambig_name, print_name, len(names), names
-                if ambig_name == print_name and len(names) == 1:
-                    for name in names:      # why no peek()?
-                        return self.static[name]
-                else:
-#                        print "returning empty-handed"
-                    return []
+        if self.__store is not None:
+            self.__load(print_name)
+        nodes = lookup_static(self.static, self.static_disambig, print_name)
+        if self.__layer is None:
+            return nodes
+        return self.__layer.static_machine(nodes, print_name)
 
-    def finalize_static(self):
+    def use_store(self, store):
+        """
+        Makes the static graph lazy: the definitions of a headword are added
+        from @p store (a static_store.StaticStore) when the headword is first
+        requested by get_static_machine(), get_machine() or expand(), and
+        finalized right away. expand() loads the definitions of all the words
+        its expansion reaches.
+
+        Must be called on a new lexicon. The headwords that are not loaded do
+        not take part in activate(), and share_identical() is not applied to
+        the lazy graph.
+        """
+        if self.static:
+            raise ValueError("use_store() needs an empty static graph")
+        self.__store = store
+        self.__loaded = set()
+        self.__closed = set()
+
+    def __load(self, print_name):
+        """Adds the definitions of all the senses of @p print_name from the
+        store, unless they have been added already."""
+        if self.__base is not None:
+            return self.__base.__load(print_name)
+        ambig_name = print_name.split(id_sep)[0]
+        if ambig_name in self.__loaded:
+            return
+        self.__loaded.add(ambig_name)
+        for name in self.__store.names(ambig_name):
+            machines = self.__store[name]
+            # the machines are unpickled for us, so they can be taken over
+            self.add_static(machines)
+            for definiendum in set(m.printname() for m in machines):
+                self.__finalize_definition(definiendum)
+
+    def __load_closure(self, print_name):
+        """Loads the definitions of @p print_name and of all the words
+        reachable from them (see expand())."""
+        if self.__base is not None:
+            return self.__base.__load_closure(print_name)
+        closed = self.__closed
+        names, stack = set([print_name]), [print_name]
+        while stack:
+            name = stack.pop()
+            self.__load(name)
+            walk = Traversal(self.static.get(name, ()))
+            for machine, _, _, _, _ in walk:
+                child_name = machine.printname()
+                if child_name == name:
+                    continue
+                # the other headwords are walked from their own names
+                if self.__is_canonical(machine):
+                    walk.skip()
+                if child_name not in names and child_name not in closed:
+                    names.add(child_name)
+                    stack.append(child_name)
+        closed.update(names)
+
+    def finalize_static(self, share_identical=True):
         """
         Must be called after all words have been added to the static graph.
         Links the modified nodes to the canonical one.
+        @param share_identical whether to merge the identical modified nodes
+                               (see share_identical()).
         """
-        for print_name, nodes in self.static.iteritems():
-            if print_name != nodes[0].printname():
-                #len(nodes) > 1 and (
-                #   nodes[0].printname() != nodes[1].printname()):
-                nodes[0].printname_ = print_name
-            # We don't care about deep cases here
-            if not nodes[0].fancy():
-                for node in nodes[1:]:
-                    # HACK don't insert for binaries
-                    if node.unary():
-                        node.append(nodes[0])
+        self.__static_changed()
+        for print_name in self.static:
+            self.__finalize_entry(print_name)
+        if share_identical:
+            merged = self.share_identical()
+            logging.info('merged {0} identical static machines'.format(
+                merged))
         # defaultdict is not safe, so convert it to a regular dict
         self.static_disambig = dict(self.static_disambig)
         # TODO: remove the id from the print name of unambiguous machines
 
-    def extract_definition_graph(self, deep_cases=False):
+    def __finalize_entry(self, print_name):
+        """finalize_static() for the machines of @p print_name."""
+        nodes = self.static[print_name]
+        if (print_name != nodes[0].printname() and
+                not self.__is_borrowed(nodes[0])):
+            #len(nodes) > 1 and (
+            #   nodes[0].printname() != nodes[1].printname()):
+            nodes[0].printname_ = print_name
+        # We don't care about deep cases here
+        if not nodes[0].fancy():
+            for node in nodes[1:]:
+                # HACK don't insert for binaries
+                if node.unary():
+                    self.__append(node, nodes[0], 0)
+
+    def __is_canonical(self, machine):
+        nodes = self.static.get(machine.printname())
+        return nodes is not None and nodes[0] is machine
+
+    def __is_borrowed(self, machine):
+        """Whether @p machine is a canonical machine of a lower layer that
+        this layer links to (see overlay())."""
+        return self.__layer is not None and self.__layer.is_borrowed(machine)
+
+    def __is_lower(self, machine):
+        """Whether the static machine @p machine belongs to a lower
+        layer."""
+        return self.__layer is not None and (
+            self.__layer.is_borrowed(machine) or
+            not self.__is_canonical(machine))
+
+    def __borrow(self, print_name):
+        """Adds the canonical machine of @p print_name in the lower layers
+        to this layer, and returns the new static entry (or an empty list if
+        the lower layers do not know the word either)."""
+        canonical = self.__layer.borrow(print_name)
+        if canonical is None:
+            return []
+        nodes = self.static[print_name] = [canonical]
+        self.__add_to_disambig(print_name)
+        return nodes
+
+    def __append(self, parent, child, part_i):
+        """Machine.append() in the static graph (see Overlay.append())."""
+        if self.__layer is None:
+            parent.append(child, part_i)
+        else:
+            self.__layer.append(parent, child, part_i)
+
+    def __unlink_borrowed(self, machine):
+        """Forgets the links of @p machine to borrowed machines (before it
+        is detached or emptied)."""
+        if self.__layer is not None:
+            self.__layer.unlink(machine)
+
+    def __static_entry(self, print_name):
+        """Returns the static machines of @p print_name (a key of static)
+        through the layers, or @c None."""
+        return static_entry(self.static, self.__layer, print_name)
+
+    def __static_names(self):
+        """The keys of static, through the layers."""
+        return static_names(self.static, self.__layer)
+
+    def __definition_machines(self, canonical):
+        """
+        Returns the machines that belong to the definition of @p canonical
+        only: the non-canonical machines under it that are not referred to
+        from outside the definition (e.g. by identical machines shared with
+        other definitions, see share_identical()).
+        """
+        owned = set()
+        walk = Traversal(canonical)
+        for machine, _, _, _, expand in walk:
+            if machine is not canonical and self.__is_canonical(machine):
+                walk.skip()
+            elif expand and machine is not canonical:
+                owned.add(machine)
+        # drop the machines referred to from outside, and their children
+        while True:
+            shared = [machine for machine in owned
+                      if any(parent not in owned and parent is not canonical
+                             for parent, _ in machine.parents)]
+            if not shared:
+                return owned
+            dropped = set()
+            walk = Traversal(shared)
+            for machine, _, _, _, expand in walk:
+                if machine not in owned:
+                    walk.skip()
+                elif expand:
+                    dropped.add(machine)
+            owned -= dropped
+
+    def remove_definition(self, print_name):
+        """
+        Removes the definition of @p print_name from the finalized static
+        graph, in O(size of the definition). The canonical machine is kept as
+        a placeholder if other definitions refer to it. The placeholders of
+        the words that only this definition referred to are removed as well
+        (a canonical machine without children is taken to be a placeholder).
+        @return the canonical machine, or @c None if it has been removed too.
+        """
+        self.__static_changed()
+        canonical = self.static[print_name][0]
+        if self.__is_borrowed(canonical):
+            raise TypeError("{0} is defined in a lower layer".format(
+                print_name))
+        owned = self.__definition_machines(canonical)
+        referred = set(child.printname()
+                       for machine in chain([canonical], owned)
+                       for child in chain(*machine.partitions))
+        referred.update(machine.printname() for machine in owned)
+        for machine in chain([canonical], owned):
+            self.__unlink_borrowed(machine)
+        for part_i, part in enumerate(canonical.partitions):
+            for child in part:
+                child.parents.discard((canonical, part_i))
+            del part[:]
+        for machine in owned:
+            machine.detach()
+            nodes = self.__static_nodes(machine.printname())
+            if nodes is not None:
+                nodes.discard(machine)
+
+        referred.discard(print_name)
+        for name in referred:
+            self.__remove_placeholder(name)
+        if self.__remove_placeholder(print_name):
+            return None
+        return canonical
+
+    def __remove_placeholder(self, print_name):
+        """Removes the static entry of @p print_name if it is only a
+        placeholder that nothing refers to.
+        @return whether the entry has been removed."""
+        nodes = self.static.get(print_name)
+        if nodes is None or len(nodes) > 1:
+            return False
+        canonical = nodes[0]
+        if self.__is_borrowed(canonical):
+            if not self.__layer.release(canonical):
+                return False
+        elif canonical.parents or any(canonical.partitions):
+            return False
+        del self.static[print_name]
+        ambig_name = print_name.split(id_sep)[0]
+        names = self.static_disambig.get(ambig_name)
+        if names is not None:
+            names.discard(print_name)
+            if not names:
+                del self.static_disambig[ambig_name]
+        return True
+
+    def __static_nodes(self, print_name):
+        """Returns the static machines of @p print_name as StaticNodes (or
+        @c None)."""
+        nodes = self.static.get(print_name)
+        if nodes is not None and not isinstance(nodes, StaticNodes):
+            nodes = self.static[print_name] = StaticNodes(nodes)
+        return nodes
+
+    def add_definition(self, machines):
+        """
+        Adds a definition (@p machines, a machine or an iterable of machines:
+        the roots of the definition, which are not modified) to the
+        finalized static graph, in O(size of the definition). The new
+        machines are linked to the canonical ones as in finalize_static(),
+        and the ambiguous names are registered in static_disambig. If the
+        headword already has a definition, the two are merged; use
+        replace_definition() to replace it.
+        """
+        if isinstance(machines, Machine):
+            machines = [machines]
+        machines = list(machines)
+        self.add_static(machines, copy_on_write=True)
+        for print_name in set(machine.printname() for machine in machines):
+            self.__finalize_definition(print_name)
+            if self.unknown:
+                self.unknown.pop(print_name, None)
+
+    def replace_definition(self, print_name, machines):
+        """
+        Replaces the definition of @p print_name in the finalized static graph
+        with @p machines (the roots of the new definition, which are not
+        modified), in O(size of the definition). The canonical machine is
+        kept, so the links of other definitions to it are not affected.
+        """
+        if print_name in self.static:
+            self.remove_definition(print_name)
+        self.add_definition(machines)
+
+    def __finalize_definition(self, print_name):
+        """finalize_static() for the definition of @p print_name just
+        added."""
+        self.__static_changed()
+        canonical = self.static[print_name][0]
+        for machine in self.__definition_machines(canonical):
+            nodes = self.static.get(machine.printname())
+            if (nodes is not None and nodes[0] is not machine and
+                    not nodes[0].fancy() and machine.unary()):
+                self.__append(machine, nodes[0], 0)
+
+    def share_identical(self):
+        """
+        Hash-consing: merges the modified (non-canonical) static machines
+        that have identical definitions, e.g. the @c animal[wild] of two
+        headwords. The graphs under the machines are compared by
+        Machine.fingerprint(), with the canonical machines as atoms. Nested
+        machines are merged before the ones that contain them.
+        @return the number of machines merged.
+        """
+        self.__static_changed()
+        canonicals = set(nodes[0] for nodes in self.static.itervalues())
+        by_fingerprint = {}
+        for print_name in sorted(self.static):
+            for node in self.static[print_name][1:]:
+                graph = {}
+                key = node.fingerprint(canonicals, graph)
+                by_fingerprint.setdefault(key, []).append((node, graph))
+
+        merged = set()
+        for key in sorted(by_fingerprint, key=len):
+            (keeper, keeper_graph), duplicates = (by_fingerprint[key][0],
+                                                  by_fingerprint[key][1:])
+            for duplicate, _ in duplicates:
+                # identical machines on the same cycle are kept
+                if duplicate in keeper_graph:
+                    continue
+                for parent, part_i in list(duplicate.parents):
+                    part = parent.partitions[part_i]
+                    if keeper in part:
+                        part.remove(duplicate)
+                    else:
+                        part[part.index(duplicate)] = keeper
+                        keeper.add_parent_link(parent, part_i)
+                duplicate.parents.clear()
+                self.__unlink_borrowed(duplicate)
+                duplicate.detach()
+                merged.add(duplicate)
+
+        if merged:
+            for print_name, nodes in self.static.iteritems():
+                nodes[1:] = [node for node in nodes[1:]
+                             if node not in merged]
+        return len(merged)
+
+    def freeze(self):
+        """
+        Returns a read-only, array-backed snapshot of the static graph (a
+        frozen.FrozenGraph). Call it after finalize_static(); later changes
+        to the static graph are not reflected in the snapshot.
+        """
+        from pymachine.frozen import FrozenGraph
+        return FrozenGraph.from_static(self.static, self.static_disambig)
+
+    @staticmethod
+    def from_frozen(graph, state=None):
+        """
+        Returns a lexicon whose static graph is @p graph, a
+        frozen.FrozenGraph (e.g. one loaded by mapped.load()). The static
+        graph is read-only: the static machines are FrozenMachines, and
+        the methods that would change the graph raise a TypeError. Process
+        sentences in active contexts (see context()).
+        @param state the rest of the lexicon (the constructions etc.), as
+                     saved by mapped.dump_lexicon().
+        """
+        lexicon = Lexicon()
+        if state is not None:
+            lexicon.__setstate__(state)
+        lexicon.static = graph.static_machines()
+        lexicon.static_disambig = graph.static_disambig
+        lexicon.clear_active()
+        return lexicon
+
+    def extract_definition_graph(self, deep_cases=False, sparse=False):
         """
         Extracts the definition graph from the static graph. The former is a
         "flattened" version of the latter: all canonical words in the
@@ -282,9 +1037,15 @@ class Lexicon:
 
         @param deep_cases if @c False (the default), deep cases in the
                           definitions do not appear on the output graph.
+        @param sparse if @c True, the graph is returned as a
+                      DefinitionMatrix (@c scipy.sparse matrices and a
+                      vocabulary index) instead of a dict of machines. The
+                      deep cases are in its separate @c deep_matrix.
         """
-        def_graph = {}
         canonicals = set(l[0] for l in self.static.values())
+        if sparse:
+            return self.__definition_matrix(canonicals, deep_cases)
+        def_graph = {}
         for name in self.static.keys():
             def_graph[name] = [Machine(name)]
         for name, static_machines in self.static.iteritems():
@@ -292,40 +1053,33 @@ class Lexicon:
             static_machine = static_machines[0]
             if not static_machine.fancy():
                 def_machine = def_graph[name][0]
-                self.__build_definition_graph(def_machine, static_machine,
-                                              def_graph, set([]), canonicals,
-                                              deep_cases)
+                for word, deep_case in definition_words(
+                        static_machine, canonicals, deep_cases,
+                        self.get_static_machine):
+                    if deep_case:
+                        def_machine.append(Machine(word))
+                    elif def_graph[word][0] != def_machine:
+                        def_machine.append(def_graph[word][0])
         return def_graph
 
-    def __build_definition_graph(self, root_def_m, static_m, def_graph, stop,
-                                 canonicals, deep_cases):
-        """
-        Walks through the machines reachable from @p static_m, and adds a
-        reference to the corresponding canonical machines to the definition
-        graph node (@p root_def_m).
-        """
-        for static_child in static_m.children():
-            if not static_child.fancy():
-                cname = self.get_static_machine(
-                    static_child.printname())[0].printname()
-                def_child = def_graph[cname][0]
-                if def_child != root_def_m:
-                    root_def_m.append(def_child)
-            elif (deep_cases and static_child.deep_case() and
-                    static_child.printname() not in stop):
-                root_def_m.append(Machine(static_child.printname()))
-            if static_child.fancy() or static_child not in canonicals:
-                # deep cases are added by their printname to stop, because as
-                # of yet, hash is id-based for machines
-                if (static_child not in stop and
-                        static_child.printname() not in stop):
-                    if static_child.fancy():
-                        stop.add(static_child.printname())
-                    else:
-                        stop.add(static_child)
-                    self.__build_definition_graph(root_def_m, static_child,
-                                                  def_graph, stop, canonicals,
-                                                  deep_cases)
+    def __definition_matrix(self, canonicals, deep_cases):
+        """extract_definition_graph() as a DefinitionMatrix."""
+        from pymachine.definition_matrix import DefinitionMatrix
+        words = sorted(self.static)
+        rows = [set() for _ in words]
+        deep_rows = [set() for _ in words] if deep_cases else None
+        for row_i, name in enumerate(words):
+            static_machine = self.static[name][0]
+            if static_machine.fancy():
+                continue
+            for word, deep_case in definition_words(
+                    static_machine, canonicals, deep_cases,
+                    self.get_static_machine):
+                if deep_case:
+                    deep_rows[row_i].add(word)
+                elif word != name:
+                    rows[row_i].add(word)
+        return DefinitionMatrix.from_rows(words, rows, deep_rows)
 
     def add_construction(self, what):
         """
@@ -361,29 +1115,124 @@ class Lexicon:
         if machine is active but not in knowledge base, we warn the user,
         and do nothing
         if everything is okay, everything from every partition of the
-        static machine is copied to the active one"""
+        static machine is copied to the active one
+
+        The expansion of a headword is compiled once into a plan (see
+        expansion.compile_plan()) that is replayed here. It has the same
+        effect as unify_recursively() on each static machine, without
+        walking the static graph."""
         printname = machine.printname()
-        if (printname not in self.active or
-                machine not in self.active[printname]):
+        if self.__store is not None and printname not in self.__closed:
+            self.__load_closure(printname)
+        if not self.active.contains_machine(machine):
             raise Exception("""only active machines can be expanded
                             right now, but {0} is not active""".format(
                             printname))
-        if printname not in self.static:
+        static_machines = self.__static_entry(printname)
+        if static_machines is None:
             logging.warning(("expanding a machine ({0}) that is not in " +
                             "knowledge base ie. Lexicon.static").format(
                             repr(printname)))
-            self.active[printname][machine] = True
+            self.active.set_expanded(machine)
+            return
+
+        plan = self.__expansion_plan(printname)
+        if any(avm_name in self.active for avm_name in plan[2]):
+            # an active AVM machine would be unified as well; rare enough to
+            # do it the slow way
+            for static_machine in static_machines:
+                machine = self.unify_recursively(
+                    static_machine, zeros_only, first=True)
+                self.active.set_expanded(machine)
             return
+        machine = self.__replay_plan(plan)
+
+        # change expand status in active store
+        self.active.set_expanded(machine)
+
+    def expand_many(self, machines, zeros_only=False):
+        """
+        Expands @p machines in one pass: the plans of the machines (see
+        expand()) are merged, so the definitions they share are unified with
+        the active graph only once. The resulting active graph is the same as
+        after calling expand() on each machine in turn.
+        """
+        machines = list(machines)
+        if self.__store is not None:
+            for machine in machines:
+                if machine.printname() not in self.__closed:
+                    self.__load_closure(machine.printname())
+        for machine in machines:
+            if not self.active.contains_machine(machine):
+                raise Exception("""only active machines can be expanded
+                                right now, but {0} is not active""".format(
+                                machine.printname()))
 
-        for static_machine in self.static[printname]:
-            #logging.info('activating machine:\n{0}'.format(static_machine))
-            #logging.info(
-            #    'control dict:\n{0}'.format(static_machine.control.__dict__))
-            machine = self.unify_recursively(
-                static_machine, zeros_only, first=True)
+        plans = []
+        for machine in machines:
+            printname = machine.printname()
+            if self.__static_entry(printname) is None:
+                plans.append(None)
+                continue
+            plan = self.__expansion_plan(printname)
+            if any(avm_name in self.active for avm_name in plan[2]):
+                # see expand()
+                for machine in machines:
+                    self.expand(machine, zeros_only)
+                return
+            plans.append(plan)
 
-            # change expand status in active store
-            self.active[printname][machine] = True
+        for machine, plan in zip(machines, plans):
+            if plan is None:
+                logging.warning(("expanding a machine ({0}) that is not in " +
+                                "knowledge base ie. Lexicon.static").format(
+                                repr(machine.printname())))
+                self.active.set_expanded(machine)
+        nodes, edges, avm_names, roots = merge_plans(
+            [plan for plan in plans if plan is not None])
+        active_machines = self.__replay(nodes, edges, avm_names)
+        for root in roots:
+            if root is not None:
+                self.active.set_expanded(active_machines[root])
+
+    def __expansion_plan(self, printname):
+        """Returns the (cached) expansion plan of @p printname. Active
+        contexts share the cache of their base lexicon, and overlays share
+        the plans of the words they do not define with the lower layers."""
+        base = self if self.__base is None else self.__base
+        if base.__layer is not None and printname not in base.static:
+            return base.__layer.lower.__expansion_plan(printname)
+        plan = base.__plans.get(printname, base.PLAN_CACHE_SIZE)
+        if plan is None:
+            plan = compile_plan(base.__static_entry(printname))
+            base.__plans.put(printname, plan, base.PLAN_CACHE_SIZE)
+        return plan
+
+    def __replay_plan(self, plan):
+        """Unifies the static machines of a plan (see
+        expansion.compile_plan()) with the active machines, and returns the
+        resulting machine."""
+        nodes, edges, avm_names, root = plan
+        machines = self.__replay(nodes, edges, avm_names)
+        return machines[root] if root is not None else None
+
+    def __replay(self, nodes, edges, avm_names):
+        """Does the unifications of a plan, and returns the active machines
+        of its nodes."""
+        active = self.active
+        machines = []
+        for printname, control in nodes:
+            if printname in active:
+                machine = active.primary(printname)
+            else:
+                machine = Machine(printname, copy.copy(control))
+                self.__add_active_machine(machine)
+            machines.append(machine)
+        for avm_name in avm_names:
+            self.wake_avm_construction(avm_name)
+        for parent_i, part_i, child_i in edges:
+            machines[parent_i].append(machines[child_i], part_i)
+        return machines
 
     def unify_recursively(self, static_machine, zeros_only, first=False,
                           stop=None):
@@ -405,15 +1254,14 @@ class Lexicon:
             static_printname = static_machine
         if static_printname in stop:
             #logging.debug('ur stops')
-            return self.active[static_printname].keys()[0]
+            return self.active.primary(static_printname)
         #If static_machine is a string, we don't have much to do
         #logging.debug('ur static_machine {0}, type: {1}'.format(
         #   str(static_machine), str(type(static_machine))))
         if isinstance(static_machine, str):
             if static_machine in self.active:
-                # FIXME: [0] is a hack, fix it
                 #logging.debug('ur str in active')
-                return self.active[static_machine].keys()[0]
+                return self.active.primary(static_machine)
             else:
                 if static_machine.startswith('#'):
                     #logging.debug('ur waking up')
@@ -431,7 +1279,7 @@ class Lexicon:
 
             if static_name in self.active:
                 #logging.debug('ur machine in active')
-                active_machine = self.active[static_name].keys()[0]
+                active_machine = self.active.primary(static_name)
             else:
                 #logging.debug('Not in active')
                 if static_name.startswith('#'):
@@ -469,6 +1317,12 @@ class Lexicon:
         @c constructions (that is, "wakes" it up).
         """
         avm_construction = self.avm_constructions.get(avm_name[1:])
+        if (avm_construction is not None and self.__base is not None and
+                avm_name[1:] not in self.__own_avms):
+            # copy on write: the AVM of the base lexicon is left alone
+            avm_construction = copy.copy(avm_construction)
+            self.avm_constructions[avm_name[1:]] = avm_construction
+            self.__own_avms.add(avm_name[1:])
         # TODO
         if (avm_construction is not None and
                 avm_construction not in self.constructions):
@@ -481,32 +1335,110 @@ class Lexicon:
 
         When exactly a machine should be activated is still up for
         consideration; however, currently this method returns a machine if
-        all non-primitive machines on its partitions are active."""
+        all non-primitive machines on its partitions are active, i.e. the
+        printnames (see Machine.printname()) of all its children that are not
+        AVMs are in self.active.
+
+        The machines are found incrementally: a reverse dependency index
+        (see __build_activation_index()) counts the active children of each
+        static machine, and it is only updated with the printnames that have
+        become active since the last call. The machines activated by the
+        ones activated here are also returned, within the same call.
+
+        @note This method used to compare the string form of the children
+        (which includes their ids) with the active printnames, so it hardly
+        ever activated anything, and whether a machine activated by another
+        one was returned depended on the order of static."""
+        if self.__dependants is None:
+            self.__build_activation_index()
         activated = []
+        entries, satisfied = self.__entries, self.__satisfied
+        while self.__newly_active or self.__candidates:
+            newly_active, self.__newly_active = self.__newly_active, []
+            for printname in newly_active:
+                for entry_i in self.__dependants.get(printname, ()):
+                    satisfied[entry_i] = satisfied.get(entry_i, 0) + 1
+                    if satisfied[entry_i] == entries[entry_i][2]:
+                        self.__candidates.append(entry_i)
 
-        for printname, static_machines in self.static.iteritems():
-            for static_machine in static_machines:
+            candidates, self.__candidates = self.__candidates, []
+            for entry_i in candidates:
+                printname, static_machine, _ = entries[entry_i]
                 if printname in self.active:
                     continue
-                has_machine = False
-                for machine in chain(*static_machine.partitions):
-                    has_machine = True
-                    if (not unicode(machine).startswith(u'#') and
-                            unicode(machine) not in self.active):
-                        break
-                else:
-                    if has_machine:
-                        m = Machine(printname,
-                                    copy.copy(static_machine.control))
-                        self.add_active(m)
-                        activated.append(m)
+                m = Machine(printname, copy.copy(static_machine.control))
+                self.add_active(m)
+                activated.append(m)
         return activated
 
+    def __build_activation_index(self):
+        """
+        Builds the reverse dependency index of activate(): for each
+        printname, the static machines that have a child with that printname
+        (AVMs, i.e. printnames starting with #, do not count). Active
+        contexts share the index of their base lexicon.
+        """
+        base = self.__base
+        if base is not None:
+            if base.__dependants is None:
+                base.__build_activation_index()
+            self.__entries = base.__entries
+            self.__dependants = base.__dependants
+            self.__independent = base.__independent
+            self.__reset_activation(self.active.keys())
+            return
+        entries, dependants, independent = [], {}, []
+        for printname in sorted(self.__static_names()):
+            for static_machine in self.__static_entry(printname):
+                children = list(chain(*static_machine.partitions))
+                if not children:
+                    continue
+                needed = set(child.printname() for child in children
+                             if not child.printname().startswith(u'#'))
+                entry_i = len(entries)
+                entries.append((printname, static_machine, len(needed)))
+                for child_name in needed:
+                    dependants.setdefault(child_name, []).append(entry_i)
+                if not needed:
+                    independent.append(entry_i)
+        self.__entries = entries
+        self.__dependants = dependants
+        self.__independent = independent
+        self.__reset_activation(self.active.keys())
+
+    def __reset_activation(self, active):
+        """Resets the counts of activate() to the printnames in
+        @p active."""
+        self.__satisfied = {}
+        self.__candidates = list(self.__independent)
+        self.__newly_active = list(active)
+
+    def hyponyms(self, category, transitive=False):
+        """
+        Returns the printnames of the words that are IS_A @p category in the
+        static graph (i.e. the first arguments of the IS_A machines whose
+        second argument is @p category), as a frozenset.
+        @param transitive if @c True, the hyponyms of the hyponyms etc. are
+                          returned, too.
+        """
+        return self.__isa_index().lookup(HYPONYMS, category, transitive)
+
+    def hypernyms(self, print_name, transitive=False):
+        """The inverse of hyponyms(): the categories @p print_name IS_A."""
+        return self.__isa_index().lookup(HYPERNYMS, print_name, transitive)
+
+    def __isa_index(self):
+        """The IsaIndex of the static graph (and of the lower layers).
+        Active contexts share the index of their base lexicon."""
+        base = self if self.__base is None else self.__base
+        if base.__isa is None:
+            base.__isa = IsaIndex(base.__static_entry(u'IS_A') or ())
+        return base.__isa
+
     def is_expanded(self, m):
         """Returns whether m is expanded or not"""
-        printname = m.printname()
         try:
-            return self.active[printname][m]
+            return self.active.is_expanded(m)
         except KeyError:
             logging.error("asking whether a machine is expanded about a " +
                           "non-active machine")
@@ -515,26 +1447,103 @@ class Lexicon:
 
     def get_expanded(self, inverse=False):
         """Returns the list of expanded machines."""
-        result = []
-        for pn, machines in self.active.iteritems():
-            for machine in machines:
-                # if inverse: return unexpandeds
-                if inverse ^ machines[machine]:
-                    result.append(machine)
-        return result
+        # if inverse: return unexpandeds
+        if inverse:
+            return self.active.unexpanded()
+        return self.active.expanded()
 
     def get_unexpanded(self):
         return self.get_expanded(True)
 
     def active_machines(self):
-        return [v.keys()[0] for v in self.active.values()]
+        return [self.active.primary(pn) for pn in self.active]
+
+    def context(self):
+        """
+        Returns a new active context for processing a sentence against this
+        lexicon. The context shares the static graph (and the index of
+        activate()) with the lexicon, which must be finalized, but it has its
+        own active machines and constructions, so many sentences can be
+        processed at the same time (in threads, or in the workers of a process
+        pool started after the lexicon was loaded), e.g.
+        @code
+        context = lexicon.context()
+        SpreadingActivation(context).activation_loop(chunks)
+        @endcode
+        In a context, the static graph is read-only (the methods that would
+        change it raise a TypeError), and it is copied on write:
+        - get_machine() returns a new active machine instead of a static one
+          (also for unknown words, which are not added to the static graph);
+        - the AVM constructions are copied before they are filled.
+        The context runs its own copies of the constructions of the lexicon
+        (see Construction.__copy__()), and the constructions added to it are
+        only seen by the context.
+        """
+        context = copy.copy(self)
+        context.__base = self if self.__base is None else self.__base
+        context.__own_avms = set()
+        context.active = ActiveStore()
+        # the constructions keep the state of their matching (e.g. in their
+        # control), so each context runs its own copies
+        context.constructions = [copy.copy(c) for c in self.constructions]
+        context.avm_constructions = dict(self.avm_constructions)
+        context.clear_active()
+        return context
 
-    def clear_active(self):
+    def overlay(self):
+        """
+        Returns a new, empty lexicon layered over this (finalized) one, e.g.
+        for a domain whose definitions add to or override the common ones:
+        @code
+        domain = lexicon.overlay()
+        domain.add_static(domain_definitions, copy_on_write=True)
+        domain.finalize_static()
+        @endcode
+        The overlay keeps only its own definitions in its static graph; the
+        words it does not define are looked up in this lexicon by
+        get_static_machine(), get_machine(), expand(), activate() and
+        hyponyms(). Its definitions refer to the canonical machines of this
+        lexicon with one-way links, so this lexicon is not modified, and
+        many overlays can share it. A word defined in the overlay overrides
+        the word of this lexicon, except in the definitions of this lexicon.
+
+        The other methods (e.g. freeze()) see the overlay only. The overlay
+        has no constructions of its own. This lexicon must not be changed
+        while it has overlays.
+        """
+        overlay = Lexicon()
+        overlay.__layer = Overlay(self, self.__layer)
+        return overlay
+
+    def is_layered(self):
+        """Whether the static graph of the lexicon is shared with another
+        lexicon: it is an active context (see context()) or an overlay (see
+        overlay()). Such a lexicon cannot be saved on its own (see
+        flat.dump_lexicon())."""
+        return self.__base is not None or self.__layer is not None
+
+    def clear_active(self, release=False):
         """
         Resets the lexicon to the default (inactive) state. Must be called
         between activation phases.
+        @param release if @c True, the active machines are also detached from
+                       the machine graph (see Machine.detach()), so that they
+                       are freed right away. Only use it if the active
+                       machines are not needed anymore.
         """
-        self.active = {}
+        if release:
+            for printname in self.active:
+                static_machines = self.static.get(printname, ())
+                for machine in self.active.machines(printname):
+                    # static machines can be active too (see get_machine())
+                    if machine not in static_machines:
+                        machine.detach()
+        self.active.clear()
+        if release:
+            # drop the references to the released machines, too
+            self.active.purge()
+        if self.__dependants is not None:
+            self.__reset_activation(())
         # HACK
         #self.unify_recursively('train')
 
@@ -556,18 +1565,63 @@ class Lexicon:
             return self.get_machine("HAS")
 
         if printname in self.active:
-            return self.active[printname].keys()[0]
+            return self.active.primary(printname)
 
-        cands = self.get_static_machine(printname)
+        cands = self.__lookup(printname)
+        if self.__base is not None or (cands and self.__is_lower(cands[0])):
+            # the shared static machines (of the base lexicon or of the lower
+            # layers) must not be modified, so an active copy is returned (it
+            # is expanded like any other active machine)
+            if cands:
+                machine = Machine(cands[0].printname(),
+                                  copy.copy(cands[0].control))
+            else:
+                machine = Machine(printname, ConceptControl())
+            self.__add_active_machine(machine)
+            return machine
         if not cands:
+            if self.unknown is not None:
+                machine = self.unknown.get(printname)
+                if machine is None:
+                    machine = Machine(printname, ConceptControl.shared())
+                    self.unknown[printname] = machine
+                return machine
             if second:
                 raise Exception(
                     "no machine with printname {0}".format(printname) +
                     "even after calling add_static for {0}".format(
-                        Machine(printname, ConceptControl())))
+                        Machine(printname, ConceptControl.shared())))
             #logging.warning(
                 #"creating new machine for '{0}'".format(printname))
-            self.add_static(Machine(printname, ConceptControl()))
+            self.add_definition(Machine(printname, ConceptControl.shared()))
             return self.get_machine(printname, second=True)  # sanity check
 
         return cands[0]
+
+    def __lookup(self, printname):
+        """
+        get_static_machine() through the lookup cache (see
+        lookup_cache.LookupCache), which also keeps the negative results. The
+        cache is emptied when the static graph changes. Active contexts share
+        the cache of their base lexicon.
+        """
+        base = self if self.__base is None else self.__base
+        cands = base.__lookups.get(printname, base.LOOKUP_CACHE_SIZE)
+        if cands is None:
+            cands = self.get_static_machine(printname)
+            base.__lookups.put(printname, cands, base.LOOKUP_CACHE_SIZE)
+        return cands
+
+    def lookup_cache_info(self):
+        """Returns the number of hits and misses of the lookup cache of
+        get_machine() and its size, as a dict."""
+        lookups = (self if self.__base is None else self.__base).__lookups
+        return {'hits': lookups.hits, 'misses': lookups.misses,
+                'size': len(lookups)}
+
+    def plan_cache_info(self):
+        """Returns the number of hits and misses of the cache of expansion
+        plans of expand() and its size, as a dict."""
+        plans = (self if self.__base is None else self.__base).__plans
+        return {'hits': plans.hits, 'misses': plans.misses,
+                'size': len(plans)}
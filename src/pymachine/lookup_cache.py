@@ -0,0 +1,68 @@
+"""The lookup caches of Lexicon.get_machine() and Lexicon.expand()."""
+
+from collections import OrderedDict
+from threading import Lock
+
+class LookupCache(object):
+    """
+    A bounded LRU cache of values by printname: the static machines of
+    get_machine() (negative results, empty lists, are cached, too), or the
+    expansion plans of expand(). The active contexts of a lexicon share its
+    caches (see Lexicon.context()), so changes to them are guarded by a lock
+    of their own; hits only read them. The number of hits and misses are kept in @c hits and
+    @c misses (they are not exact if several threads look up words at the
+    same time).
+
+    The entries are kept in an OrderedDict, the least recently used first,
+    and evicted from its front. Moving an entry to the end is not cheap, so a
+    hit only moves it if it is in the older half of the cache: an entry used
+    again while it is among the newer ones is not evicted before the older
+    half anyway.
+    """
+    def __init__(self):
+        # printname -> (value, serial), the least recently used first
+        self.__entries = OrderedDict()
+        # the serial of the next entry put to the end
+        self.__serial = 0
+        self.__lock = Lock()
+        self.hits = self.misses = 0
+
+    def get(self, printname, size):
+        """Returns the cached value of @p printname, or @c None. @p size is the
+        size of the cache (see put())."""
+        # a plain dictionary lookup, the order is not needed
+        entry = dict.get(self.__entries, printname)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        value, serial = entry
+        if serial < self.__serial - size // 2:
+            with self.__lock:
+                if printname in self.__entries:
+                    del self.__entries[printname]
+                    self.__append(printname, value)
+        return value
+
+    def put(self, printname, value, size):
+        """Caches the @p value of @p printname. If the cache has more than
+        @p size entries, the least recently used ones are dropped (a @p size
+        of 0 disables the cache)."""
+        if size <= 0:
+            return
+        with self.__lock:
+            self.__entries.pop(printname, None)
+            self.__append(printname, value)
+            while len(self.__entries) > size:
+                self.__entries.popitem(last=False)
+
+    def __append(self, printname, value):
+        self.__entries[printname] = (value, self.__serial)
+        self.__serial += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
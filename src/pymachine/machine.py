@@ -1,23 +1,194 @@
 import logging
 import copy
-from itertools import chain
+from itertools import chain, count
 import re
+from threading import Lock
 
 from pymachine.control import Control
 from constants import deep_pre, avm_pre, enc_pre
+from pymachine.traversal import Traversal
+
+# printnames are repeated on many machines: we keep a single copy of each.
+# (intern() only accepts byte strings in Python 2, hence the dict.)
+_printnames = {}
+
+def intern_printname(name):
+    """Returns the shared copy of @p name."""
+    return _printnames.setdefault(name, name)
+
+# machines are numbered in the order they are created (see Machine.id).
+# next() on a count is atomic, so machines created in different threads (e.g.
+# in active contexts) get different ids.
+_machine_ids = count()
+_reserve_lock = Lock()
+
+def new_machine_id():
+    """Returns the next machine id."""
+    return next(_machine_ids)
+
+def reserve_machine_id(machine_id):
+    """Makes sure that new machines get larger ids than @p machine_id (e.g.
+    one that has just been unpickled). The ids skipped are not used."""
+    global _machine_ids
+    with _reserve_lock:
+        if next(_machine_ids) <= machine_id:
+            _machine_ids = count(machine_id + 1)
+
+class Partition(list):
+    """
+    A partition of a machine. It is a list, but membership tests are O(1):
+    once the partition grows beyond @c INDEX_THRESHOLD elements, it keeps an
+    index that counts the occurrences of each element. Small partitions, which
+    are the vast majority, are scanned as before and need no extra memory.
+    """
+    __slots__ = ('_index',)
+    INDEX_THRESHOLD = 8
+
+    def __init__(self, iterable=()):
+        list.__init__(self, iterable)
+        self._index = None
+        self.__check_index()
+
+    def __reduce__(self):
+        return (Partition, (list(self),))
+
+    def __check_index(self):
+        """(Re)builds the index if the partition has become large enough."""
+        if self._index is None and len(self) > Partition.INDEX_THRESHOLD:
+            index = {}
+            for what in self:
+                index[what] = index.get(what, 0) + 1
+            self._index = index
+
+    def __reset_index(self):
+        """Called after bulk changes that we don't follow one by one."""
+        self._index = None
+        self.__check_index()
+
+    def __inc(self, what):
+        if self._index is None:
+            self.__check_index()
+        else:
+            self._index[what] = self._index.get(what, 0) + 1
+
+    def __dec(self, what):
+        if self._index is not None:
+            count = self._index[what] - 1
+            if count:
+                self._index[what] = count
+            else:
+                del self._index[what]
+
+    def __contains__(self, what):
+        if self._index is None:
+            return list.__contains__(self, what)
+        return what in self._index
+
+    def append(self, what):
+        list.append(self, what)
+        self.__inc(what)
+
+    def extend(self, iterable):
+        for what in iterable:
+            self.append(what)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def insert(self, i, what):
+        list.insert(self, i, what)
+        self.__inc(what)
+
+    def remove(self, what):
+        list.remove(self, what)
+        self.__dec(what)
+
+    def pop(self, i=-1):
+        what = list.pop(self, i)
+        self.__dec(what)
+        return what
+
+    def __setitem__(self, i, what):
+        if isinstance(i, slice):
+            list.__setitem__(self, i, what)
+            self.__reset_index()
+        else:
+            self.__dec(self[i])
+            list.__setitem__(self, i, what)
+            self.__inc(what)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            list.__delitem__(self, i)
+            self.__reset_index()
+        else:
+            self.__dec(self[i])
+            list.__delitem__(self, i)
+
+    def __setslice__(self, i, j, iterable):
+        list.__setslice__(self, i, j, iterable)
+        self.__reset_index()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self.__reset_index()
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self.__reset_index()
+        return self
 
 class Machine(object):
+    """
+    A machine. Its @c id is a small integer that identifies it in
+    unique_name(), dot_id() and the like. Unlike the value of @c id(), it
+    does not depend on the memory layout, so the same program creates the
+    same ids in every run. Unpickled machines keep their ids.
+    """
+    # the attributes that are pickled (see __getstate__())
+    _STATE = ('id', '_printname', 'partitions', 'control', 'parents')
+    # machines can be weakly referenced, e.g. to check that the ones
+    # released by detach() are freed
+    __slots__ = _STATE + ('__weakref__',)
+
     def __init__(self, name, control=None, part_num=3):
         if not name:
             logging.warning('empty printname! replacing with "???"')
             name = "???"
+        self.id = new_machine_id()
         self.printname_ = name
         # if name.isupper():
         #     part_num = 3  # TODO crude, but effective
-        self.partitions = [[] for i in range(part_num)]
+        self.partitions = [Partition() for i in range(part_num)]
         self.set_control(control)
         self.parents = set()
 
+    @property
+    def printname_(self):
+        return self._printname
+
+    @printname_.setter
+    def printname_(self, name):
+        self._printname = intern_printname(name)
+
+    def __getstate__(self):
+        return dict((slot, getattr(self, slot)) for slot in Machine._STATE)
+
+    def __setstate__(self, state):
+        # Pickles created before __slots__ store the old __dict__
+        if 'printname_' in state:
+            state = dict(state)
+            state['_printname'] = intern_printname(state.pop('printname_'))
+            state['partitions'] = [Partition(part)
+                                   for part in state['partitions']]
+        if 'id' in state:
+            reserve_machine_id(state['id'])
+        else:
+            self.id = new_machine_id()
+        for attr, value in state.iteritems():
+            setattr(self, attr, value)
+
     def __repr__(self):
         return str(self)
 
@@ -68,11 +239,11 @@ class Machine(object):
     def dot_id(self):
         """node id for dot output"""
         return u"{0}_{1}".format(
-            Machine.d_clean(self.dot_printname()), str(id(self))[-4:])
+            Machine.d_clean(self.dot_printname()), self.id)
 
     def dot_printname(self):
         """printname for dot output"""
-        return self.printname_.split('/')[0].replace('-', '_')
+        return self._printname.split('/')[0].replace('-', '_')
 
     @staticmethod
     def d_clean(string):
@@ -89,12 +260,12 @@ class Machine(object):
         return s
 
     def printname(self):
-        if '/' in self.printname_:
-            return self.printname_.split('/')[0]
-        return self.printname_
+        if '/' in self._printname:
+            return self._printname.split('/')[0]
+        return self._printname
 
     def unique_name(self):
-        return u"{0}_{1}".format(self.printname(), id(self))
+        return u"{0}_{1}".format(self.printname(), self.id)
 
     def set_control(self, control):
         """Sets the control."""
@@ -117,16 +288,95 @@ class Machine(object):
     def unique_machines_in_tree(self):
         """Returns all unique machines under (and including)
         the current one."""
-        def __recur(m):
-            visited.add(m)
-            for child in m.children():
-                if child not in visited:
-                    __recur(child)
-
         visited = set()
-        __recur(self)
+        for _ in Traversal(self, visited=visited):
+            pass
         return visited
 
+    def fingerprint(self, atoms=(), nodes=None):
+        """
+        Returns a (hashable) structural fingerprint of the graph under the
+        machine. Machines are compared by their printnames, the types of their
+        controls and their partitions. Machines that are reached again (shared
+        ones and cycles) are represented by a back-reference to their
+        pre-order index.
+
+        The order of the machines within a partition does not matter (the
+        parser builds the partitions from sets): the children are walked in
+        a canonical order (see __canonical_ranks()). Machines with the same
+        fingerprint are always isomorphic, and isomorphic graphs have the same
+        fingerprint, except for some highly symmetric graphs whose
+        indistinguishable machines are linked differently.
+        @param atoms machines that are represented by their printnames only,
+                     and are not expanded (e.g. the canonical machines in the
+                     static graph).
+        @param nodes if not @c None, a dict that is filled with the machines
+                     of the graph (except the atoms) and their indices.
+        """
+        if nodes is None:
+            nodes = {}
+        ranks = self.__canonical_ranks(atoms)
+
+        def links(machine):
+            return [(child, part_i)
+                    for part_i, part in enumerate(machine.partitions)
+                    for child in sorted(part, key=ranks.get)]
+
+        tokens = []
+        walk = Traversal(self, revisits=True, links=links)
+        for machine, _, _, _, expand in walk:
+            if machine in atoms:
+                walk.skip()
+                tokens.append((machine._printname,))
+            elif not expand:
+                tokens.append(nodes[machine])
+            else:
+                nodes[machine] = len(nodes)
+                part_lens = tuple(len(part) for part in machine.partitions)
+                tokens.append(
+                    (machine._printname, type(machine.control), part_lens))
+        return tuple(tokens)
+
+    def __canonical_ranks(self, atoms):
+        """
+        Ranks the machines of the graph under the machine (see fingerprint())
+        by their structure, independently of the order of the partitions, by
+        colour refinement: a machine starts with the rank of its label, and
+        then takes the rank of its rank and the sorted ranks of the children
+        in each of its partitions, until the number of ranks stops growing.
+        @return the <tt>{machine: rank}</tt> dict.
+        """
+        labels = {}
+        walk = Traversal(self)
+        for machine, _, _, _, _ in walk:
+            if machine in atoms:
+                walk.skip()
+                labels[machine] = (0, machine._printname)
+            else:
+                labels[machine] = (
+                    1, machine._printname, type(machine.control).__name__,
+                    tuple(len(part) for part in machine.partitions))
+
+        def rank(keys):
+            ranks = dict((key, i) for i, key in enumerate(sorted(
+                set(keys.itervalues()))))
+            return dict((machine, ranks[key])
+                        for machine, key in keys.iteritems())
+
+        ranks = rank(labels)
+        rank_num = len(set(ranks.itervalues()))
+        while True:
+            new_ranks = rank(dict(
+                (machine, (ranks[machine], ) if machine in atoms else
+                 (ranks[machine], tuple(tuple(sorted(ranks[child]
+                                                     for child in part))
+                                        for part in machine.partitions)))
+                for machine in ranks))
+            new_rank_num = len(set(new_ranks.itervalues()))
+            if new_rank_num == rank_num:
+                return ranks
+            ranks, rank_num = new_ranks, new_rank_num
+
     def append_all(self, what_iter, which_partition=0):
         """ Mass append function that calls append() for every object """
         from collections import Iterable
@@ -145,11 +395,12 @@ class Machine(object):
         #    {1},{2})".format(self.printname(), what.printname(),
         #    which_partition).encode("utf-8"))
         if len(self.partitions) > which_partition:
+            # O(1), see Partition
             if what in self.partitions[which_partition]:
                 return
         else:
-            self.partitions += [[] for i in range(which_partition + 1 -
-                                len(self.partitions))]
+            self.partitions += [Partition() for i in range(
+                which_partition + 1 - len(self.partitions))]
 
         self.__append(what, which_partition)
 
@@ -189,6 +440,22 @@ class Machine(object):
         if isinstance(what, Machine):
             what.del_parent_link(self, which_partition)
 
+    def detach(self):
+        """
+        Removes all links of the machine: to its children and from its
+        parents. Also breaks the reference cycle with its control. A detached
+        machine is freed by reference counting as soon as it is no longer
+        referenced, without having to wait for the cyclic garbage collector.
+        """
+        for part_i, part in enumerate(self.partitions):
+            for child in part:
+                child.parents.discard((self, part_i))
+            del part[:]
+        for parent, part_i in list(self.parents):
+            parent.remove(self, part_i)
+        if self.control is not None and self.control.machine is self:
+            self.control.machine = None
+
     def add_parent_link(self, whose, part):
         self.parents.add((whose, part))
 
@@ -205,13 +472,13 @@ class Machine(object):
         return len(self.partitions) >= 2
 
     def deep_case(self):
-        return self.printname_[0] == deep_pre
+        return self._printname[0] == deep_pre
 
     def named_entity(self):
-        return self.printname_[0] == enc_pre
+        return self._printname[0] == enc_pre
 
     def avm(self):
-        return self.printname_[0] == avm_pre
+        return self._printname[0] == avm_pre
 
     # TODO: langspec
 
@@ -220,43 +487,31 @@ class Machine(object):
 
     def to_debug_str(self, depth=0, max_depth=3, parents_to_display=3,
                      stop=None):
-        """An even more detailed __str__, complete with object ids and
-        recursive."""
-        return self.__to_debug_str(0, max_depth, parents_to_display, stop=stop)
-
-    def __to_debug_str(self, depth, max_depth=3, parents_to_display=3,
-                       lines=None, stop=None, at_partition=""):
-        """Recursive helper method for to_debug_str.
-        @param depth the depth of the recursion.
-        @param max_depth the maximum recursion depth.
-        @param stop the machines already visited (to detect cycles)."""
-        if stop is None:
-            stop = set()
-        if lines is None:
-            lines = []
-
-        pn = self.printname()
-        if (depth != 0 and self in stop) or depth == max_depth:
-            prnts_str = '...'
-        else:
-            prnts = [m[0].printname() + ':' + str(id(m[0])) + ':' + str(m[1])
-                     for m in self.parents]
-            prnts_str = ','.join(prnts[:parents_to_display])
-            if len(prnts) > parents_to_display:
-                prnts_str += ', ..'
-        lines.append(u'{0:>{1}}:{2}:{3} p[{4}]'.format(
-            at_partition, 2 * depth + len(str(at_partition)), pn, id(self),
-            prnts_str))
-        if not ((depth != 0 and self in stop) or depth == max_depth):
-            stop.add(self)
-            for part_i in xrange(len(self.partitions)):
-                part = self.partitions[part_i]
-                for m in part:
-                    m.__to_debug_str(depth + 1, max_depth, parents_to_display,
-                                     lines, stop, part_i)
-
-        if depth == 0:
-            return u"\n".join(lines)
+        """An even more detailed __str__, complete with machine ids and
+        recursive.
+        @param max_depth the maximum depth of the machines displayed.
+        @param stop the machines not to expand (e.g. the canonical ones). It
+                    is not modified."""
+        stop = set(stop) if stop else set()
+        # the root is displayed even if it is in stop
+        stop.discard(self)
+        lines = []
+        for machine, depth, _, at_partition, expand in Traversal(
+                self, max_depth=max_depth, visited=stop, revisits=True):
+            if at_partition is None:
+                at_partition = ""
+            if not expand:
+                prnts_str = '...'
+            else:
+                prnts = [m[0].printname() + ':' + str(m[0].id) + ':' +
+                         str(m[1]) for m in machine.parents]
+                prnts_str = ','.join(prnts[:parents_to_display])
+                if len(prnts) > parents_to_display:
+                    prnts_str += ', ..'
+            lines.append(u'{0:>{1}}:{2}:{3} p[{4}]'.format(
+                at_partition, 2 * depth + len(str(at_partition)),
+                machine.printname(), machine.id, prnts_str))
+        return u"\n".join(lines)
 
 def test_printname():
     m_unicode = Machine(u"\u00c1")
@@ -0,0 +1,286 @@
+"""
+A binary file format for frozen static graphs (see frozen.FrozenGraph) that
+is read in place via @c mmap.
+
+The tables of the graph are not deserialized when the file is loaded: they
+are views of the mapped file, so loading is near-instant, and processes that
+load the same file share its pages through the page cache. The printnames
+and the controls are decoded when they are first used. Lookups by printname
+binary-search a sorted table of the names.
+
+File format: the magic string, the offset of the directory (8 bytes, little
+endian), the sections (aligned to 8 bytes), and the directory, a pickled
+<tt>{section: (offset, typecode, length)}</tt> dict. The numbers are little
+endian.
+"""
+
+from bisect import bisect_left
+from collections import Mapping
+import copy
+import cPickle
+import mmap
+import struct
+
+from pymachine.frozen import FrozenGraph
+
+MAGIC = 'PMMAP001'
+HEADER = struct.Struct('<Q')
+
+# the node tables of FrozenGraph
+_ARRAYS = ('name_of', 'control_of', 'part_start', 'child_start', 'children',
+           'parent_start', 'parents', 'parent_parts')
+
+class MappedArray(object):
+    """A read-only array of numbers in a buffer (e.g. an @c mmap)."""
+    def __init__(self, buf, offset, typecode, length):
+        self.buf = buf
+        self.offset = offset
+        self.typecode = typecode
+        self.length = length
+        item = struct.Struct('<' + typecode)
+        self.size = item.size
+        self.unpack_from = item.unpack_from
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        # single items are the common case (see FrozenGraph)
+        if type(i) is not slice:
+            if i < 0:
+                i += self.length
+            if not 0 <= i < self.length:
+                raise IndexError(i)
+            return self.unpack_from(self.buf, self.offset + i * self.size)[0]
+        start, stop, step = i.indices(self.length)
+        if step != 1:
+            return self[start:stop][::step]
+        if stop <= start:
+            return ()
+        return _slice_struct(stop - start, self.typecode).unpack_from(
+            self.buf, self.offset + start * self.size)
+
+    def __iter__(self):
+        return iter(self[:])
+
+# (length, typecode) -> the Struct that reads a slice
+_slice_structs = {}
+
+def _slice_struct(length, typecode):
+    key = (length, typecode)
+    item = _slice_structs.get(key)
+    if item is None:
+        item = struct.Struct('<{0}{1}'.format(length, typecode))
+        if length <= 64:
+            _slice_structs[key] = item
+    return item
+
+class MappedStrings(object):
+    """A read-only list of (unicode) strings, stored as UTF-8 in a buffer,
+    with an array of their offsets. The strings are decoded once."""
+    def __init__(self, buf, offsets, offset):
+        self.buf = buf
+        self.offsets = offsets
+        self.offset = offset
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        string = self.cache.get(i)
+        if string is None:
+            if not 0 <= i < len(self):
+                raise IndexError(i)
+            start, end = self.offsets[i:i + 2]
+            string = self.buf[self.offset + start:
+                              self.offset + end].decode('utf-8')
+            self.cache[i] = string
+        return string
+
+class MappedPickles(MappedStrings):
+    """A read-only list of objects, pickled one by one in a buffer. The
+    objects are unpickled once."""
+    def __getitem__(self, i):
+        if i not in self.cache:
+            if not 0 <= i < len(self):
+                raise IndexError(i)
+            start, end = self.offsets[i:i + 2]
+            self.cache[i] = cPickle.loads(
+                self.buf[self.offset + start:self.offset + end])
+        return self.cache[i]
+
+class MappedIndex(Mapping):
+    """
+    A read-only dict in a buffer: the keys are the (sorted) @c keys, and the
+    value of the <tt>i</tt>th key is made by @c value from the slice
+    <tt>values[start[i]:start[i + 1]]</tt>.
+    """
+    def __init__(self, keys, start, values, value):
+        self.keys_ = keys
+        self.start = start
+        self.values_ = values
+        self.value = value
+
+    def __find(self, key):
+        i = bisect_left(self.keys_, key)
+        if i < len(self.keys_) and self.keys_[i] == key:
+            return i
+        return None
+
+    def __getitem__(self, key):
+        i = self.__find(key)
+        if i is None:
+            raise KeyError(key)
+        return self.value(self.values_[self.start[i]:self.start[i + 1]])
+
+    def __contains__(self, key):
+        return self.__find(key) is not None
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __iter__(self):
+        return (self.keys_[i] for i in xrange(len(self.keys_)))
+
+class _Writer(object):
+    """Writes the sections of a mapped file."""
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self.directory = {}
+        file_obj.write(MAGIC)
+        file_obj.write(HEADER.pack(0))
+
+    def __align(self):
+        padding = -self.file_obj.tell() % 8
+        self.file_obj.write('\0' * padding)
+
+    def array(self, name, typecode, numbers):
+        self.__align()
+        numbers = list(numbers)
+        self.directory[name] = (self.file_obj.tell(), typecode, len(numbers))
+        self.file_obj.write(struct.pack(
+            '<{0}{1}'.format(len(numbers), typecode), *numbers))
+
+    def blobs(self, name, blobs):
+        """Writes the byte strings @p blobs, and their offsets."""
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        self.array(name + '.offsets', 'i', offsets)
+        self.directory[name] = (self.file_obj.tell(), 'B', offsets[-1])
+        for blob in blobs:
+            self.file_obj.write(blob)
+
+    def strings(self, name, strings):
+        self.blobs(name, [unicode(s).encode('utf-8') for s in strings])
+
+    def close(self):
+        directory_offset = self.file_obj.tell()
+        cPickle.dump(self.directory, self.file_obj, cPickle.HIGHEST_PROTOCOL)
+        self.file_obj.seek(len(MAGIC))
+        self.file_obj.write(HEADER.pack(directory_offset))
+
+def dump(graph, file_name, state=None):
+    """
+    Writes @p graph (a FrozenGraph) to @p file_name in the mapped format.
+    @param state an object pickled along with the graph (see load()).
+    """
+    with open(file_name, 'wb') as file_obj:
+        writer = _Writer(file_obj)
+        for name in _ARRAYS:
+            table = getattr(graph, name)
+            writer.array(name, table.typecode, table)
+        writer.strings('names', graph.names)
+        writer.strings('short_names', graph.short_names)
+        controls = []
+        for control in graph.controls:
+            # the machines of the controls are not stored
+            if control.machine is not None:
+                control = copy.copy(control)
+                control.machine = None
+            controls.append(cPickle.dumps(control, cPickle.HIGHEST_PROTOCOL))
+        writer.blobs('controls', controls)
+
+        static_keys = sorted(unicode(key) for key in graph.static)
+        key_ids = dict((key, i) for i, key in enumerate(static_keys))
+        writer.strings('static.keys', static_keys)
+        writer.array('static.start', 'i', _starts(
+            graph.static[key] for key in static_keys))
+        writer.array('static.values', 'i', (
+            node for key in static_keys for node in graph.static[key]))
+        disambig_keys = sorted(unicode(key) for key in graph.static_disambig)
+        writer.strings('disambig.keys', disambig_keys)
+        writer.array('disambig.start', 'i', _starts(
+            graph.static_disambig[key] for key in disambig_keys))
+        writer.array('disambig.values', 'i', (
+            key_ids[unicode(name)] for key in disambig_keys
+            for name in sorted(graph.static_disambig[key])))
+        writer.blobs('state', [cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL)])
+        writer.close()
+
+def _starts(values):
+    starts = [0]
+    for value in values:
+        starts.append(starts[-1] + len(value))
+    return starts
+
+def is_mapped(file_name):
+    """Whether @p file_name is in the mapped format."""
+    with open(file_name, 'rb') as file_obj:
+        return file_obj.read(len(MAGIC)) == MAGIC
+
+def load(file_name):
+    """
+    Maps @p file_name, written by dump().
+    @return the <tt>(graph, state)</tt> tuple: the FrozenGraph whose tables
+            are views of the file, and the state passed to dump().
+    """
+    with open(file_name, 'rb') as file_obj:
+        if file_obj.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{0} is not a mapped graph".format(file_name))
+        # the mapping stays valid after the file is closed
+        buf = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+    directory_offset, = HEADER.unpack_from(buf, len(MAGIC))
+    directory = cPickle.loads(buf[directory_offset:])
+
+    def array(name):
+        return MappedArray(buf, *directory[name])
+
+    def strings(name, cls=MappedStrings):
+        return cls(buf, array(name + '.offsets'), directory[name][0])
+
+    graph = FrozenGraph()
+    for name in _ARRAYS:
+        setattr(graph, name, array(name))
+    graph.names = strings('names')
+    graph.short_names = strings('short_names')
+    graph.controls = strings('controls', MappedPickles)
+    static_keys = strings('static.keys')
+    graph.static = MappedIndex(static_keys, array('static.start'),
+                               array('static.values'), tuple)
+    graph.static_disambig = MappedIndex(
+        strings('disambig.keys'), array('disambig.start'),
+        array('disambig.values'),
+        lambda key_ids: set(static_keys[i] for i in key_ids))
+    state = strings('state', MappedPickles)[0]
+    return graph, state
+
+def dump_lexicon(lexicon, file_name):
+    """Writes the (finalized) static graph of @p lexicon to @p file_name in
+    the mapped format. The rest of the lexicon (e.g. the constructions) is
+    pickled along with it, but the active machines are not saved. Overlays
+    and active contexts cannot be saved (see flat.dump_lexicon())."""
+    if lexicon.is_layered():
+        raise TypeError("an overlay or an active context cannot be saved")
+    state = lexicon.__getstate__()
+    for attr in ('static', 'static_disambig', 'active'):
+        state.pop(attr, None)
+    dump(lexicon.freeze(), file_name, state)
+
+def load_lexicon(file_name):
+    """Loads a lexicon written by dump_lexicon(). Its static graph is the
+    mapped FrozenGraph, so it is read-only (see Lexicon.from_frozen())."""
+    from pymachine.lexicon import Lexicon
+    graph, state = load(file_name)
+    return Lexicon.from_frozen(graph, state)
@@ -54,19 +54,8 @@ class EnumMatcher(Matcher):
             self.name, u" ".join(self.machine_names)))
 
     def collect_machines(self, lexicon):
-        cm = lexicon.static[self.name][0]
-        machines_on_type =  set([m.partitions[0][0].printname()
-            for m in cm.partitions[0] if m.printname() == "IS_A"])
-
-        all_machines = machines_on_type
-        for pn, ms in lexicon.static.iteritems():
-            for m in ms:
-                for child in m.partitions[0]:
-                    if (child.printname() == "IS_A" and
-                        child.partitions[1][0] == self.name):
-                        all_machines.add(pn)
-                        break
-        return all_machines
+        """The words that are IS_A the enum (see Lexicon.hyponyms())."""
+        return set(lexicon.hyponyms(self.name))
 
     def _match(self, machine):
         res = unicode(machine) in self.machine_names
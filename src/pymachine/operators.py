@@ -4,6 +4,7 @@ import logging
 
 from pymachine.control import KRPosControl
 from pymachine.machine import Machine
+from pymachine.traversal import Traversal
 
 class Operator(object):
     """The abstract superclass of the operator hierarchy."""
@@ -186,31 +187,27 @@ class FillArgumentOperator(Operator):
         self._act(arg_mach, self.working_area[0])
 
     def _act(self, arg_mach, machine):
-        """Recursive helper method for act()."""
-        if machine.printname() in self.seen_by_act:
-            return
-        else:
-            self.seen_by_act.add(machine.printname())
-
-        logging.debug(
-            "FillArgOp _acting on input {0} and working area {1}".format(
-                arg_mach, machine))
-        logging.debug(
-            'working area partitions: {0}'.format(machine.partitions))
-        success = False
-        for part_ind, part in enumerate(machine.partitions):
-            for submach_ind, submach in enumerate(part):
-                if submach.printname() == self.case:
-                    logging.info('Filling argument {0} of {1} with {2}'.format(
-                        self.case, machine, arg_mach))
-                    arg_mach.unify(submach)
-                    part[submach_ind] = arg_mach  # TODO unify
-                    success = True
-                    break
-                else:
-                    self._act(arg_mach, submach)
-            if success:
-                break
+        """Helper method for act(): walks the working area and fills the
+        first argument of the case found under each machine."""
+        walk = Traversal(machine, visited=self.seen_by_act,
+                         key=lambda m: m.printname(), revisits=True)
+        for submach, _, parent, part_ind, expand in walk:
+            if parent is not None and submach.printname() == self.case:
+                logging.info('Filling argument {0} of {1} with {2}'.format(
+                    self.case, parent, arg_mach))
+                part = parent.partitions[part_ind]
+                submach_ind = part.index(submach)
+                arg_mach.unify(submach)
+                part[submach_ind] = arg_mach  # TODO unify
+                # don't look further under this machine
+                walk.skip()
+                walk.leave()
+            elif expand:
+                logging.debug(
+                    "FillArgOp _acting on input {0} and working area "
+                    "{1}".format(arg_mach, submach))
+                logging.debug(
+                    'working area partitions: {0}'.format(submach.partitions))
 
 class ExpandOperator(Operator):
     """Expands an active machine."""
@@ -0,0 +1,129 @@
+"""The layering of a Lexicon over another one (see Lexicon.overlay())."""
+
+from pymachine.machine import Partition
+
+def static_entry(static, layer, print_name):
+    """Returns the static machines of @p print_name (a key of @p static)
+    through the layers, or @c None.
+    @param layer the Overlay of the lexicon of @p static, or @c None."""
+    if layer is None:
+        return static.get(print_name)
+    return layer.entry(static, print_name)
+
+def static_names(static, layer):
+    """The keys of @p static, through the layers (see static_entry())."""
+    if layer is None:
+        return static
+    return layer.names(static)
+
+class Overlay(object):
+    """
+    The link of an overlay to the lexicon below it: the lower lexicon, and
+    the canonical machines borrowed from it, with the (one-way) links to
+    them from the overlay, <tt>{machine: set([(parent, partition)])}</tt>.
+    The links are recorded here instead of in the parents of the borrowed
+    machines, so the lower layers are not modified.
+    """
+    def __init__(self, lower, lower_layer):
+        """
+        @param lower the lexicon below the overlay.
+        @param lower_layer the Overlay of @p lower, or @c None.
+        """
+        self.lower = lower
+        self.__lower_layer = lower_layer
+        self.borrowed = {}
+
+    def is_borrowed(self, machine):
+        """Whether @p machine is a canonical machine of a lower layer that
+        the overlay links to."""
+        return machine in self.borrowed
+
+    def borrow(self, print_name):
+        """Returns the canonical machine of @p print_name in the lower layers,
+        which the overlay links to from now on (or @c None if the lower
+        layers do not know the word either)."""
+        lower_nodes = self.lower.get_static_machine(print_name)
+        if not lower_nodes:
+            return None
+        canonical = lower_nodes[0]
+        self.borrowed.setdefault(canonical, set())
+        return canonical
+
+    def unborrow(self, nodes, canonical):
+        """Replaces the borrowed canonical machine of the static entry
+        @p nodes with @p canonical, and moves the links to it from the
+        overlay over to @p canonical."""
+        borrowed = nodes[0]
+        for parent, part_i in self.borrowed.pop(borrowed):
+            part = parent.partitions[part_i]
+            if canonical in part:
+                part.remove(borrowed)
+            else:
+                part[part.index(borrowed)] = canonical
+                canonical.add_parent_link(parent, part_i)
+        nodes[0] = canonical
+        return canonical
+
+    def release(self, canonical):
+        """Stops borrowing @p canonical if the overlay does not link to it.
+        @return whether it is released."""
+        if self.borrowed[canonical]:
+            return False
+        del self.borrowed[canonical]
+        return True
+
+    def add_parent_link(self, child, parent, part_i):
+        """Machine.add_parent_link(), one-way if @p child is borrowed."""
+        links = self.borrowed.get(child)
+        if links is None:
+            child.add_parent_link(parent, part_i)
+        else:
+            links.add((parent, part_i))
+
+    def append(self, parent, child, part_i):
+        """Machine.append(), one-way if @p child is borrowed."""
+        if not self.is_borrowed(child):
+            parent.append(child, part_i)
+            return
+        if part_i >= len(parent.partitions):
+            parent.partitions += [Partition() for i in range(
+                part_i + 1 - len(parent.partitions))]
+        part = parent.partitions[part_i]
+        if child not in part:
+            part.append(child)
+            self.borrowed[child].add((parent, part_i))
+
+    def unlink(self, machine):
+        """Forgets the links of @p machine to borrowed machines (before it
+        is detached or emptied)."""
+        if self.borrowed:
+            for part_i, part in enumerate(machine.partitions):
+                for child in part:
+                    links = self.borrowed.get(child)
+                    if links is not None:
+                        links.discard((machine, part_i))
+
+    def entry(self, static, print_name):
+        """static_entry() of the overlay, whose static graph is
+        @p static."""
+        nodes = static.get(print_name)
+        if nodes and not self.is_borrowed(nodes[0]):
+            return nodes
+        if not nodes:
+            return static_entry(self.lower.static, self.__lower_layer,
+                                print_name)
+        return self.lower.get_static_machine(print_name) + nodes[1:]
+
+    def names(self, static):
+        """static_names() of the overlay, whose static graph is
+        @p static."""
+        return set(static).union(
+            static_names(self.lower.static, self.__lower_layer))
+
+    def static_machine(self, nodes, print_name):
+        """Lexicon.get_static_machine() of the overlay, @p nodes being the
+        static machines of @p print_name in the overlay itself."""
+        if nodes and not self.is_borrowed(nodes[0]):
+            return nodes
+        lower_nodes = self.lower.get_static_machine(print_name)
+        return lower_nodes + nodes[1:] if nodes else lower_nodes
@@ -8,6 +8,8 @@ from scipy.stats.stats import pearsonr
 
 from pymachine.utils import average, harmonic_mean, jaccard, min_jaccard, MachineGraph, MachineTraverser, my_max  # nopep8
 from pymachine.wrapper import Wrapper as MachineWrapper
+from pymachine.frozen import FrozenMachine
+from pymachine.traversal import Traversal
 assert jaccard, min_jaccard  # silence pyflakes
 
 class WordSimilarity():
@@ -27,7 +29,12 @@ class WordSimilarity():
         self.seen_for_links = set()
         links = set()
         nodes = set()
-        for link, node in self._get_links_nodes(machine, depth=0):
+        if isinstance(machine, FrozenMachine):
+            links_nodes = self._get_frozen_links_nodes(
+                machine.graph, machine.node)
+        else:
+            links_nodes = self._get_links_nodes(machine, depth=0)
+        for link, node in links_nodes:
             if link is not None:
                 links.add(link)
             if node is not None:
@@ -54,6 +61,27 @@ class WordSimilarity():
         for node in MachineTraverser.get_nodes(machine):
             yield None, node
 
+    def _get_frozen_links_nodes(self, graph, node):
+        """
+        _get_links_nodes() on a FrozenGraph. Hypernyms are visited in the
+        same (depth-first) order, on the node ids.
+        """
+        walk = Traversal([node], max_depth=6, partitions=[0],
+                         visited=self.seen_for_links, revisits=True,
+                         links=graph.links, exits=True)
+        for hypernym, depth, _, _, expand in walk:
+            if expand is None:
+                # its hypernyms are done
+                machine = graph.machine(hypernym)
+                for link, node in self.get_binary_links_nodes(machine):
+                    yield link, node
+                for node in MachineTraverser.get_nodes(machine):
+                    yield None, node
+            elif depth > 0:
+                name = graph.printname(hypernym)
+                if name == '=AGT' or not name.isupper():
+                    yield name, None
+
     def get_binary_links_nodes(self, machine):
         for parent, partition in machine.parents:
             parent_pn = parent.printname()
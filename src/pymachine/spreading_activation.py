@@ -87,10 +87,8 @@ class SpreadingActivation(object):
 #                for m in ac:
 #                    logging.debug(Machine.to_debug_str(m))
             # Step 1: expansion
-            for machine in unexpanded:
-                logging.debug("EXPANDING: " + unicode(machine).encode('utf-8'))
-
-                self.lexicon.expand(machine)
+            logging.debug("EXPANDING {} machines".format(len(unexpanded)))
+            self.lexicon.expand_many(unexpanded)
 
             logging.debug("\n\nACTIVE DICT: {}".format(self.lexicon.active))
             logging.debug("\n\nACTIVE MACHINES: {}".format(
@@ -0,0 +1,112 @@
+"""An indexed on-disk store of definitions, read one headword at a time."""
+
+import cPickle
+import struct
+from threading import Lock
+
+from pymachine.constants import id_sep
+
+class StaticStore(object):
+    """
+    A read-only definition dict (<tt>{printname: set of machines}</tt>, see
+    definition_parser.read()) stored on disk. The definitions of each
+    headword are pickled separately, and an index of their offsets is kept
+    in memory, so opening the store is fast, and a definition is only
+    unpickled when it is requested. Each request returns new machines.
+
+    File format: the magic string, the offset of the index (8 bytes, little
+    endian), the pickled definitions, and the pickled index
+    (<tt>{printname: (offset, length)}</tt>).
+
+    Create one with write(), and use it via Lexicon.use_store().
+    """
+    MAGIC = 'PMSTORE1'
+    HEADER = struct.Struct('<Q')
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.__open()
+
+    def __open(self):
+        self.__file = open(self.file_name, 'rb')
+        # seek() and read() must not be interleaved
+        self.__lock = Lock()
+        if self.__file.read(len(StaticStore.MAGIC)) != StaticStore.MAGIC:
+            raise ValueError(
+                "{0} is not a definition store".format(self.file_name))
+        index_offset, = StaticStore.HEADER.unpack(
+            self.__file.read(StaticStore.HEADER.size))
+        self.__file.seek(index_offset)
+        self.__index = cPickle.load(self.__file)
+        # ambiguous name -> the printnames in the store
+        self.__names = {}
+        for print_name in self.__index:
+            self.__names.setdefault(
+                print_name.split(id_sep)[0], []).append(print_name)
+
+    def __getstate__(self):
+        return {'file_name': self.file_name}
+
+    def __setstate__(self, state):
+        self.file_name = state['file_name']
+        self.__open()
+
+    @staticmethod
+    def write(definitions, file_name):
+        """Writes @p definitions (a definition dict) to @p file_name."""
+        index = {}
+        with open(file_name, 'wb') as out:
+            out.write(StaticStore.MAGIC)
+            out.write(StaticStore.HEADER.pack(0))
+            for print_name in sorted(definitions):
+                data = cPickle.dumps(definitions[print_name],
+                                     cPickle.HIGHEST_PROTOCOL)
+                index[print_name] = (out.tell(), len(data))
+                out.write(data)
+            index_offset = out.tell()
+            cPickle.dump(index, out, cPickle.HIGHEST_PROTOCOL)
+            out.seek(len(StaticStore.MAGIC))
+            out.write(StaticStore.HEADER.pack(index_offset))
+
+    def names(self, ambig_name):
+        """The printnames in the store whose ambiguous name is
+        @p ambig_name."""
+        return self.__names.get(ambig_name, [])
+
+    def close(self):
+        self.__file.close()
+
+    # The dict interface
+
+    def __getitem__(self, print_name):
+        """Unpickles the definitions of @p print_name."""
+        offset, length = self.__index[print_name]
+        with self.__lock:
+            self.__file.seek(offset)
+            data = self.__file.read(length)
+        return cPickle.loads(data)
+
+    def get(self, print_name, default=None):
+        if print_name in self.__index:
+            return self[print_name]
+        return default
+
+    def __contains__(self, print_name):
+        return print_name in self.__index
+
+    def __len__(self):
+        return len(self.__index)
+
+    def __iter__(self):
+        return iter(self.__index)
+
+    def keys(self):
+        return self.__index.keys()
+
+    def iteritems(self):
+        for print_name in self.__index:
+            yield print_name, self[print_name]
+
+    def itervalues(self):
+        for print_name in self.__index:
+            yield self[print_name]
@@ -0,0 +1,148 @@
+"""Iterative (non-recursive) traversal of machine graphs."""
+
+# directions
+CHILDREN, PARENTS, BOTH = xrange(3)
+
+class Traversal(object):
+    """
+    Depth-first, pre-order traversal of a machine graph that uses an explicit
+    stack instead of recursion, so it works on arbitrarily deep graphs.
+    Machines are visited in the same order as by the usual recursive walk
+    (children in partition order, then parents).
+
+    Iterating over a Traversal yields
+    <tt>(machine, depth, source, partition, expand)</tt> tuples:
+    - @c source is the machine from which @c machine was reached, via
+      @c partition (both are @c None for the start machines);
+    - @c expand tells whether the neighbours of @c machine will be visited,
+      i.e. whether it has not been visited before and is not too deep.
+    While processing a tuple, skip() and leave() can be used to prune the
+    traversal. With @c exits, each expanded machine is yielded once more
+    after its neighbours, with @c expand being @c None (e.g. to process the
+    machines in post-order).
+
+    Machines are added to @c visited (by their key) when they are expanded.
+    """
+    def __init__(self, start, direction=CHILDREN, max_depth=None,
+                 partitions=None, visited=None, key=None, revisits=False,
+                 links=None, exits=False):
+        """
+        @param start a machine, or an iterable of machines (or of the nodes
+                     that @p links accepts, e.g. the node ids of a
+                     frozen.FrozenGraph).
+        @param direction which links to follow: CHILDREN, PARENTS or BOTH.
+        @param max_depth machines at this depth are not expanded. @c None
+                         means no limit.
+        @param partitions the indices of the partitions to follow. @c None
+                          means all of them.
+        @param visited the set of (keys of) the machines visited so far. It
+                       is updated by the traversal, so it can be shared by
+                       several traversals.
+        @param key computes the key of a machine in @p visited; the default
+                   is the machine itself.
+        @param revisits if @c True, the machines that have already been
+                        visited are also yielded (with expand=False).
+        @param links returns the <tt>(neighbour, partition)</tt> tuples of a
+                     machine, in the order they are visited. If given, it is
+                     used instead of the links in @p direction.
+        @param exits if @c True, the expanded machines are yielded again
+                     after their neighbours.
+        """
+        from pymachine.machine import Machine
+        self.start = [start] if isinstance(start, Machine) else list(start)
+        self.direction = direction
+        self.max_depth = max_depth
+        self.partitions = partitions
+        self.visited = set() if visited is None else visited
+        self.key = key
+        self.revisits = revisits
+        self.links = links
+        self.exits = exits
+        self.__skip = self.__leave = False
+
+    def skip(self):
+        """Do not expand the machine just yielded."""
+        self.__skip = True
+
+    def leave(self):
+        """Do not visit the remaining neighbours of the source of the machine
+        just yielded."""
+        self.__leave = True
+
+    def __neighbours(self, machine):
+        """Returns an iterator over the <tt>(neighbour, machine,
+        partition)</tt> tuples of @p machine."""
+        partitions = self.partitions
+        if self.links is None:
+            return self.__links_of(machine)
+        links = self.links(machine)
+        if partitions is not None:
+            links = [(neighbour, part_i) for neighbour, part_i in links
+                     if part_i in partitions]
+        return ((neighbour, machine, part_i) for neighbour, part_i in links)
+
+    def __links_of(self, machine):
+        """__neighbours() of a machine, following the links in
+        @c direction."""
+        partitions = self.partitions
+        if self.direction != PARENTS:
+            for part_i, part in enumerate(machine.partitions):
+                if partitions is None or part_i in partitions:
+                    for child in part:
+                        yield child, machine, part_i
+        if self.direction != CHILDREN:
+            for parent, part_i in machine.parents:
+                if partitions is None or part_i in partitions:
+                    yield parent, machine, part_i
+
+    def __iter__(self):
+        visited, key, max_depth = self.visited, self.key, self.max_depth
+        # (neighbours, depth, the tuple yielded when they are done)
+        stack = [(iter([(m, None, None) for m in self.start]), 0, None)]
+        while stack:
+            neighbours, depth, exit = stack[-1]
+            for machine, source, part_i in neighbours:
+                machine_key = machine if key is None else key(machine)
+                if machine_key in visited:
+                    if not self.revisits:
+                        continue
+                    expand = False
+                else:
+                    expand = max_depth is None or depth < max_depth
+                    if expand:
+                        visited.add(machine_key)
+                self.__skip = self.__leave = False
+                yield machine, depth, source, part_i, expand
+
+                if expand and self.__skip:
+                    visited.discard(machine_key)
+                    expand = False
+                if self.__leave:
+                    # the source is done once the machine is
+                    stack[-1] = (iter(()), depth, exit)
+                if expand:
+                    stack.append((self.__neighbours(machine), depth + 1,
+                                  (machine, depth, source, part_i, None)
+                                  if self.exits else None))
+                if expand or self.__leave:
+                    break
+            else:
+                stack.pop()
+                if exit is not None:
+                    yield exit
+
+    def machines(self):
+        """Yields only the machines (that are expanded)."""
+        for machine, _, _, _, expand in self:
+            if expand:
+                yield machine
+
+def number_machines(roots):
+    """
+    Returns the machines reachable from @p roots (an iterable of machines)
+    in a deterministic (depth-first) order, and the <tt>{machine:
+    node}</tt> dict of their indices in the list.
+    """
+    machines = list(Traversal(roots).machines())
+    return machines, dict((machine, node)
+                          for node, machine in enumerate(machines))
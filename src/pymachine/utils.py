@@ -5,6 +5,8 @@ import networkx as nx
 from networkx.readwrite import json_graph
 
 from pymachine.machine import Machine
+from pymachine.frozen import FrozenMachine
+from pymachine.traversal import Traversal, BOTH
 
 def ensure_dir(path):
     if not os.path.exists(path):
@@ -16,6 +18,10 @@ class MachineTraverser():
             machine, exclude_words=[], names_only=True, keep_upper=False):
         traverser = MachineTraverser()
         # logging.info('getting nodes for: {0}'.format(machine.printname()))
+        if isinstance(machine, FrozenMachine):
+            return traverser._get_frozen_nodes(
+                machine.graph, machine.node, set(exclude_words), names_only,
+                keep_upper)
         return traverser._get_nodes(
             machine, 0, set(exclude_words), names_only, keep_upper)
 
@@ -24,27 +30,31 @@ class MachineTraverser():
 
     def _get_nodes(
             self, machine, depth, exclude_words, names_only, keep_upper):
-        if machine in self.seen_for_nodes:
-            return
-        self.seen_for_nodes.add(machine)
-        name = machine.printname()
-        # logging.info(u'traversing: {0}'.format(name))
-        if (keep_upper or not name.isupper()) and name not in exclude_words:
-            if names_only:
-                yield name
-            else:
-                yield machine
-
-        for part in machine.partitions:
-            for submachine in part:
-                for node in self._get_nodes(
-                        submachine, depth+1, exclude_words, names_only,
-                        keep_upper):
-                    yield node
-        for parent, _ in machine.parents:
-            for node in self._get_nodes(
-                    parent, depth+1, exclude_words, names_only, keep_upper):
-                yield node
+        for machine in Traversal(machine, BOTH,
+                                 visited=self.seen_for_nodes).machines():
+            name = machine.printname()
+            # logging.info(u'traversing: {0}'.format(name))
+            if ((keep_upper or not name.isupper()) and
+                    name not in exclude_words):
+                if names_only:
+                    yield name
+                else:
+                    yield machine
+
+    def _get_frozen_nodes(
+            self, graph, node, exclude_words, names_only, keep_upper):
+        """_get_nodes() on a FrozenGraph: yields the same nodes, but walks
+        the node ids."""
+        for node in Traversal([node], visited=self.seen_for_nodes,
+                              links=lambda node: graph.links(node, BOTH)
+                              ).machines():
+            name = graph.printname(node)
+            if ((keep_upper or not name.isupper()) and
+                    name not in exclude_words):
+                if names_only:
+                    yield name
+                else:
+                    yield graph.machine(node)
 
 class MachineGraph:
     @staticmethod
@@ -54,56 +64,38 @@ class MachineGraph:
         g.seen = set()
         # logging.debug('whitelist: {}'.format(whitelist))
         for machine in iterable:
-            g._get_edges_recursively(machine, max_depth, whitelist,
-                                     strict=strict)
+            g._get_edges(machine, max_depth, whitelist, strict=strict)
 
         return g
 
-    def _get_edges_recursively(self, machine, max_depth, whitelist,
-                               strict=False, depth=0):
-        #  if pn.isupper():
-        #      if depth >= 2:
-        #          return
-        # pn = machine.unique_name()
-        if machine in self.seen or (max_depth is not None and
-                                    depth > max_depth):
-            # logging.info(u'skipping machine: {}'.format(pn))
-            return
-
-        # logging.info(u'getting edges for machine: {}'.format(pn))
-        # logging.info("{0}".format(machine.partitions))
-
-        self.seen.add(machine)
-        # if printname == 'from':
-        #     logging.info('from machine: {0}'.format(machine))
-        edges = set()
-        neighbours = set()
-        for color, part in enumerate(machine.partitions):
-            for machine2 in part:
-                if machine2 in self.seen:
+    def _get_edges(self, machine, max_depth, whitelist, strict=False):
+        """Adds the edges of the machines reachable from @p machine (in at
+        most @p max_depth steps) to the graph."""
+        if max_depth is not None:
+            max_depth += 1
+        for machine in Traversal(machine, BOTH, max_depth=max_depth,
+                                 visited=self.seen).machines():
+            edges = set()
+            for color, part in enumerate(machine.partitions):
+                for machine2 in part:
+                    if machine2 in self.seen:
+                        continue
+                    edges.add((machine, machine2, color))
+            for parent, color in machine.parents:
+                if parent in self.seen:
                     continue
-                neighbours.add(machine2)
-                edges.add((machine, machine2, color))
-        for parent, color in machine.parents:
-            if parent in self.seen:
-                continue
-            neighbours.add(parent)
-            edges.add((parent, machine, color))
-
-        for machine1, machine2, color in edges:
-            printname1 = machine1.printname()
-            printname2 = machine2.printname()
-            if (whitelist is not None and printname1 not in whitelist and
-                    printname2 not in whitelist):
-                continue
-            elif whitelist is None or (printname1 in whitelist and
-                                       printname2 in whitelist):
-                self.add_edge(
-                    machine1.unique_name(), machine2.unique_name(), color)
-
-        for neighbour in neighbours:
-            self._get_edges_recursively(
-                neighbour, max_depth, whitelist, depth=depth+1)
+                edges.add((parent, machine, color))
+
+            for machine1, machine2, color in edges:
+                printname1 = machine1.printname()
+                printname2 = machine2.printname()
+                if (whitelist is not None and printname1 not in whitelist and
+                        printname2 not in whitelist):
+                    continue
+                elif whitelist is None or (printname1 in whitelist and
+                                           printname2 in whitelist):
+                    self.add_edge(
+                        machine1.unique_name(), machine2.unique_name(), color)
 
     def __init__(self):
         self.G = nx.MultiDiGraph()
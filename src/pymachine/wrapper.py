@@ -1,6 +1,4 @@
 #!/usr/bin/env python
-from copy import deepcopy
-import cPickle
 import logging
 import os
 import re
@@ -9,6 +7,9 @@ import sys
 from pymachine.construction import VerbConstruction
 from pymachine.sentence_parser import SentenceParser
 from pymachine.lexicon import Lexicon
+from pymachine import flat
+from pymachine import mapped as mapped_format
+from pymachine.static_store import StaticStore
 from pymachine.operators import AppendToBinaryFromLexiconOperator  # nopep8
 from pymachine.utils import ensure_dir, MachineGraph, MachineTraverser
 from pymachine.machine import Machine
@@ -31,26 +32,58 @@ class Wrapper:
 
     num_re = re.compile(r'^[0-9.,]+$', re.UNICODE)
 
-    def __init__(self, cfg, batch=False, include_ext=True):
+    def __init__(self, cfg, batch=False, include_ext=True, base=None):
+        """
+        @param base a Wrapper whose lexicon is shared: the lexicon of this one
+                    is an overlay of it (see Lexicon.overlay()), with the
+                    definitions of @p cfg only, e.g. those of a domain.
+                    Such a lexicon cannot be saved (see reset_lexicon()).
+        """
         self.cfg = cfg
+        self.base = base
         self.__read_config()
         self.batch = batch
         self.wordlist = set()
-        self.__read_definitions()
-        if include_ext:
-            self.get_ext_definitions()
+        if self.static_store_fn:
+            # the definitions are read on demand
+            self.definitions = StaticStore(self.static_store_fn)
+        else:
+            self.__read_definitions()
+            if include_ext:
+                self.get_ext_definitions()
         self.__read_supp_dict()
         self.reset_lexicon()
 
-    def reset_lexicon(self, load_from=None, save_to=None):
-        if load_from:
-            self.lexicon = cPickle.load(open(load_from))
+    def reset_lexicon(self, load_from=None, save_to=None, mapped=False):
+        """
+        Builds the lexicon, or loads it from @p load_from (saved in the flat
+        or in the mapped format), and saves it to @p save_to (unless it is an
+        overlay of the lexicon of the base wrapper, which raises a
+        TypeError).
+        @param mapped save the lexicon in the mapped format (see
+                      pymachine.mapped), which loads near-instantly and is
+                      shared by the processes that load it, but is read-only.
+        """
+        if load_from and mapped_format.is_mapped(load_from):
+            self.lexicon = mapped_format.load_lexicon(load_from)
+        elif load_from:
+            with open(load_from, 'rb') as file_obj:
+                self.lexicon = flat.load_lexicon(file_obj)
         else:
-            self.lexicon = Lexicon()
-            self.__add_definitions()
+            if self.base is not None:
+                self.lexicon = self.base.lexicon.overlay()
+            else:
+                self.lexicon = Lexicon()
+            if isinstance(self.definitions, StaticStore):
+                self.lexicon.use_store(self.definitions)
+            else:
+                self.__add_definitions()
             self.__add_constructions()
-        if save_to:
-            cPickle.dump(self.lexicon, open(save_to, 'w'))
+        if save_to and mapped:
+            mapped_format.dump_lexicon(self.lexicon, save_to)
+        elif save_to:
+            with open(save_to, 'wb') as file_obj:
+                flat.dump_lexicon(self.lexicon, file_obj)
 
     def __read_config(self):
         items = dict(self.cfg.items("machine"))
@@ -61,6 +94,7 @@ class Wrapper:
         self.ext_defs_path = items.get("ext_definitions")
         self.supp_dict_fn = items.get("supp_dict")
         self.plural_fn = items.get("plurals")
+        self.static_store_fn = items.get("static_store")
 
     def __read_definitions(self):
         self.definitions = {}
@@ -76,7 +110,8 @@ class Wrapper:
             if file_name.endswith('pickle'):
                 logging.info(
                     'loading 4lang definitions from {}...'.format(file_name))
-                definitions = cPickle.load(file(file_name))
+                with open(file_name, 'rb') as file_obj:
+                    definitions = flat.load_definitions(file_obj)
             else:
                 logging.info('parsing 4lang definitions...')
                 definitions = read_defs(
@@ -84,8 +119,8 @@ class Wrapper:
                     three_parts=True)
 
                 logging.info('dumping 4lang definitions to file...')
-                f = open('{0}.pickle'.format(file_name), 'w')
-                cPickle.dump(definitions, f)
+                with open('{0}.pickle'.format(file_name), 'wb') as f:
+                    flat.dump_definitions(definitions, f)
 
             for pn, machines in definitions.iteritems():
                 if pn not in self.definitions:
@@ -93,9 +128,17 @@ class Wrapper:
                 else:
                     self.definitions[pn] |= machines
 
+    def save_static_store(self, file_name):
+        """Writes the definitions to a StaticStore, which can be used
+        instead of them (see the static_store option) to load the static
+        graph lazily."""
+        StaticStore.write(self.definitions, file_name)
+
     def __add_definitions(self):
-            definitions = deepcopy(self.definitions)
-            self.lexicon.add_static(definitions.itervalues())
+            # self.definitions is kept intact (e.g. for WordSimilarity)
+            with self.lexicon.bulk_load():
+                self.lexicon.add_static(
+                    self.definitions.itervalues(), copy_on_write=True)
             self.lexicon.finalize_static()
 
     def __read_supp_dict(self):
@@ -113,7 +156,8 @@ class Wrapper:
             logging.info(
                 'loading external definitions from {}...'.format(
                     self.ext_defs_path))
-            definitions = cPickle.load(file(self.ext_defs_path))
+            with open(self.ext_defs_path, 'rb') as file_obj:
+                definitions = flat.load_definitions(file_obj)
 
         else:
             raise Exception("building machines from deps has moved to 4lang")
@@ -158,10 +202,13 @@ class Wrapper:
 
     def run(self, sentence):
         """Parses a sentence, runs the spreading activation and returns the
-        messages that have to be sent to the active plugins."""
+        messages that have to be sent to the active plugins. The sentence is
+        processed in its own active context (see Lexicon.context()), so
+        run() can be called for several sentences at the same time."""
         try:
+            lexicon = self.lexicon.context()
             sp = SentenceParser()
-            sa = SpreadingActivation(self.lexicon)
+            sa = SpreadingActivation(lexicon)
             machines = sp.parse(sentence)
             logging.debug('machines: {}'.format(machines))
             logging.debug('machines: {}'.format(
@@ -171,10 +218,10 @@ class Wrapper:
                     if machine.control.kr['CAT'] == 'VERB':
                         logging.debug('adding verb construction for {}'.format(
                             machine))
-                        self.lexicon.add_construction(VerbConstruction(
-                            machine.printname(), self.lexicon, self.supp_dict))
+                        lexicon.add_construction(VerbConstruction(
+                            machine.printname(), lexicon, self.supp_dict))
             logging.info('constructions: {}'.format(
-                self.lexicon.constructions))
+                lexicon.constructions))
 
             # results is a list of (url, data) tuples
             results = sa.activation_loop(machines)
@@ -186,7 +233,7 @@ class Wrapper:
             f = open('machines.dot', 'w')
             f.write(graph.to_dot().encode('utf-8'))
 
-            self.lexicon.clear_active()
+            lexicon.clear_active(release=True)
         except Exception, e:
             import traceback
             traceback.print_exc(e)
@@ -0,0 +1,13 @@
+import pytest
+
+from helpers import build, read_definitions
+
+@pytest.fixture
+def definitions():
+    """The definitions in helpers.DEFINITIONS, parsed anew for each test."""
+    return read_definitions()
+
+@pytest.fixture
+def lexicon():
+    """A finalized lexicon of the definitions in helpers.DEFINITIONS."""
+    return build()
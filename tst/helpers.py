@@ -0,0 +1,105 @@
+"""Definitions and lexicons shared by the tests."""
+import os
+
+from pymachine.definition_parser import DefinitionParser, read
+from pymachine.lexicon import Lexicon
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+
+TST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFINITIONS = os.path.join(TST_DIR, 'patch_test_definitions')
+# tiger, lion and horse are changed, wing is removed
+NEW_DEFINITIONS = os.path.join(TST_DIR, 'patch_test_definitions_new')
+
+def read_definitions(file_name=DEFINITIONS):
+    """
+    Parses the definitions in @p file_name.
+    @note The parser builds the partitions from sets, so each parse orders
+          them differently. Graphs that are compared (e.g. after an
+          expansion) must be built from the same parse.
+    """
+    return read(open(file_name), None)
+
+def parse(definitions):
+    """Parses a list of <tt>(word, definition)</tt> pairs."""
+    parser = DefinitionParser({})
+    return [parser.parse_into_machines('\t'.join(
+                [word, '#', '#', '#', str(i), '#', 'N', definition, '']))
+            for i, (word, definition) in enumerate(definitions)]
+
+def concept(print_name):
+    return Machine(print_name, ConceptControl())
+
+def small_definitions():
+    """A few definitions: 'in' is referenced before its two senses are
+    defined, and the definitions contain deep cases."""
+    fly = concept('fly/12')
+    fly.append(concept('in'), 0)
+    fly.append(concept('=AGT'), 1)
+    wing = concept('wing')
+    wing.append(concept('bird'), 0)
+    fly.append(wing, 0)
+    in_7 = concept('in/7')
+    in_7.append(concept('inside'), 0)
+    in_8 = concept('in/8')
+    in_8.append(concept('fly'), 0)
+    bird = concept('bird/3')
+    bird.append(concept('fly'), 0)
+    bird.append(concept('=AGT'), 1)
+    return [fly, in_7, in_8, bird]
+
+def snapshot(lexicon):
+    """The frozen static graph of @p lexicon (see Lexicon.freeze()), in
+    which the machines are numbered in the order of the static graph."""
+    graph = lexicon.freeze()
+    return ([list(getattr(graph, name)) for name in (
+                'name_of', 'control_of', 'part_start', 'child_start',
+                'children', 'parent_start', 'parents', 'parent_parts')],
+            graph.names, sorted(graph.static.items()),
+            sorted((name, sorted(names))
+                   for name, names in graph.static_disambig.items()))
+
+def build(machines=None, copy_on_write=False, share_identical=True,
+          bulk_load=False, processes=None):
+    """A finalized lexicon of the definition @p machines (by default, those
+    in DEFINITIONS), built within Lexicon.bulk_load() if @p bulk_load, and
+    in @p processes worker processes if given (see Lexicon.add_static())."""
+    if machines is None:
+        machines = read_definitions().values()
+    lexicon = Lexicon()
+    if bulk_load:
+        with lexicon.bulk_load():
+            lexicon.add_static(machines, copy_on_write=copy_on_write,
+                               processes=processes)
+    else:
+        lexicon.add_static(machines, copy_on_write=copy_on_write,
+                           processes=processes)
+    lexicon.finalize_static(share_identical=share_identical)
+    return lexicon
+
+def structure(static):
+    """The static graph, by structure (see Machine.fingerprint()), without
+    the ids of the machines."""
+    canonicals = set(nodes[0] for nodes in static.itervalues())
+    return sorted(
+        (print_name, sorted(node.fingerprint(canonicals - set([node]))
+                            for node in static[print_name]),
+         sorted((parent.printname(), part_i)
+                for parent, part_i in static[print_name][0].parents))
+        for print_name in static)
+
+def active_graph(lexicon):
+    """The children of the primary active machine of each printname, by
+    printname."""
+    return sorted(
+        (print_name, [sorted(child.printname() for child in part)
+                      for part in lexicon.active.primary(
+                          print_name).partitions])
+        for print_name in lexicon.active)
+
+def expanded(lexicon, words):
+    """The active graph after expanding @p words in a context."""
+    context = lexicon.context()
+    for word in words:
+        context.expand(context.get_machine(word))
+    return active_graph(context)
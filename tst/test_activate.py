@@ -0,0 +1,46 @@
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+
+from helpers import build
+
+def definition(word, *children):
+    machine = Machine(word, ConceptControl())
+    for child in children:
+        machine.append(Machine(child, ConceptControl()), 0)
+    return machine
+
+def build_pets():
+    # pet needs animal and home, dog needs pet and bark, the AVM does not
+    # count
+    return build([definition('pet', 'animal', 'home', '#AVM'),
+                  definition('dog', 'pet', 'bark'),
+                  definition('cat', 'pet', 'meow')])
+
+def active_names(machines):
+    return sorted(machine.printname() for machine in machines)
+
+def test_printnames():
+    lexicon = build_pets()
+    lexicon.add_active(Machine('animal', ConceptControl()))
+    assert lexicon.activate() == []
+    # the children are matched by their printnames
+    lexicon.add_active(Machine('home', ConceptControl()))
+    assert active_names(lexicon.activate()) == ['pet']
+    assert 'pet' in lexicon.active
+    assert lexicon.activate() == []
+
+def test_cascade():
+    lexicon = build_pets()
+    for word in ('animal', 'home', 'bark'):
+        lexicon.add_active(Machine(word, ConceptControl()))
+    # dog is activated by pet, which is activated in the same call
+    assert active_names(lexicon.activate()) == ['dog', 'pet']
+    assert 'cat' not in lexicon.active
+
+def test_context():
+    lexicon = build_pets()
+    context = lexicon.context()
+    for word in ('animal', 'home', 'meow'):
+        context.add_active(Machine(word, ConceptControl()))
+    assert active_names(context.activate()) == ['cat', 'pet']
+    assert 'pet' not in lexicon.active
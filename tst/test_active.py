@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from pymachine.active import ActiveStore
+from pymachine.lexicon import Lexicon
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+
+def check(store, reference):
+    """Compares @p store with @p reference, the nested dict that
+    Lexicon.active used to be."""
+    assert len(store) == len(reference)
+    assert sorted(store) == sorted(reference)
+    for printname, machines in reference.iteritems():
+        assert printname in store
+        assert store[printname] == machines
+        for machine, expanded in machines.iteritems():
+            assert store.contains_machine(machine)
+            assert store.is_expanded(machine) == expanded
+    assert (set(store.expanded()) ==
+            set(machine for machines in reference.itervalues()
+                for machine, expanded in machines.iteritems() if expanded))
+    assert (set(store.unexpanded()) ==
+            set(machine for machines in reference.itervalues()
+                for machine, expanded in machines.iteritems()
+                if not expanded))
+
+def test_against_dict():
+    rand = random.Random(7)
+    machines = [Machine('word{0}'.format(i % 10), ConceptControl())
+                for i in xrange(30)]
+    store, reference = ActiveStore(), {}
+    for step in xrange(2000):
+        machine = rand.choice(machines)
+        action = rand.random()
+        if action < 0.6:
+            expanded = rand.random() < 0.3
+            machines_of = reference.setdefault(machine.printname(), {})
+            assert (store.add(machine, expanded) ==
+                    (len(machines_of) == 0))
+            machines_of[machine] = machines_of.get(machine) or expanded
+        elif action < 0.9:
+            if machine in reference.get(machine.printname(), ()):
+                store.set_expanded(machine)
+                reference[machine.printname()][machine] = True
+        elif action < 0.97:
+            check(store, reference)
+        elif action < 0.98:
+            # usually done by clear() once there are enough stale entries
+            store.purge()
+        else:
+            store.clear()
+            reference = {}
+    check(store, reference)
+
+def test_primary():
+    store = ActiveStore()
+    first, second = (Machine('dog', ConceptControl()),
+                     Machine('dog', ConceptControl()))
+    store.add(first)
+    store.add(second, expanded=True)
+    assert store.primary('dog') is first
+    assert store.machines('dog') == [first, second]
+    assert store.unexpanded() == [first]
+    store.clear()
+    assert 'dog' not in store and len(store) == 0
+    with pytest.raises(KeyError):
+        store.primary('dog')
+    # the machines can be added again after clear()
+    assert store.add(second)
+    assert store.primary('dog') is second
+    assert not store.is_expanded(second)
+
+def test_old_pickles():
+    lexicon = Lexicon()
+    dog = Machine('dog', ConceptControl())
+    state = lexicon.__getstate__()
+    state['active'] = {'dog': {dog: True}}
+    # pickled before ActiveStore
+    old = Lexicon()
+    old.__setstate__(state)
+    assert isinstance(old.active, ActiveStore)
+    assert old.active['dog'] == {dog: True}
@@ -0,0 +1,22 @@
+import copy
+
+from helpers import build, structure
+
+def children(lexicon):
+    """The children of the static machines, in order, by printname."""
+    return sorted(
+        (print_name, i, [[child.printname() for child in part]
+                         for part in machine.partitions])
+        for print_name, nodes in lexicon.static.iteritems()
+        for i, machine in enumerate(nodes))
+
+def test_same_graph(definitions):
+    machines = [machine for print_name in sorted(definitions)
+                for machine in definitions[print_name]]
+    for copy_on_write in (False, True):
+        # without copy_on_write, the lexicons take over the machines
+        serial = build(copy.deepcopy(machines), copy_on_write)
+        bulk = build(copy.deepcopy(machines), copy_on_write, bulk_load=True)
+        assert structure(bulk.static) == structure(serial.static)
+        assert children(bulk) == children(serial)
+        assert bulk.static_disambig == serial.static_disambig
@@ -0,0 +1,102 @@
+import sys
+from threading import Thread
+
+import pytest
+
+from pymachine.construction import Construction
+from pymachine.fst import FSA
+from pymachine.machine import Machine
+from pymachine.matcher import PrintnameMatcher
+from pymachine.control import ConceptControl
+
+from helpers import active_graph
+
+SENTENCES = [['vet', 'lion'], ['bird', 'zebra'], ['dog', 'cat', 'mouse'],
+             ['fish', 'water']]
+
+def static_links(lexicon):
+    return sorted(
+        (print_name, i, [[child.id for child in part]
+                         for part in machine.partitions],
+         sorted((parent.id, part_i) for parent, part_i in machine.parents))
+        for print_name, nodes in lexicon.static.iteritems()
+        for i, machine in enumerate(nodes))
+
+def process(context, words):
+    for word in words:
+        context.expand(context.get_machine(word))
+    return active_graph(context)
+
+def test_static_graph_shared(lexicon):
+    before = static_links(lexicon)
+    context = lexicon.context()
+    dog = context.get_machine('dog')
+    assert dog is not lexicon.static['dog'][0]
+    assert 'dog' in context.active and 'dog' not in lexicon.active
+    process(context, SENTENCES[0])
+    unknown = context.get_machine('platypus')
+    assert 'platypus' in context.active
+    assert 'platypus' not in lexicon.static
+    # the static graph is read-only in a context
+    with pytest.raises(TypeError):
+        context.add_definition(Machine('platypus', ConceptControl()))
+    with pytest.raises(TypeError):
+        context.remove_definition('dog')
+    assert static_links(lexicon) == before
+    assert unknown is context.get_machine('platypus')
+
+def test_contexts_independent(lexicon):
+    expected = [process(lexicon.context(), words) for words in SENTENCES]
+    contexts = [lexicon.context() for _ in SENTENCES]
+    for context, words, result in zip(contexts, SENTENCES, expected):
+        assert process(context, words) == result
+    # in threads
+    results = [None] * len(SENTENCES)
+
+    def run(i):
+        results[i] = process(lexicon.context(), SENTENCES[i])
+    threads = [Thread(target=run, args=(i,)) for i in xrange(len(SENTENCES))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == expected
+
+def barking_dog():
+    """A construction that matches a dog followed by a bark."""
+    control = FSA()
+    control.add_state('0', is_init=True)
+    control.add_state('1')
+    control.add_state('2', is_final=True)
+    control.add_transition(PrintnameMatcher('dog', exact=True), '0', '1')
+    control.add_transition(PrintnameMatcher('bark', exact=True), '1', '2')
+    return Construction('barking dog', control)
+
+def test_constructions_in_threads(lexicon):
+    lexicon.add_construction(barking_dog())
+    contexts = [lexicon.context() for _ in xrange(4)]
+    construction = lexicon.constructions[0]
+    for context in contexts:
+        assert context.constructions[0] is not construction
+        assert context.constructions[0].control is not construction.control
+    errors = []
+
+    def run(context, words, accepted):
+        seq = [context.get_machine(word) for word in words]
+        for _ in xrange(2000):
+            if context.constructions[0].check(seq) != accepted:
+                errors.append(words)
+    runs = [(['dog', 'bark'], True), (['dog', 'cat'], False)] * 2
+    interval = sys.getcheckinterval()
+    # switch threads often, within check()
+    sys.setcheckinterval(1)
+    try:
+        threads = [Thread(target=run, args=(context, words, accepted))
+                   for context, (words, accepted) in zip(contexts, runs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setcheckinterval(interval)
+    assert errors == []
@@ -0,0 +1,34 @@
+import copy
+
+from pymachine.traversal import Traversal
+
+from helpers import build, small_definitions, snapshot
+
+def links(roots):
+    """The links of the graph under @p roots, with the machines
+    themselves (not copies)."""
+    return [(machine, [list(part) for part in machine.partitions],
+             set(machine.parents), machine.control, machine.control.machine)
+            for machine in Traversal(roots).machines()]
+
+def test_same_graph():
+    machines = small_definitions()
+    assert (snapshot(build(machines, copy_on_write=True)) ==
+            snapshot(build(copy.deepcopy(machines))))
+
+def test_definitions_intact():
+    machines = small_definitions()
+    before = links(machines)
+    lexicon = build(machines, copy_on_write=True)
+    assert links(machines) == before
+    static = set(machine for nodes in lexicon.static.itervalues()
+                 for machine in nodes)
+    assert not static & set(machine for machine, _, _, _, _ in before)
+    # the same definitions can be added to another lexicon
+    assert snapshot(build(machines, copy_on_write=True)) == snapshot(lexicon)
+
+def test_parsed_definitions(definitions):
+    machines = [machine for print_name in sorted(definitions)
+                for machine in definitions[print_name]]
+    assert (snapshot(build(machines, copy_on_write=True)) ==
+            snapshot(build(copy.deepcopy(machines))))
@@ -0,0 +1,33 @@
+def split(def_graph, name):
+    """The words and the deep cases in the definition of @p name."""
+    words, deep_cases = set(), set()
+    for child in def_graph[name][0].children():
+        if child is def_graph.get(child.printname(), [None])[0]:
+            words.add(child.printname())
+        else:
+            deep_cases.add(child.printname())
+    return words, deep_cases
+
+def deep_definition(matrix, word):
+    row = matrix.deep_matrix.getrow(matrix.index[word]).indices
+    return set(matrix.deep_cases[col] for col in row)
+
+def test_same_as_dict(lexicon):
+    for deep_cases in (False, True):
+        def_graph = lexicon.extract_definition_graph(deep_cases)
+        matrix = lexicon.extract_definition_graph(deep_cases, sparse=True)
+        assert matrix.words == sorted(def_graph)
+        assert len(matrix) == len(def_graph)
+        assert matrix.matrix.shape == (len(def_graph), len(def_graph))
+        if deep_cases:
+            assert matrix.deep_cases
+        else:
+            assert matrix.deep_matrix is None
+        for name in def_graph:
+            words, deep = split(def_graph, name)
+            assert set(matrix.definition(name)) == words
+            assert len(matrix.definition(name)) == len(words)
+            if deep_cases:
+                assert deep_definition(matrix, name) == deep
+            else:
+                assert not deep
@@ -0,0 +1,114 @@
+import os
+import random
+
+from pymachine.definition_parser import DefinitionParser
+
+from helpers import TST_DIR
+
+DAT_DIR = os.path.join(TST_DIR, '..', 'dat')
+
+EXAMPLES = [
+    "dog", "dog, cat", " dog , cat ", "IS_A cat", "12 IS_A", "dog/12",
+    "-x", "aB", "<dog>", "<<dog>>", "dog(cat)", "dog(IS_A cat)",
+    "'ER", "ER'", "a HAS b", "[a] HAS [b]", "<[a]> HAS <'>",
+    "HAS [a; b]", "HAS [a HAS b; <c>]", "=AGT CAUSE[=PAT[healthy]]",
+    "=REL x", "x =REL", "=RELATIVE", "$HUN_FROM", "@url-x", "#Avm",
+    "animal[wild]", "[vet] HEAL [animal], [vet] HAS [hair]",
+    # not definitions
+    "", "a b", "dog,", "[a]", "HAS [a]", "<dog", "dog)"]
+
+def dat_definitions():
+    """The definitions in the (old format) dat/*_definitions files."""
+    definitions = []
+    for file_name in sorted(os.listdir(DAT_DIR)):
+        if not file_name.endswith('_definitions'):
+            continue
+        for line in open(os.path.join(DAT_DIR, file_name)):
+            if line.startswith('%') or ':' not in line:
+                continue
+            definition = line.split(':', 1)[1].split('%')[0].strip()
+            if definition:
+                definitions.append(definition)
+    return definitions
+
+def static_test_definitions():
+    """The definitions in static_test_definitions."""
+    return [line.split('\t')[7] for line in
+            open(os.path.join(TST_DIR, 'static_test_definitions'))
+            if line.split('\t')[7]]
+
+def random_definition(rand, depth):
+    """A random string of the grammar of the definitions, mostly valid."""
+    def space():
+        return rand.choice(['', '', ' ', '  '])
+
+    def unary():
+        return rand.choice([
+            'dog', 'cat/3', '-x', '12', '_', '=AGT', '=PAT', '$HUN_FROM',
+            '#Avm', '@url-x', '<dog>'])
+
+    def binary():
+        return rand.choice(['HAS', 'IS_A', 'AT/2', '12', '=REL'])
+
+    def argexpr(depth):
+        return rand.choice([
+            lambda: unexpr(depth),
+            lambda: '[' + space() + definition(depth - 1) + space() + ']',
+            lambda: '<' + argexpr(depth - 1) + '>',
+            lambda: "'"])()
+
+    def unexpr(depth):
+        if depth <= 0:
+            return unary()
+        return rand.choice([
+            unary,
+            lambda: unary() + space() + '[' + definition(depth - 1) + ']',
+            lambda: unary() + space() + '(' + unary() + ')'])()
+
+    def binexpr(depth):
+        return rand.choice([
+            lambda: argexpr(depth - 1) + ' ' + binary(),
+            lambda: binary() + ' ' + argexpr(depth - 1),
+            lambda: argexpr(depth - 1) + ' ' + binary() + ' ' +
+            argexpr(depth - 1),
+            lambda: binary() + space() + '[' + expression(depth - 1) + ';' +
+            space() + expression(depth - 1) + ']'])()
+
+    def expression(depth):
+        if depth <= 0:
+            return unary()
+        return rand.choice([
+            lambda: unexpr(depth), lambda: binexpr(depth),
+            lambda: unary() + '(' + expression(depth - 1) + ')',
+            lambda: '<' + expression(depth - 1) + '>'])()
+
+    def definition(depth):
+        return (space() + ',' + space()).join(
+            expression(depth) for _ in xrange(rand.randint(1, 3)))
+
+    return definition(depth)
+
+def parse(parse_method, definition):
+    try:
+        return parse_method(definition)
+    except Exception:
+        return None
+
+def same_parse(parser, definition):
+    return (parse(parser.parse, definition) ==
+            parse(parser.parse_pyparsing, definition))
+
+def test_examples():
+    parser = DefinitionParser({})
+    for definition in (EXAMPLES + dat_definitions() +
+                       static_test_definitions()):
+        assert same_parse(parser, definition), definition
+
+def test_random():
+    parser = DefinitionParser({})
+    rand = random.Random(42)
+    # pyparsing is slow on the deeper ones
+    for depth, count in ((1, 100), (2, 30)):
+        for _ in xrange(count):
+            definition = random_definition(rand, depth)
+            assert same_parse(parser, definition), definition
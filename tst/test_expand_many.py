@@ -0,0 +1,45 @@
+SENTENCES = [['vet', 'lion', 'bird', 'zebra'], ['dog', 'cat', 'mouse'],
+             ['dog', 'dog', 'bone'], ['fish', 'platypus', 'water']]
+
+def snapshot(context):
+    return sorted(
+        (print_name, context.active.is_expanded(
+            context.active.primary(print_name)),
+         [sorted(child.printname() for child in part)
+          for part in context.active.primary(print_name).partitions])
+        for print_name in context.active)
+
+def unified(lexicon, words):
+    """The active graph after unifying the definitions of @p words with it,
+    as expand() did before the expansion plans."""
+    context = lexicon.context()
+    machines = [context.get_machine(word) for word in words]
+    for machine in machines:
+        for static_machine in lexicon.static.get(machine.printname(), []):
+            context.unify_recursively(static_machine, False, first=True)
+        context.active.set_expanded(machine)
+    return snapshot(context)
+
+def expanded(lexicon, words):
+    context = lexicon.context()
+    for machine in [context.get_machine(word) for word in words]:
+        context.expand(machine)
+    return snapshot(context)
+
+def expanded_many(lexicon, words):
+    context = lexicon.context()
+    context.expand_many([context.get_machine(word) for word in words])
+    return snapshot(context)
+
+def test_same_as_expand(lexicon):
+    # the parser orders the partitions differently in each run, so all
+    # results must come from the same lexicon
+    for words in SENTENCES:
+        reference = unified(lexicon, words)
+        assert expanded(lexicon, words) == reference
+        assert expanded_many(lexicon, words) == reference
+
+def test_empty(lexicon):
+    context = lexicon.context()
+    context.expand_many([])
+    assert len(context.active) == 0
@@ -0,0 +1,32 @@
+import pytest
+
+from pymachine.lexicon import Lexicon
+
+from helpers import expanded, structure
+
+def definition_graph(def_graph):
+    return sorted((name, sorted(child.printname()
+                                for child in machines[0].children()))
+                  for name, machines in def_graph.iteritems())
+
+def test_static_graph(lexicon):
+    graph = lexicon.freeze()
+    assert structure(graph.static_machines()) == structure(lexicon.static)
+    for name in ('PART_OF', 'bird', 'unknown'):
+        assert ([m.printname() for m in graph.get_static_machine(name)] ==
+                [m.printname() for m in lexicon.get_static_machine(name)])
+
+def test_definition_graph(lexicon):
+    graph = lexicon.freeze()
+    for deep_cases in (False, True):
+        assert (definition_graph(graph.extract_definition_graph(deep_cases))
+                == definition_graph(
+                    lexicon.extract_definition_graph(deep_cases)))
+
+def test_from_frozen(lexicon):
+    frozen = Lexicon.from_frozen(lexicon.freeze())
+    words = ['vet', 'lion', 'bird', 'zebra']
+    assert expanded(frozen, words) == expanded(lexicon, words)
+    bird = frozen.static['bird'][0]
+    with pytest.raises(TypeError):
+        bird.append(frozen.static['wing'][0], 0)
@@ -0,0 +1,68 @@
+from pymachine.graph_diff import DefinitionPatch, GraphDiff
+
+import helpers
+from helpers import DEFINITIONS, NEW_DEFINITIONS, read_definitions
+
+def test_same_file_no_patch():
+    # the parser builds the partitions from sets, so the order of their
+    # machines differs between the two parses
+    patch = DefinitionPatch.between(read_definitions(DEFINITIONS),
+                                    read_definitions(DEFINITIONS))
+    assert len(patch) == 0
+    old, new = read_definitions(DEFINITIONS), read_definitions(DEFINITIONS)
+    for print_name in old:
+        assert not GraphDiff.between(old[print_name], new[print_name])
+
+def test_minimal_patch():
+    patch = DefinitionPatch.between(read_definitions(DEFINITIONS),
+                                    read_definitions(NEW_DEFINITIONS))
+    assert patch.removed == set(['wing'])
+    assert sorted(patch.updated) == ['horse', 'lion', 'tiger']
+    assert sorted(patch.diffs) == ['horse', 'lion', 'tiger']
+
+def build(definitions):
+    return helpers.build(definitions.values(), copy_on_write=True,
+                         share_identical=False)
+
+def snapshot(lexicon):
+    """The static graph, by structure: the definitions of the canonical
+    machines and the modified machines of each printname, and the parents
+    of the canonical machines."""
+    canonicals = set(nodes[0] for nodes in lexicon.static.itervalues())
+    entries = []
+    for print_name, nodes in lexicon.static.iteritems():
+        canonical = nodes[0]
+        entries.append((
+            print_name,
+            canonical.fingerprint(canonicals - set([canonical])),
+            sorted(node.fingerprint(canonicals) for node in nodes[1:]),
+            sorted((parent.printname(), part_i)
+                   for parent, part_i in canonical.parents)))
+    return (sorted(entries),
+            sorted((name, sorted(names))
+                   for name, names in lexicon.static_disambig.iteritems()))
+
+def test_patch_is_rebuild():
+    old, new = (read_definitions(DEFINITIONS),
+                read_definitions(NEW_DEFINITIONS))
+    lexicon = build(old)
+    DefinitionPatch.between(old, new).apply(lexicon)
+    # bird still refers to wing
+    assert not any(lexicon.static['wing'][0].partitions)
+    # PART_OF was only used in the definition of wing
+    assert 'PART_OF' not in lexicon.static
+    assert 'PART_OF' not in lexicon.static_disambig
+    assert snapshot(lexicon) == snapshot(build(new))
+
+def test_remove_definition_keeps_referred():
+    lexicon = build(read_definitions(DEFINITIONS))
+    # other definitions refer to bird, and ON is used by feather and tail
+    assert lexicon.remove_definition('bird') is not None
+    assert not any(lexicon.static['bird'][0].partitions)
+    lexicon.remove_definition('feather')
+    assert 'ON' in lexicon.static
+    lexicon.remove_definition('tail')
+    assert 'ON' not in lexicon.static
+    # soft was only referred to by feather, long only by tail
+    assert 'soft' not in lexicon.static
+    assert 'long' not in lexicon.static
@@ -0,0 +1,19 @@
+from helpers import build, parse
+
+def test_hyponyms():
+    lexicon = build(parse([('tiger', 'IS_A cat, wild'),
+                           ('cat', 'IS_A animal'), ('dog', 'IS_A animal')]))
+    assert lexicon.hyponyms('cat') == frozenset(['tiger'])
+    assert lexicon.hyponyms('animal') == frozenset(['cat', 'dog'])
+    assert lexicon.hyponyms('animal', transitive=True) == frozenset(
+        ['tiger', 'cat', 'dog'])
+    assert lexicon.hypernyms('tiger', transitive=True) == frozenset(
+        ['cat', 'animal'])
+    assert lexicon.hyponyms('tiger') == frozenset()
+    # contexts share the index, overlays add to it
+    assert lexicon.context().hyponyms('cat') == frozenset(['tiger'])
+    overlay = lexicon.overlay()
+    overlay.add_static(parse([('lion', 'IS_A cat')]), copy_on_write=True)
+    overlay.finalize_static()
+    assert overlay.hyponyms('cat') == frozenset(['tiger', 'lion'])
+    assert lexicon.hyponyms('cat') == frozenset(['tiger'])
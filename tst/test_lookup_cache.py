@@ -0,0 +1,77 @@
+from pymachine.lexicon import Lexicon
+from pymachine.lookup_cache import LookupCache
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+
+def test_lru():
+    cache = LookupCache()
+    for name in 'abc':
+        cache.put(name, [name], 3)
+    assert cache.get('a', 3) == ['a']
+    # b is the least recently used one now
+    cache.put('d', ['d'], 3)
+    assert cache.get('b', 3) is None
+    assert [cache.get(name, 3) for name in 'acd'] == [['a'], ['c'], ['d']]
+    assert len(cache) == 3
+    assert (cache.hits, cache.misses) == (4, 1)
+    cache.put('e', [], 0)
+    assert cache.get('e', 0) is None
+
+def test_recent_not_moved():
+    cache = LookupCache()
+    for name in 'abcd':
+        cache.put(name, [name], 4)
+    # d is among the newer half, so it is not moved; a is
+    cache.get('d', 4)
+    cache.get('a', 4)
+    for name in 'ef':
+        cache.put(name, [name], 4)
+    assert [cache.get(name, 4) is not None for name in 'abcd'] == [
+        True, False, False, True]
+
+def build():
+    lexicon = Lexicon(add_unknown=False)
+    dog = Machine('dog', ConceptControl(), 1)
+    dog.append(Machine('animal', ConceptControl()), 0)
+    lexicon.add_static(dog)
+    lexicon.finalize_static()
+    return lexicon
+
+def test_get_machine_cache():
+    lexicon, other = build(), build()
+    dog = lexicon.get_machine('dog')
+    assert dog is lexicon.static['dog'][0]
+    assert lexicon.get_machine('dog') is dog
+    # unknown words are cached as negative results
+    unknown = lexicon.get_machine('cat')
+    assert lexicon.get_machine('cat') is unknown
+    assert 'cat' not in lexicon.static
+    assert lexicon.lookup_cache_info() == {'hits': 2, 'misses': 2,
+                                           'size': 2}
+    # contexts share the cache, other lexicons have their own
+    lexicon.context().get_machine('dog')
+    assert lexicon.lookup_cache_info()['hits'] == 3
+    assert other.lookup_cache_info() == {'hits': 0, 'misses': 0, 'size': 0}
+    # the cache is emptied when the static graph changes
+    lexicon.remove_definition('dog')
+    assert lexicon.lookup_cache_info()['size'] == 0
+    assert lexicon.get_machine('dog') is not dog
+
+def test_plan_cache_eviction(lexicon):
+    lexicon.PLAN_CACHE_SIZE = 2
+
+    def expand(word):
+        context = lexicon.context()
+        context.expand(context.get_machine(word))
+    for word in ('vet', 'lion', 'vet'):
+        expand(word)
+    assert lexicon.plan_cache_info() == {'hits': 1, 'misses': 2, 'size': 2}
+    # lion is the least recently used plan
+    expand('bird')
+    expand('vet')
+    assert lexicon.plan_cache_info()['hits'] == 2
+    expand('lion')
+    assert lexicon.plan_cache_info() == {'hits': 2, 'misses': 4, 'size': 2}
+    # the plans are dropped when the static graph changes
+    lexicon.remove_definition('bird')
+    assert lexicon.plan_cache_info()['size'] == 0
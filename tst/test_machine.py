@@ -0,0 +1,107 @@
+import random
+from threading import Thread
+
+from pymachine.machine import Machine, Partition, reserve_machine_id
+from pymachine.control import ConceptControl
+
+def test_debug_str_uses_machine_ids():
+    machine = Machine('dog', ConceptControl())
+    assert unicode(machine) == u'dog_{0}, ConceptControl:{0}'.format(
+        machine.id)
+    shared = Machine('cat', ConceptControl.shared())
+    assert unicode(shared) == u'cat_{0}, SharedConceptControl:None'.format(
+        shared.id)
+
+def test_to_debug_str_keeps_stop():
+    dog = Machine('dog', ConceptControl())
+    animal = Machine('animal', ConceptControl())
+    bone = Machine('bone', ConceptControl())
+    dog.append(animal, 0)
+    dog.append(bone, 1)
+    stop = set([dog, animal])
+    lines = dog.to_debug_str(stop=stop).splitlines()
+    assert stop == set([dog, animal])
+    assert len(lines) == 3
+    assert lines[1].endswith('p[...]') and not lines[2].endswith('p[...]')
+    assert dog.to_debug_str(stop=stop).splitlines() == lines
+
+def test_ids_unique_across_threads():
+    ids = []
+
+    def create():
+        ids.extend([Machine('dog').id for _ in xrange(20000)])
+    threads = [Thread(target=create) for _ in xrange(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids)) == len(ids) == 80000
+
+def test_reserve_machine_id():
+    last = Machine('dog').id
+    reserve_machine_id(last + 100)
+    assert Machine('dog').id > last + 100
+    # smaller ids do not move the counter back
+    reserve_machine_id(last)
+    assert Machine('dog').id > last + 100
+
+def check_partition(partition, reference, values):
+    assert list(partition) == reference
+    for value in values:
+        assert (value in partition) == (value in reference)
+        assert partition.count(value) == reference.count(value)
+    if partition._index is not None:
+        assert partition._index == dict(
+            (value, reference.count(value)) for value in set(reference))
+
+def test_partition_against_list():
+    rand = random.Random(5)
+    values = range(12)
+    partition, reference = Partition(), []
+    for step in xrange(3000):
+        action = rand.randrange(9)
+        value = rand.choice(values)
+        # drift around INDEX_THRESHOLD
+        if len(reference) > 2 * Partition.INDEX_THRESHOLD + 4:
+            action = 3
+        if action < 2:
+            partition.append(value)
+            reference.append(value)
+        elif action == 2:
+            items = [rand.choice(values) for _ in xrange(rand.randrange(4))]
+            partition.extend(items)
+            reference.extend(items)
+        elif action == 3 and reference:
+            value = rand.choice(reference)
+            partition.remove(value)
+            reference.remove(value)
+        elif action == 4 and reference:
+            i = rand.randrange(-len(reference), len(reference))
+            partition[i] = value
+            reference[i] = value
+        elif action == 5 and reference:
+            i = rand.randrange(-len(reference), len(reference))
+            del partition[i]
+            del reference[i]
+        elif action == 6:
+            i, j = sorted(rand.randrange(len(reference) + 1)
+                          for _ in xrange(2))
+            items = [rand.choice(values) for _ in xrange(rand.randrange(6))]
+            partition[i:j] = items
+            reference[i:j] = items
+        elif action == 7:
+            i, j = sorted(rand.randrange(len(reference) + 1)
+                          for _ in xrange(2))
+            del partition[i:j]
+            del reference[i:j]
+        elif action == 8 and reference:
+            i = rand.randrange(len(reference))
+            assert partition.pop(i) == reference.pop(i)
+        check_partition(partition, reference, values)
+    # extended slices
+    partition[::2] = reference[::2] = [0] * len(reference[::2])
+    del partition[1::3]
+    del reference[1::3]
+    partition += [1, 2]
+    reference += [1, 2]
+    check_partition(partition, reference, values)
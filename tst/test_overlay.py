@@ -0,0 +1,48 @@
+from helpers import build, parse
+
+def children(machine):
+    return [sorted(child.printname() for child in part)
+            for part in machine.partitions]
+
+def test_borrowed_links_are_one_way():
+    lexicon = build(parse([('cat', 'animal, small'),
+                           ('dog', 'animal, loyal')]))
+    cat = lexicon.static['cat'][0]
+    parents = set(cat.parents)
+    overlay = lexicon.overlay()
+    overlay.add_static(parse([('lion', 'cat, big')]), copy_on_write=True)
+    overlay.finalize_static()
+    # the overlay links to the canonical cat of the lower lexicon
+    assert overlay.static['cat'] == [cat]
+    assert cat in overlay.static['lion'][0].partitions[0]
+    assert set(cat.parents) == parents
+    assert overlay.get_static_machine('dog') == lexicon.static['dog']
+    assert 'lion' not in lexicon.static
+
+def test_override():
+    lexicon = build(parse([('cat', 'animal, small'),
+                           ('tiger', 'cat, wild')]))
+    cat = lexicon.static['cat'][0]
+    overlay = lexicon.overlay()
+    overlay.add_static(parse([('lion', 'cat, big')]), copy_on_write=True)
+    overlay.add_static(parse([('cat', 'pet')]), copy_on_write=True)
+    overlay.finalize_static()
+    own_cat = overlay.static['cat'][0]
+    assert own_cat is not cat
+    assert children(own_cat) == [['pet']]
+    # the definitions of the overlay refer to its own cat...
+    assert own_cat in overlay.static['lion'][0].partitions[0]
+    # ... the ones of the lower lexicon are left alone
+    assert children(cat) == [['animal', 'small']]
+    assert cat in lexicon.static['tiger'][0].partitions[0]
+
+def test_remove_definition():
+    lexicon = build(parse([('cat', 'animal, small')]))
+    overlay = lexicon.overlay()
+    overlay.add_static(parse([('lion', 'cat, big')]), copy_on_write=True)
+    overlay.finalize_static()
+    assert overlay.remove_definition('lion') is None
+    # the borrowed cat is released, the lower lexicon keeps it
+    assert 'cat' not in overlay.static
+    assert overlay.get_static_machine('cat') == lexicon.static['cat']
+    assert overlay.static == {}
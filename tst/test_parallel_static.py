@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from pymachine.lexicon import Lexicon
+
+from helpers import build, small_definitions, snapshot
+
+def by_headword(machines):
+    return sorted(machines, key=lambda machine: machine.printname_)
+
+def test_same_as_serial(definitions):
+    # 'in' is referenced before its two senses are defined
+    for machines in (small_definitions(),
+                     [machine for print_name in definitions
+                      for machine in definitions[print_name]]):
+        serial = snapshot(build(by_headword(machines), copy_on_write=True))
+        shuffled = list(machines)
+        random.Random(3).shuffle(shuffled)
+        for processes in (1, 2):
+            for bulk_load in (False, True):
+                assert snapshot(build(
+                    shuffled, copy_on_write=True, bulk_load=bulk_load,
+                    processes=processes)) == serial
+
+def test_needs_copy_on_write():
+    with pytest.raises(ValueError):
+        Lexicon().add_static(small_definitions(), processes=2)
@@ -0,0 +1,40 @@
+import gc
+import weakref
+
+from helpers import structure
+
+WORDS = ['vet', 'lion', 'bird', 'zebra']
+
+def static_machines(lexicon):
+    return [machine for nodes in lexicon.static.itervalues()
+            for machine in nodes]
+
+def test_released_machines_freed(lexicon):
+    static = static_machines(lexicon)
+    before = structure(lexicon.static)
+    static_ids = set(machine.id for machine in static)
+    context = lexicon.context()
+    for word in WORDS:
+        context.expand(context.get_machine(word))
+    active = [machine for print_name in context.active
+              for machine in context.active.machines(print_name)]
+    assert active and not static_ids & set(m.id for m in active)
+    refs = [weakref.ref(machine) for machine in active]
+    active_ids = set(machine.id for machine in active)
+    del active, machine
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        context.clear_active(release=True)
+        # freed by reference counting, without the cyclic collector
+        assert [ref for ref in refs if ref() is not None] == []
+    finally:
+        if gc_enabled:
+            gc.enable()
+    # the static graph does not point to the released machines
+    for machine in static:
+        assert not active_ids & set(parent.id
+                                    for parent, _ in machine.parents)
+        assert not active_ids & set(child.id for child in machine.children())
+    assert len(context.active) == 0
+    assert structure(lexicon.static) == before
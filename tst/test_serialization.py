@@ -0,0 +1,118 @@
+from cStringIO import StringIO
+import copy
+import cPickle
+import os
+
+import pytest
+
+from pymachine.machine import Machine, Partition
+from pymachine.control import ConceptControl
+from pymachine import flat
+from pymachine import mapped
+
+from pymachine.traversal import Traversal
+
+from helpers import TST_DIR, build, expanded, structure
+
+def structure_with_ids(static):
+    """Like helpers.structure(), with the ids of the machines."""
+    canonicals = set(nodes[0] for nodes in static.itervalues())
+    return sorted(
+        (print_name, [(node.id, node.fingerprint(canonicals - set([node])))
+                      for node in static[print_name]],
+         sorted((parent.id, part_i)
+                for parent, part_i in static[print_name][0].parents))
+        for print_name in static)
+
+def round_trip(dump, load, what):
+    file_obj = StringIO()
+    dump(what, file_obj)
+    return load(StringIO(file_obj.getvalue()))
+
+def test_flat_definitions(definitions):
+    loaded = round_trip(flat.dump_definitions, flat.load_definitions,
+                        definitions)
+    assert sorted(loaded) == sorted(definitions)
+    for print_name, machines in definitions.iteritems():
+        assert (sorted((m.id, m.fingerprint()) for m in loaded[print_name]) ==
+                sorted((m.id, m.fingerprint()) for m in machines))
+
+def test_flat_lexicon(lexicon):
+    loaded = round_trip(flat.dump_lexicon, flat.load_lexicon, lexicon)
+    assert (structure_with_ids(loaded.static) ==
+            structure_with_ids(lexicon.static))
+    assert loaded.static_disambig == lexicon.static_disambig
+    # plain pickles are read, too
+    pickled = round_trip(cPickle.dump, flat.load_lexicon, lexicon)
+    assert (structure_with_ids(pickled.static) ==
+            structure_with_ids(lexicon.static))
+
+def test_flat_deep_graph():
+    # far deeper than the recursion limit
+    root = machine = Machine('link', ConceptControl())
+    for i in xrange(20000):
+        child = Machine('link', ConceptControl())
+        machine.append(child, 0)
+        machine = child
+    loaded = round_trip(flat.dump_definitions, flat.load_definitions,
+                        {'link': root})['link']
+    depth = 0
+    while loaded.partitions[0]:
+        loaded = loaded.partitions[0][0]
+        depth += 1
+    assert depth == 20000
+
+def test_mapped_lexicon(lexicon, tmpdir):
+    file_name = str(tmpdir.join('lexicon'))
+    mapped.dump_lexicon(lexicon, file_name)
+    loaded = mapped.load_lexicon(file_name)
+    # freezing renumbers the machines
+    assert structure(loaded.static) == structure(lexicon.static)
+    assert (sorted((name, sorted(names))
+                   for name, names in loaded.static_disambig.items()) ==
+            sorted((name, sorted(names))
+                   for name, names in lexicon.static_disambig.items()))
+    words = ['vet', 'lion', 'bird', 'zebra']
+    assert expanded(loaded, words) == expanded(lexicon, words)
+    # the static graph of a frozen lexicon is read-only
+    with pytest.raises(TypeError):
+        loaded.add_definition(Machine('platypus', ConceptControl()))
+    with pytest.raises(TypeError):
+        loaded.remove_definition('vet')
+    assert 'vet' in loaded.static
+
+def test_layered_not_saved(lexicon, tmpdir):
+    file_name = str(tmpdir.join('lexicon'))
+    for layered in (lexicon.overlay(), lexicon.context()):
+        assert layered.is_layered()
+        with open(file_name, 'wb') as file_obj:
+            with pytest.raises(TypeError):
+                flat.dump_lexicon(layered, file_obj)
+        with pytest.raises(TypeError):
+            mapped.dump_lexicon(layered, file_name)
+    assert not lexicon.is_layered()
+
+def test_pre_slots_pickles():
+    """
+    pre_slots_definitions.pickle and pre_slots_lexicon.pickle were written
+    by the code before Machine had __slots__ (and ids): the definitions of
+    helpers.DEFINITIONS, dumped with cPickle as Wrapper did, and a lexicon
+    of a copy of them (without share_identical), dumped with flat.
+    """
+    with open(os.path.join(TST_DIR, 'pre_slots_definitions.pickle')) as f:
+        definitions = cPickle.load(f)
+    machines = list(Traversal(
+        [m for ms in definitions.itervalues() for m in ms]).machines())
+    assert all(isinstance(m, Machine) for m in machines)
+    assert all(type(part) is Partition
+               for m in machines for part in m.partitions)
+    assert len(set(m.id for m in machines)) == len(machines)
+
+    with open(os.path.join(TST_DIR, 'pre_slots_lexicon.pickle'), 'rb') as f:
+        loaded = flat.load_lexicon(f)
+    lexicon = build(copy.deepcopy(definitions).values(),
+                    share_identical=False)
+    assert structure(loaded.static) == structure(lexicon.static)
+    assert loaded.static_disambig == lexicon.static_disambig
+    words = ['vet', 'lion', 'bird', 'zebra']
+    assert expanded(loaded, words) == expanded(lexicon, words)
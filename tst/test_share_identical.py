@@ -0,0 +1,26 @@
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+
+from helpers import build
+
+def concept(print_name, *children):
+    machine = Machine(print_name, ConceptControl(), 1)
+    for child in children:
+        machine.append(child, 0)
+    return machine
+
+def test_partition_order():
+    # animal[wild, big] and animal[big, wild]
+    tiger = concept('tiger', concept('animal', concept('wild'),
+                                     concept('big')))
+    lion = concept('lion', concept('animal', concept('big'),
+                                   concept('wild')))
+    assert (tiger.partitions[0][0].fingerprint() ==
+            lion.partitions[0][0].fingerprint())
+    lexicon = build([tiger, lion])
+    assert len(lexicon.static['animal']) == 2
+
+def test_parsed_definitions(lexicon):
+    # the canonical animal, and animal[small], animal[big],
+    # animal[wild, big] and animal[wild]
+    assert len(lexicon.static['animal']) == 5
@@ -0,0 +1,42 @@
+import pytest
+
+from pymachine.lexicon import Lexicon
+from pymachine.static_store import StaticStore
+
+from helpers import build, expanded
+
+WORDS = ['vet', 'lion', 'bird', 'zebra']
+
+@pytest.fixture
+def store(definitions, tmpdir):
+    """A store of @c definitions, which the lexicons to compare with it must
+    be built from (see helpers.read_definitions())."""
+    file_name = str(tmpdir.join('store'))
+    StaticStore.write(definitions, file_name)
+    store = StaticStore(file_name)
+    yield store
+    store.close()
+
+def test_store(store, definitions):
+    assert sorted(store) == sorted(definitions)
+    for print_name, machines in definitions.iteritems():
+        assert (sorted(m.fingerprint() for m in store[print_name]) ==
+                sorted(m.fingerprint() for m in machines))
+        # each request returns new machines
+        assert not set(store[print_name]) & set(store[print_name])
+    assert store.get('unknown') is None
+
+def test_lazy_lexicon(store, definitions):
+    eager = build(definitions.values())
+
+    lazy = Lexicon()
+    lazy.use_store(store)
+    assert not lazy.static
+    vet = lazy.get_static_machine('vet')
+    assert [m.printname() for m in vet] == ['vet']
+    # only vet is defined, the words of its definition are placeholders
+    assert [name for name in lazy.static
+            if any(lazy.static[name][0].partitions)] == ['vet']
+    assert expanded(lazy, WORDS) == expanded(eager, WORDS)
+    with pytest.raises(ValueError):
+        eager.use_store(store)
@@ -0,0 +1,38 @@
+from pymachine.machine import Machine
+from pymachine.control import ConceptControl
+from pymachine.traversal import Traversal, number_machines
+
+def build():
+    """a[b[d], c[d]]"""
+    a, b, c, d = [Machine(name, ConceptControl()) for name in 'abcd']
+    a.append(b, 0)
+    a.append(c, 0)
+    b.append(d, 0)
+    c.append(d, 0)
+    return a, b, c, d
+
+def test_exits():
+    a = build()[0]
+    events = [(machine.printname(), expand) for machine, _, _, _, expand in
+              Traversal(a, revisits=True, exits=True)]
+    assert events == [('a', True), ('b', True), ('d', True), ('d', None),
+                      ('b', None), ('c', True), ('d', False), ('c', None),
+                      ('a', None)]
+
+def test_leave():
+    a = build()[0]
+    walk = Traversal(a, exits=True)
+    events = []
+    for machine, _, _, _, expand in walk:
+        events.append((machine.printname(), expand))
+        if machine.printname() == 'b':
+            # c is not visited, but b is still expanded and exited
+            walk.leave()
+    assert events == [('a', True), ('b', True), ('d', True), ('d', None),
+                      ('b', None), ('a', None)]
+
+def test_number_machines():
+    a, b, c, d = build()
+    machines, nodes = number_machines([c, a])
+    assert machines == [c, d, a, b]
+    assert nodes == {c: 0, d: 1, a: 2, b: 3}